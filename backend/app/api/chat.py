@@ -1,13 +1,35 @@
 # app/api/chat.py
-from fastapi import APIRouter
+import asyncio
+import json
+import logging
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from app.services.qa_service import get_answer
+from app.core.config import settings
+from app.services.qa_service import answer_from_documents, get_answer, retrieve_batch
+from app.services.admission import chat_pool
+from app.services.warmup_service import timed_query, warm_tenants
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 class ChatRequest(BaseModel):
     question: str
     user_id: str = "default"
+    # Optional scope: only search these documents / sections / chunk types
+    filenames: Optional[list[str]] = None
+    sections: Optional[list[str]] = None
+    types: Optional[list[Literal["text", "table", "ocr_table"]]] = None
+
+class BatchChatRequest(BaseModel):
+    questions: list[str]
+    user_id: str = "default"
+    filenames: Optional[list[str]] = None
+    sections: Optional[list[str]] = None
+    types: Optional[list[Literal["text", "table", "ocr_table"]]] = None
+    # Max LLM calls in flight for this batch (capped at BATCH_LLM_CONCURRENCY)
+    concurrency: Optional[int] = None
 
 class SourceDocument(BaseModel):
     snippet: str
@@ -20,8 +42,18 @@ class ChatResponse(BaseModel):
     user_id: str
 
 @router.post("/", response_model=ChatResponse)
-def chat_endpoint(req: ChatRequest):
-    answer, sources = get_answer(req.question, req.user_id)  # ✅ already cleaned
+async def chat_endpoint(req: ChatRequest):
+    answer, sources = await chat_pool.run(
+        req.user_id,
+        timed_query,
+        req.user_id,
+        get_answer,
+        req.question,
+        req.user_id,
+        filenames=req.filenames,
+        sections=req.sections,
+        types=req.types,
+    )  # ✅ already cleaned
 
     return {
         "question": req.question,
@@ -29,3 +61,85 @@ def chat_endpoint(req: ChatRequest):
         "sources": sources,  # ✅ no transformation here
         "user_id": req.user_id,
     }
+
+
+@router.post("/batch")
+async def chat_batch_endpoint(req: BatchChatRequest):
+    """
+    Answer many questions for one tenant. Results stream back as NDJSON, one
+    line per question in completion order, tagged with the question's index.
+    """
+    if not req.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(req.questions) > settings.BATCH_MAX_QUESTIONS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {settings.BATCH_MAX_QUESTIONS} questions per batch"
+        )
+
+    warm_tenants.touch(req.user_id)
+    # Retrieval for the whole batch is one admitted unit of chat work, so a
+    # saturated pool answers 429 before any streaming starts
+    retrieved = await chat_pool.run(
+        req.user_id,
+        retrieve_batch,
+        req.questions,
+        req.user_id,
+        filenames=req.filenames,
+        sections=req.sections,
+        types=req.types,
+    )
+    # Each answer is admitted to chat_pool separately; more in flight than the
+    # per-tenant cap would only queue up waiting for admission
+    concurrency = min(
+        req.concurrency or settings.BATCH_LLM_CONCURRENCY,
+        settings.BATCH_LLM_CONCURRENCY,
+        chat_pool.per_tenant_limit,
+    )
+    return StreamingResponse(
+        _stream_answers(req, retrieved, max(concurrency, 1)),
+        media_type="application/x-ndjson",
+    )
+
+
+async def _stream_answers(req: BatchChatRequest, retrieved, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(index, question, docs):
+        async with semaphore:
+            try:
+                answer, sources = await chat_pool.run_waiting(
+                    req.user_id, settings.BATCH_ADMISSION_TIMEOUT, answer_from_documents, question, docs
+                )
+            except HTTPException as e:
+                # 429 from admission control: no slot freed up within BATCH_ADMISSION_TIMEOUT
+                return {
+                    "index": index, "question": question, "error": e.detail, "status": e.status_code,
+                    "retry_after": (e.headers or {}).get("Retry-After"),
+                }
+            except Exception as e:
+                logger.error(f"Batch question {index} for {req.user_id} failed: {e}", exc_info=True)
+                return {"index": index, "question": question, "error": "An error occurred while trying to find an answer."}
+        return {"index": index, "question": question, "answer": answer, "sources": sources}
+
+    tasks = [
+        asyncio.create_task(answer(index, question, docs))
+        for index, (question, docs) in enumerate(zip(req.questions, retrieved))
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            result = await next_done
+            yield json.dumps({**result, "user_id": req.user_id}, ensure_ascii=False) + "\n"
+    finally:
+        # Client went away mid-stream: answers still queued in chat_pool are dropped
+        # (one already running on a worker finishes and is discarded)
+        for task in tasks:
+            task.cancel()
+
+
+def check_batch_concurrency():
+    """Warn when BATCH_LLM_CONCURRENCY is above what the chat pool admits per tenant (call at startup)."""
+    if settings.BATCH_LLM_CONCURRENCY > chat_pool.per_tenant_limit:
+        logger.warning(
+            f"BATCH_LLM_CONCURRENCY={settings.BATCH_LLM_CONCURRENCY} exceeds CHAT_PER_TENANT="
+            f"{chat_pool.per_tenant_limit}; batches run at most {chat_pool.per_tenant_limit} answers at once"
+        )
@@ -1,15 +1,20 @@
 # app/api/delete.py
 from fastapi import APIRouter, HTTPException, Depends, Query
 from app.services.vectorstore_service import delete_file_chunks
-from app.services.metadata_store import load_metadata, save_metadata
+from app.services.metadata_store import load_metadata, recorded_content_hash, remove_processed
+from app.services.linearize_service import remove_linearized_copy
+from app.services.file_hash import compute_file_hash
 from app.services.auth_service import get_current_user as authenticate_token  # ✅ fixed
+from app.services.admission import light_pool
+import logging
 import os
 
+logger = logging.getLogger(__name__)
 UPLOAD_DIR = "uploaded_files"
 router = APIRouter()
 
 @router.delete("/delete/{filename}")
-def delete_document(
+async def delete_document(
     filename: str,
     user_id: str = Query(...),
     token: dict = Depends(authenticate_token),  # ✅ token is a dict with 'email', possibly 'role'
@@ -18,21 +23,38 @@ def delete_document(
     if token.get("role") != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
 
+    return await light_pool.run(user_id, _delete_document, filename, user_id)
+
+
+def _delete_document(filename: str, user_id: str):
+    file_path = os.path.join(UPLOAD_DIR, f"{user_id}__{filename}")
+    # Taken before the metadata entry (which records it) goes away
+    file_hash = None
+    if os.path.exists(file_path):
+        file_hash = recorded_content_hash(file_path) or compute_file_hash(file_path)
+
     # ✅ Delete from Chroma vectorstore
     delete_file_chunks(user_id, filename)
 
     # ✅ Delete from metadata store
-    metadata = load_metadata()
-    updated = [m for m in metadata if not (m["filename"] == filename and m["user_id"] == user_id)]
-    save_metadata(updated)
+    remove_processed(user_id, filename)
 
     # ✅ Delete actual uploaded file
-    file_path = os.path.join(UPLOAD_DIR, f"{user_id}__{filename}")
     if os.path.exists(file_path):
         os.remove(file_path)
-        print(f"[DELETE] Removed file from disk: {file_path}")
+        logger.info(f"Removed file from disk: {file_path}")
+        _remove_unused_linearized_copy(file_hash)
     else:
-        print(f"[DELETE] File not found on disk: {file_path}")
+        logger.warning(f"File not found on disk: {file_path}")
 
 
     return {"detail": f"{filename} deleted successfully"}
+
+
+def _remove_unused_linearized_copy(file_hash: str):
+    # Copies are keyed by content, so keep it while another processed upload has the same bytes
+    if file_hash is None:
+        return
+    if any(entry.get("upload", {}).get("sha256") == file_hash for entry in load_metadata()):
+        return
+    remove_linearized_copy(file_hash)
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, BackgroundTasks, HTTPException
 from app.models.user import UserCreate, UserLogin, Token
 from app.services.auth_service import (
     get_password_hash,
@@ -8,7 +8,10 @@ from app.services.auth_service import (
 
 from pydantic import BaseModel, EmailStr
 
-from app.services.user_store import load_users, save_users  # JSON file-based store
+from app.services.user_store import add_user  # JSON file-based store
+from app.services.admission import light_pool
+from app.services.warmup_service import warm_tenants
+from app.core.config import settings
 
 
 class UserCreate(BaseModel):
@@ -19,25 +22,35 @@ class UserCreate(BaseModel):
 router = APIRouter()
 
 @router.post("/signup", response_model=Token)
-def register(user: UserCreate):
-    users = load_users()
-    if user.email in users:
-        raise HTTPException(status_code=400, detail="Email already registered")
+async def register(user: UserCreate):
+    # bcrypt hashing is deliberately slow; keep it on the bounded metadata pool
+    return await light_pool.run(user.email, _register, user)
+
 
-    users[user.email] = {
+def _register(user: UserCreate):
+    record = {
     "email": user.email,
     "hashed_password": get_password_hash(user.password),
     "role": user.role  # <-- store the role
 }
 
-
-    save_users(users)
+    # Check-and-insert under the store's file lock, so two workers can't both register the email
+    if not add_user(user.email, record):
+        raise HTTPException(status_code=400, detail="Email already registered")
 
     token = create_access_token({"sub": user.email, "role": user.role})
     return {"access_token": token, "token_type": "bearer"}
 
 @router.post("/login", response_model=Token)
-def login(user: UserLogin):
+async def login(user: UserLogin, background_tasks: BackgroundTasks):
+    token = await light_pool.run(user.email, _login, user)
+    if settings.WARM_ON_LOGIN:
+        # Runs after the response is sent; every worker then warms the tenant on its warm-up pool
+        background_tasks.add_task(warm_tenants.request, user.email)
+    return token
+
+
+def _login(user: UserLogin):
     auth_user = authenticate_user(user.email, user.password)
     if not auth_user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
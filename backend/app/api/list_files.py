@@ -1,29 +1,28 @@
 from fastapi import APIRouter, Query, Depends
+import logging
 import os
-import json
+from app.services.file_store import read_json
 from app.services.metadata_store import has_already_been_processed
-from app.services.vectorstore_service import safe_collection_name
-from app.core.config import settings
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from app.services.vectorstore_service import get_tenant_sources
 from app.services.auth_service import get_current_user
+from app.services.admission import light_pool
 from fastapi import Depends
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
 UPLOAD_DIR = "uploaded_files"
 PROCESSED_METADATA_PATH = os.path.join(UPLOAD_DIR, "processed_metadata.json")
-CHROMA_DIR = "chroma_store"
 
 @router.get("/files")
-def list_user_files(user_id: str = Query(...)):
+async def list_user_files(user_id: str = Query(...)):
+    return await light_pool.run(user_id, _list_user_files, user_id)
+
+
+def _list_user_files(user_id: str):
     try:
-        if os.path.exists(PROCESSED_METADATA_PATH):
-            with open(PROCESSED_METADATA_PATH, "r") as f:
-                processed_data = json.load(f)
-        else:
-            processed_data = {}
+        processed_data = read_json(PROCESSED_METADATA_PATH, {})
 
         user_files = []
 
@@ -48,32 +47,15 @@ def list_user_files(user_id: str = Query(...)):
 
 
 @router.get("/user-documents")
-def list_user_documents(user: dict = Depends(get_current_user)):
-    print(f"[DEBUG] /user-documents called by {user['email']}")
-    user_dir = os.path.join(CHROMA_DIR, user["email"])
-    collection_name = safe_collection_name(user["email"])
-
-    if not os.path.exists(os.path.join(user_dir, "chroma.sqlite3")):
-        return []
+async def list_user_documents(user: dict = Depends(get_current_user)):
+    return await light_pool.run(user["email"], _list_user_documents, user)
 
-    try:
-        vectorstore = Chroma(
-            embedding_function=OpenAIEmbeddings(
-                model="text-embedding-3-large",
-                openai_api_key=settings.OPENAI_API_KEY
-            ),
-            persist_directory=user_dir,
-            collection_name=collection_name
-        )
 
-        docs = vectorstore.get(include=["metadatas"])
-        filenames = sorted(set(
-            meta.get("source")
-            for meta in docs["metadatas"]
-            if meta.get("source")
-        ))
-        return filenames
+def _list_user_documents(user: dict):
+    logger.debug(f"/user-documents called by {user['email']}")
 
+    try:
+        return sorted(get_tenant_sources(user["email"]))
     except Exception as e:
-        print(f"Error loading documents for user {user['email']}: {e}")
+        logger.error(f"Error loading documents for user {user['email']}: {e}")
         return []
@@ -1,18 +1,25 @@
 # app/api/processing.py
 from fastapi import APIRouter, HTTPException, Body
 from pydantic import BaseModel
+import logging
 import os
 from fastapi.responses import JSONResponse
 
+from app.core.config import settings
 from app.services.vectorstore_service import process_documents_for_user
+from app.services.linearize_service import linearize_pdf
+from app.services.page_render_service import schedule_prerender
+from app.services.admission import ingest_pool, light_pool
 from typing import List
 from app.services.metadata_store import (
-    has_already_been_processed,
+    claim_file,
     mark_as_processed,
     get_total_chunks,
-    load_metadata
+    load_metadata,
+    release_file
 )
-print("[BOOT] Registered /api/v2/documents/process route")
+
+logger = logging.getLogger(__name__)
 
 UPLOAD_DIR = "uploaded_files"
 
@@ -24,7 +31,11 @@ class ProcessRequest(BaseModel):
     user_id: str
 
 @router.get("/user-documents/{user_id}")
-def get_user_documents(user_id: str):
+async def get_user_documents(user_id: str):
+    return await light_pool.run(user_id, _list_user_documents, user_id)
+
+
+def _list_user_documents(user_id: str):
     metadata = load_metadata()
     user_docs = [
         entry for entry in metadata
@@ -38,12 +49,16 @@ def get_user_documents(user_id: str):
 
 
 @router.post("/process")
-def process_documents(req: ProcessRequest):
-    print(f"[API] 🔄 Called process_documents for user={req.user_id}")
-    print(f"[API] 🔄 Filenames: {req.filenames}")
+async def process_documents(req: ProcessRequest):
+    logger.info(f"process_documents for user={req.user_id}: {req.filenames}")
     if not req.filenames:
         raise HTTPException(status_code=400, detail="No filenames provided")
 
+    # OCR/camelot/embedding work runs on the bounded ingestion pool (429 when saturated)
+    return await ingest_pool.run(req.user_id, _process_files, req)
+
+
+def _process_files(req: ProcessRequest):
     processed_files = []
     total_chunks = 0
 
@@ -52,12 +67,19 @@ def process_documents(req: ProcessRequest):
         if not os.path.isfile(filepath):
             continue  # skip missing files
 
-        if has_already_been_processed(req.user_id, filename):
-            continue  # skip previously processed files
-
-        chunks = process_documents_for_user([filepath], req.user_id)
-
-        mark_as_processed(req.user_id, filename, chunks)
+        # Skips files already processed or being processed by another worker
+        if not claim_file(req.user_id, filename):
+            continue
+
+        try:
+            chunks = process_documents_for_user([filepath], req.user_id)
+            mark_as_processed(req.user_id, filename, chunks, path=filepath)
+        finally:
+            release_file(req.user_id, filename)
+        if settings.LINEARIZE_PDFS:
+            linearize_pdf(filepath)
+        if settings.PRERENDER_PAGES:
+            schedule_prerender(filepath, max_pages=settings.PRERENDER_PAGES)
         total_chunks += chunks
         processed_files.append(filename)
 
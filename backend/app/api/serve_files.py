@@ -1,28 +1,134 @@
-from fastapi import APIRouter
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
 from fastapi import HTTPException
+import logging
 import os
 
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+from app.services.linearize_service import find_linearized_copy
+from app.services.metadata_store import recorded_content_hash
+
+logger = logging.getLogger(__name__)
 router = APIRouter()
 UPLOAD_DIR = "uploaded_files"
+STREAM_CHUNK_SIZE = 256 * 1024
+
+
+def resolve_upload_path(filename: str):
+    """Find an upload by exact name, else by its `<user>__<name>` prefixed form."""
+    if os.path.basename(filename) != filename:
+        return None
 
-@router.get("/files/{filename}")
-def serve_file(filename: str):
-    print(f"🔍 Looking for: {filename} in {UPLOAD_DIR}")
-    
-    # Check if file exists exactly
     direct_path = os.path.join(UPLOAD_DIR, filename)
     if os.path.isfile(direct_path):
-        print(f"✅ Direct match found: {direct_path}")
-        return FileResponse(direct_path, media_type="application/pdf", filename=filename)
-    
-    # Try to find a prefixed version
+        return direct_path
+
     for f in os.listdir(UPLOAD_DIR):
         if f.endswith(f"__{filename}"):
-            full_path = os.path.join(UPLOAD_DIR, f)
-            print(f"✅ Found prefixed file: {full_path}")
-            return FileResponse(full_path, media_type="application/pdf", filename=filename)
+            return os.path.join(UPLOAD_DIR, f)
+    return None
+
+
+def _etag_matches(header: str, etag: str) -> bool:
+    candidates = [tag.strip() for tag in header.split(",")]
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    return "*" in candidates or any(tag.removeprefix("W/") == etag for tag in candidates)
+
+
+def _parse_range(header: str, size: int):
+    """
+    Parse a single `bytes=` range. Returns (start, end) inclusive, None to serve
+    the whole file (absent, malformed or multi-range), or "unsatisfiable".
+    """
+    if not header or not header.startswith("bytes=") or "," in header:
+        return None
+    start_text, _, end_text = header[len("bytes="):].strip().partition("-")
+    try:
+        if not start_text:  # suffix range: last N bytes
+            length = int(end_text)
+            if length <= 0:
+                return "unsatisfiable"
+            return max(size - length, 0), size - 1
+        start = int(start_text)
+        end = int(end_text) if end_text else size - 1
+    except ValueError:
+        return None
+    if start >= size or start > end:
+        return "unsatisfiable"
+    return start, min(end, size - 1)
+
+
+def _iter_file(path: str, start: int, length: int):
+    with open(path, "rb") as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(STREAM_CHUNK_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def pdf_response(request: Request, path: str, filename: str) -> Response:
+    """
+    Serve a stored PDF with a strong content-hash ETag, If-None-Match -> 304,
+    single byte-range (206) support and cache headers. The hash recorded at
+    ingest is used while the file is unchanged; other uploads are hashed. The
+    linearized copy is served instead of the original when ingestion wrote one.
+    HEAD gets the same status and headers without the body (viewers probe the
+    length before range loading).
+    """
+    file_hash = recorded_content_hash(path) or compute_file_hash(path)
+    etag = f'"{file_hash}"'
+    linearized = find_linearized_copy(path, file_hash) if settings.LINEARIZE_PDFS else None
+    if linearized:
+        path = linearized
+        etag = f'"{file_hash}-linear"'
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": settings.PDF_CACHE_CONTROL,
+        "Accept-Ranges": "bytes",
+    }
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    size = os.path.getsize(path)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and if_range and if_range.strip() != etag:
+        range_header = None  # the client's partial copy is stale; send everything
+
+    byte_range = _parse_range(range_header, size)
+    if byte_range == "unsatisfiable":
+        return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+    if byte_range is None:
+        return FileResponse(path, media_type="application/pdf", filename=filename, headers=headers)
+
+    start, end = byte_range
+    length = end - start + 1
+    headers.update({
+        "Content-Range": f"bytes {start}-{end}/{size}",
+        "Content-Length": str(length),
+    })
+    if request.method == "HEAD":
+        return Response(status_code=206, media_type="application/pdf", headers=headers)
+    return StreamingResponse(
+        _iter_file(path, start, length),
+        status_code=206,
+        media_type="application/pdf",
+        headers=headers,
+    )
 
-    raise HTTPException(status_code=404, detail="File not found")
 
+@router.api_route("/files/{filename}", methods=["GET", "HEAD"])
+def serve_file(filename: str, request: Request):
+    path = resolve_upload_path(filename)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
 
+    logger.debug(f"Serving {filename} from {path}")
+    return pdf_response(request, path, filename)
@@ -0,0 +1,52 @@
+# app/api/snapshots.py
+from fastapi import APIRouter, Depends, File, HTTPException, Query, UploadFile
+from fastapi.responses import StreamingResponse
+from app.services.admission import ingest_pool
+from app.services.auth_service import get_current_user as authenticate_token
+from app.services.snapshot_service import import_tenant, iter_export
+from app.services.vectorstore_service import safe_collection_name
+import logging
+
+logger = logging.getLogger(__name__)
+router = APIRouter()
+
+
+def _require_admin(token: dict):
+    if token.get("role") != "admin":
+        raise HTTPException(status_code=403, detail="Not authorized")
+
+
+@router.get("/tenants/{user_id}/snapshot")
+def export_snapshot(
+    user_id: str,
+    include_files: bool = Query(True),
+    token: dict = Depends(authenticate_token),
+):
+    """Stream the tenant's chunks, vectors, summaries, metadata and uploads as a tar.gz."""
+    _require_admin(token)
+    filename = f"{safe_collection_name(user_id)}.snapshot.tar.gz"
+    return StreamingResponse(
+        iter_export(user_id, include_files=include_files),
+        media_type="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+
+@router.post("/tenants/snapshot")
+async def import_snapshot(
+    file: UploadFile = File(...),
+    user_id: str = Query(None, description="restore as this tenant (default: the exported one)"),
+    replace: bool = Query(False, description="drop the tenant's existing chunks first"),
+    token: dict = Depends(authenticate_token),
+):
+    """Restore a tenant snapshot; no embeddings are recomputed."""
+    _require_admin(token)
+    # Verification and Chroma upserts run on the bounded ingestion pool
+    return await ingest_pool.run(user_id or "snapshot-import", _import_snapshot, file, user_id, replace)
+
+
+def _import_snapshot(file: UploadFile, user_id: str, replace: bool):
+    try:
+        return import_tenant(file.file, user_id=user_id, replace=replace)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
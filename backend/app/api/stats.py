@@ -0,0 +1,31 @@
+# app/api/stats.py
+from fastapi import APIRouter
+from app.services.encoding_service import get_sentence_encoder
+from app.services.page_render_service import page_cache
+from app.services.admission import admission_stats
+from app.services.warmup_service import warm_tenants
+
+router = APIRouter()
+
+@router.get("/encoder")
+def encoder_stats():
+    """Batch sizes and queue wait times of the shared sentence encoder."""
+    return get_sentence_encoder().stats()
+
+
+@router.get("/page-cache")
+def page_cache_stats():
+    """Entries and bytes held by the rendered-page cache."""
+    return page_cache.stats()
+
+
+@router.get("/admission")
+def admission_pool_stats():
+    """Running/queued requests, rejections and queue waits per admission pool."""
+    return admission_stats()
+
+
+@router.get("/warm-tenants")
+def warm_tenant_stats():
+    """Warm pool occupancy, warm-ups, and cold vs warm chat query latency."""
+    return warm_tenants.stats()
@@ -1,81 +1,95 @@
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from fastapi.responses import Response
+from typing import Literal, Optional
 import fitz
 import os
-import unicodedata
-import re
-from difflib import SequenceMatcher
-import nltk
+import logging
 
+from app.api.serve_files import resolve_upload_path
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+from app.services.page_render_service import normalize_zoom, page_count, render_page
+from app.services.text_processing import best_fuzzy_match, cached_page_lines, normalize_text, sent_tokenize
+
+logger = logging.getLogger(__name__)
 router = APIRouter()
 UPLOAD_DIR = "uploaded_files"
 
-def normalize_text(text: str) -> str:
-    text = text.lower()
-    text = unicodedata.normalize("NFKD", text)
-    # Remove markdown formatting
-    text = re.sub(r'#+\s*', '', text)  # Remove headers
-    text = re.sub(r'[“”"\'«»’]', '"', text)
-    text = re.sub(r'[^a-z0-9\s.,;:!?()\"-]', "", text)
-    text = re.sub(r'\s+', " ", text)
-    text = re.sub(r'\n+', " ", text)  # Replace newlines with spaces
-    return text.strip()
-
-def find_best_match(text, sentences, threshold=0.7):
+def page_lines(page):
+    """Text of every line on a PyMuPDF page (spans joined with spaces)."""
+    lines = []
+    for b in page.get_text("dict")["blocks"]:
+        for l in b.get("lines", []):
+            lines.append(" ".join([s["text"] for s in l.get("spans", [])]))
+    return lines
+
+def snippet_queries(text):
+    """Normalized strings to match a snippet by; long snippets are matched sentence by sentence."""
     text_norm = normalize_text(text)
-    best_score = 0
-    best_sentence = None
-    
-    # For long snippets, try matching shorter parts
     if len(text_norm) > 100:
-        # Split into sentences and try each one
-        try:
-            nltk.data.find('tokenizers/punkt')
-        except LookupError:
-            nltk.download('punkt')
-        
-        text_sentences = nltk.sent_tokenize(text)
-        for sentence in text_sentences:
-            sentence_norm = normalize_text(sentence)
-            for s in sentences:
-                s_norm = normalize_text(s)
-                score = SequenceMatcher(None, sentence_norm, s_norm).ratio()
-                if score > best_score and score >= threshold:
-                    best_score = score
-                    best_sentence = s
-    else:
-        # Original logic for shorter text
-        for s in sentences:
-            s_norm = normalize_text(s)
-            score = SequenceMatcher(None, text_norm, s_norm).ratio()
-            if score > best_score and score >= threshold:
-                best_score = score
-                best_sentence = s
-    
-    print(f"[🧪 Best fuzzy score]: {best_score:.2f}")
+        return [normalize_text(sentence) for sentence in sent_tokenize(text)]
+    return [text_norm]
+
+def find_best_match(queries, lines, threshold=0.7):
+    """`queries` from snippet_queries; `lines` is [(line, normalized line)] for one page."""
+    best_sentence, best_score = best_fuzzy_match(queries, lines, threshold)
+    logger.debug(f"Best fuzzy score: {best_score:.2f}")
     return best_sentence, best_score
 
+@router.get("/api/page-image")
+def page_image(
+    request: Request,
+    file: str = Query(...),
+    page: int = Query(1, ge=1),
+    zoom: float = Query(2.0),
+    format: Literal["webp", "png"] = Query("webp"),
+):
+    """Server-rendered page image (1-based page), for clients too slow to render PDFs themselves."""
+    path = resolve_upload_path(file)
+    if path is None:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    etag = f'"{compute_file_hash(path)}-{page}-{normalize_zoom(zoom):g}-{format}"'
+    headers = {"ETag": etag, "Cache-Control": settings.PDF_CACHE_CONTROL}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    try:
+        data, media_type = render_page(path, page, zoom, format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    headers["X-Page-Count"] = str(page_count(path))
+    return Response(content=data, media_type=media_type, headers=headers)
+
+
 @router.get("/api/highlight-snippet")
-def highlight_snippet(file: str = Query(...), text: str = Query(...)):
+def highlight_snippet(
+    file: str = Query(...),
+    text: str = Query(...),
+    zoom: Optional[float] = Query(None),
+):
+    """
+    Locate a snippet in the PDF. By default coordinates are for the client's own
+    4x canvas at 96 DPI; pass `zoom` to get pixel coordinates on the matching
+    /api/page-image render instead.
+    """
     filepath = os.path.join(UPLOAD_DIR, file)
     if not os.path.exists(filepath):
-        print(f"❌ File not found: {filepath}")
+        logger.warning(f"File not found: {filepath}")
         return {"highlight": None}
 
     try:
         doc = fitz.open(filepath)
+        file_hash = compute_file_hash(filepath)
+        queries = snippet_queries(text)
 
         for page_num, page in enumerate(doc):
-            blocks = page.get_text("dict")["blocks"]
-            sentences = []
-            for b in blocks:
-                for l in b.get("lines", []):
-                    line_text = " ".join([s["text"] for s in l.get("spans", [])])
-                    sentences.append(line_text)
-
-            match, score = find_best_match(text, sentences, page_num)
+            # Extracted + normalized lines are memoized per file content and page
+            lines = cached_page_lines((file_hash, page_num), lambda: page_lines(page))
+
+            match, score = find_best_match(queries, lines, threshold=0.7)
             if match:
-                print(f"[✅ Found fuzzy match on page {page_num + 1}] ({score:.2f})")
-                print(f"[🟨 Matched text]: {match}")
+                logger.debug(f"Found fuzzy match on page {page_num + 1} ({score:.2f}): {match}")
 
                 # Try multiple search strategies
                 rects = page.search_for(match)
@@ -85,7 +99,7 @@ def highlight_snippet(file: str = Query(...), text: str = Query(...)):
                     if len(words) > 3:
                         shorter_match = " ".join(words[:3])  # Try first 3 words
                         rects = page.search_for(shorter_match)
-                        print(f"[🔍 Trying shorter match]: '{shorter_match}'")
+                        logger.debug(f"Trying shorter match: '{shorter_match}'")
                 
                 if not rects:
                     # Try searching for individual words
@@ -93,15 +107,20 @@ def highlight_snippet(file: str = Query(...), text: str = Query(...)):
                         if len(word) > 3:  # Skip short words
                             rects = page.search_for(word)
                             if rects:
-                                print(f"[🔍 Found match with word]: '{word}'")
+                                logger.debug(f"Found match with word: '{word}'")
                                 break
                 
                 if rects:
                     rect = rects[0]
                     
                     # Convert PDF coordinates to canvas coordinates
-                    scale_factor = 4.0
-                    dpi_ratio = 96 / 72
+                    if zoom is None:
+                        scale_factor = 4.0
+                        dpi_ratio = 96 / 72
+                    else:
+                        # Server-rendered pages are zoom pixels per PDF point
+                        scale_factor = normalize_zoom(zoom)
+                        dpi_ratio = 1.0
                     # Expand the width to cover more of the sentence
                     original_x = rect.x0 * dpi_ratio * scale_factor
                     expanded_width = min(rect.width * dpi_ratio * scale_factor * 2, 800)  # Double width, max 600px
@@ -117,17 +136,17 @@ def highlight_snippet(file: str = Query(...), text: str = Query(...)):
                         "height": max(rect.height * dpi_ratio * scale_factor, min_height)
                     }
                     
-                    print(f"[📦 Returning highlight]: {highlight_data}")
+                    logger.debug(f"Returning highlight: {highlight_data}")
                     return {"highlight": highlight_data}
                 else:
-                    print("[⚠️ Fuzzy match found but no bounding box]")
+                    logger.info("Fuzzy match found but no bounding box")
                     return {"highlight": None}
             else:
-                print(f"[ Page {page_num + 1}] No fuzzy match above threshold")
+                logger.debug(f"Page {page_num + 1}: no fuzzy match above threshold")
 
-        print("[❌ No match found across all pages]")
+        logger.info(f"No match found across all pages of {file}")
         return {"highlight": None}
 
     except Exception as e:
-        print(f"[🔥 Exception in highlight_snippet]: {e}")
+        logger.error(f"Exception in highlight_snippet: {e}", exc_info=True)
         return {"error": str(e)}
@@ -8,4 +8,119 @@ load_dotenv()
 class Settings:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 
+    # Model providers. LLM_PROVIDER: "openai" or "fake"; EMBEDDING_PROVIDER: "openai",
+    # "huggingface" or "fake"; SENTENCE_ENCODER_PROVIDER: "sentence_transformers" or "fake".
+    # The fakes are deterministic, need no network and sleep FAKE_*_LATENCY_MS per call,
+    # for load tests. Changing the embedding provider changes vector dimensions, so
+    # point CHROMA_DIR at a separate store when switching.
+    LLM_PROVIDER = os.getenv("LLM_PROVIDER", "openai")
+    LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini-2024-07-18")
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+    EMBEDDING_MODEL = os.getenv(
+        "EMBEDDING_MODEL",
+        "sentence-transformers/all-MiniLM-L6-v2" if EMBEDDING_PROVIDER == "huggingface" else "text-embedding-3-large",
+    )
+    SENTENCE_ENCODER_PROVIDER = os.getenv("SENTENCE_ENCODER_PROVIDER", "sentence_transformers")
+    FAKE_EMBEDDING_DIM = int(os.getenv("FAKE_EMBEDDING_DIM", 256))
+    FAKE_LLM_LATENCY_MS = float(os.getenv("FAKE_LLM_LATENCY_MS", 0))
+    FAKE_EMBEDDING_LATENCY_MS = float(os.getenv("FAKE_EMBEDDING_LATENCY_MS", 0))
+
+    # Table extraction: camelot only runs on pages flagged by the PyMuPDF pre-pass,
+    # spread across a process pool. Results are cached per file content hash.
+    TABLE_WORKERS = int(os.getenv("TABLE_WORKERS", os.cpu_count() or 1))
+    TABLE_CACHE_DIR = os.getenv("TABLE_CACHE_DIR", "table_cache")
+
+    # Vector storage: tenants are hashed into VECTOR_SHARDS Chroma stores under CHROMA_DIR.
+    # Idle shard handles are closed after SHARD_IDLE_SECONDS.
+    CHROMA_DIR = os.getenv("CHROMA_DIR", "chroma_store")
+    VECTOR_SHARDS = int(os.getenv("VECTOR_SHARDS", 16))
+    SHARD_IDLE_SECONDS = float(os.getenv("SHARD_IDLE_SECONDS", 300))
+
+    # Two-stage retrieval: once a tenant has ROUTING_MIN_DOCUMENTS documents, queries
+    # first pick the ROUTING_TOP_DOCUMENTS best-matching documents, then search their chunks.
+    # Scoped questions (documents, sections or chunk types) are never routed.
+    DOCUMENT_ROUTING = os.getenv("DOCUMENT_ROUTING", "true").lower() == "true"
+    ROUTING_MIN_DOCUMENTS = int(os.getenv("ROUTING_MIN_DOCUMENTS", 20))
+    ROUTING_TOP_DOCUMENTS = int(os.getenv("ROUTING_TOP_DOCUMENTS", 5))
+
+    # Retrieval depth: RETRIEVAL_K for whole-corpus questions, SCOPED_RETRIEVAL_K when the
+    # question is scoped to specific documents, sections or chunk types.
+    RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", 15))
+    SCOPED_RETRIEVAL_K = int(os.getenv("SCOPED_RETRIEVAL_K", 6))
+
+    # Batch chat: at most BATCH_MAX_QUESTIONS per request, answered with up to
+    # BATCH_LLM_CONCURRENCY LLM calls in flight (a request may ask for fewer). Each
+    # answer is admitted to the chat pool, so it must not exceed CHAT_PER_TENANT
+    # (a warning is logged at startup if it does). An answer waits up to
+    # BATCH_ADMISSION_TIMEOUT seconds for a chat slot before its line is a 429.
+    BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", 500))
+    BATCH_LLM_CONCURRENCY = int(os.getenv("BATCH_LLM_CONCURRENCY", 4))
+    BATCH_ADMISSION_TIMEOUT = float(os.getenv("BATCH_ADMISSION_TIMEOUT", 60))
+
+    # Sentence encoder used for source reranking; concurrent encode calls are
+    # micro-batched for up to ENCODER_MAX_WAIT_MS or ENCODER_MAX_BATCH_SIZE texts.
+    SENTENCE_ENCODER_MODEL = os.getenv("SENTENCE_ENCODER_MODEL", "all-MiniLM-L6-v2")
+    ENCODER_MAX_BATCH_SIZE = int(os.getenv("ENCODER_MAX_BATCH_SIZE", 64))
+    ENCODER_MAX_WAIT_MS = float(os.getenv("ENCODER_MAX_WAIT_MS", 5))
+
+    # PDF serving: optional linearized ("fast web view") copies written at ingestion
+    # (needs pikepdf or the qpdf command; turned off at startup without either),
+    # and the Cache-Control sent with every PDF (ETags make revalidation cheap).
+    LINEARIZE_PDFS = os.getenv("LINEARIZE_PDFS", "false").lower() == "true"
+    LINEARIZED_DIR = os.getenv("LINEARIZED_DIR", "linearized_files")
+    PDF_CACHE_CONTROL = os.getenv("PDF_CACHE_CONTROL", "private, max-age=300, must-revalidate")
+
+    # Server-side page rendering for the viewer: size-bounded on-disk LRU cache of
+    # rendered pages, optional background pre-render after ingestion (first
+    # PRERENDER_PAGES pages, 0 = off) and of documents viewed often enough.
+    PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", "page_cache")
+    PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+    PRERENDER_PAGES = int(os.getenv("PRERENDER_PAGES", 0))
+    PRERENDER_ZOOM = float(os.getenv("PRERENDER_ZOOM", 2.0))
+    PRERENDER_POPULARITY_THRESHOLD = int(os.getenv("PRERENDER_POPULARITY_THRESHOLD", 0))
+    PRERENDER_WORKERS = int(os.getenv("PRERENDER_WORKERS", 2))
+
+    # Admission control: separate bounded executors for ingestion, chat and light
+    # metadata/auth routes, each with a per-tenant cap and a maximum queue depth.
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 2))
+    INGEST_PER_TENANT = int(os.getenv("INGEST_PER_TENANT", 1))
+    INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", 8))
+    CHAT_WORKERS = int(os.getenv("CHAT_WORKERS", 16))
+    CHAT_PER_TENANT = int(os.getenv("CHAT_PER_TENANT", 4))
+    CHAT_MAX_QUEUE = int(os.getenv("CHAT_MAX_QUEUE", 64))
+    LIGHT_WORKERS = int(os.getenv("LIGHT_WORKERS", 8))
+    LIGHT_PER_TENANT = int(os.getenv("LIGHT_PER_TENANT", 8))
+    LIGHT_MAX_QUEUE = int(os.getenv("LIGHT_MAX_QUEUE", 128))
+    ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", 5))
+
+    # Multi-worker ingestion: a worker claims each file before processing it; a claim
+    # older than JOB_CLAIM_TTL seconds (or whose process died) can be taken over.
+    JOB_CLAIM_TTL = float(os.getenv("JOB_CLAIM_TTL", 3600))
+
+    # Tenant warm-up: logging in schedules a background warm-up of the tenant's shard,
+    # index and encoder in every worker process (requests are shared through a file
+    # each worker polls every WARM_SYNC_SECONDS); up to WARM_TENANTS_MAX tenants per
+    # worker stay warm until idle for WARM_TENANT_IDLE_SECONDS. Warm tenants keep
+    # their shards open, on at most WARM_PINNED_SHARDS_MAX shards.
+    WARM_ON_LOGIN = os.getenv("WARM_ON_LOGIN", "true").lower() == "true"
+    WARM_TENANTS_MAX = int(os.getenv("WARM_TENANTS_MAX", 64))
+    WARM_TENANT_IDLE_SECONDS = float(os.getenv("WARM_TENANT_IDLE_SECONDS", 900))
+    WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", 2))
+    WARM_SYNC_SECONDS = float(os.getenv("WARM_SYNC_SECONDS", 2))
+    WARM_PINNED_SHARDS_MAX = int(os.getenv("WARM_PINNED_SHARDS_MAX", max(VECTOR_SHARDS // 2, 1)))
+
+    # Observability: LOG_FORMAT is "text" or "json"; OTEL_TRACING opens an
+    # OpenTelemetry span per pipeline stage when opentelemetry is installed
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+    LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+    OTEL_TRACING = os.getenv("OTEL_TRACING", "false").lower() == "true"
+
+    # Vector index mode: "chroma" searches the Chroma collection directly; "compact"
+    # searches a quantized side index and rescores the top candidates exactly.
+    VECTOR_INDEX_MODE = os.getenv("VECTOR_INDEX_MODE", "chroma")
+    COMPACT_INDEX_DIR = os.getenv("COMPACT_INDEX_DIR", "compact_index")
+    COMPACT_INDEX_QUANTIZATION = os.getenv("COMPACT_INDEX_QUANTIZATION", "int8")  # or "truncate"
+    COMPACT_INDEX_TRUNCATE_DIM = int(os.getenv("COMPACT_INDEX_TRUNCATE_DIM", 256))
+    COMPACT_INDEX_RESCORE_CANDIDATES = int(os.getenv("COMPACT_INDEX_RESCORE_CANDIDATES", 100))
+
 settings = Settings()
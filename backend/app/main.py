@@ -1,21 +1,28 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from app.api import chat, upload, processing, list_files
 from fastapi.middleware.cors import CORSMiddleware
 from app.api.endpoints import auth_endpoint
 from app.api import viewer  # ✅ correct import
-from fastapi.staticfiles import StaticFiles
 import os
+import time
 from app.api.delete import router as delete_router
 from app.api.serve_files import router as serve_files_router
+from app.api.stats import router as stats_router
+from app.api.snapshots import router as snapshots_router
+from app.core.config import settings
+from app.core.logging_config import configure_logging
+from app.services.linearize_service import check_linearization
+from app.services.metrics import REQUEST_LATENCY, render_metrics
+from app.services.table_service import shutdown_table_pool
+from app.services.warmup_service import warm_tenants
 
+configure_logging()
 
 app = FastAPI()
 
 UPLOAD_DIR = os.path.abspath("uploaded_files")  # ✅ ensure absolute path
 
-# ✅ Mount /files to serve the actual PDF files
-app.mount("/files", StaticFiles(directory=UPLOAD_DIR), name="uploaded_files")
-
 
 
 app.add_middleware(
@@ -24,8 +31,29 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Let the PDF viewer see range/validator headers on cross-origin responses
+    expose_headers=["Accept-Ranges", "Content-Range", "Content-Length", "ETag"],
 )
 
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        # Label by route template (/files/{filename}), not the raw path, to keep cardinality bounded
+        route = request.scope.get("route")
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - start,
+            method=request.method,
+            route=route.path if route else "unmatched",
+            status=status,
+        )
+
 app.include_router(chat.router, prefix="/api/v2/chat")
 app.include_router(upload.router, prefix="/api/v2/uploads")
 app.include_router(processing.router, prefix="/api/v2/documents")
@@ -37,6 +65,33 @@ app.include_router(delete_router, prefix="/api/v2/documents")
 # this is for the version with pdf-viewer-core
 
 app.include_router(serve_files_router, prefix="/api")
+# /files serves the actual PDF files (same Range/ETag handling as /api/files)
+app.include_router(serve_files_router)
+app.include_router(stats_router, prefix="/api/stats")
+app.include_router(snapshots_router, prefix="/api/v2/admin")
+
+
+@app.on_event("startup")
+def start_warm_sync():
+    # Every worker polls the shared warm-up requests, so a login warms the tenant in all of them
+    if settings.WARM_ON_LOGIN:
+        warm_tenants.start_sync(settings.WARM_SYNC_SECONDS)
+
+
+@app.on_event("startup")
+def check_settings():
+    check_linearization()
+    chat.check_batch_concurrency()
+
+
+@app.on_event("shutdown")
+def stop_table_workers():
+    shutdown_table_pool()
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 
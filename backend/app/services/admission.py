@@ -0,0 +1,182 @@
+# services/admission.py
+"""
+Admission control for the API's blocking work.
+
+Instead of every sync route sharing AnyIO's default threadpool, work is split
+into classes with their own bounded executors: CPU-heavy ingestion, LLM-bound
+chat and lightweight metadata/auth routes. Each pool caps how many requests a
+single tenant may have admitted at once and how many may wait for a worker;
+past either limit the request is rejected immediately with 429 and a
+Retry-After header instead of queueing without bound. Callers that would
+rather wait a bounded time for a slot (batch answers) use run_waiting.
+"""
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.services.metrics import CallbackGauge, Counter as MetricCounter, Histogram, registry
+
+STATS_WINDOW = 1000  # recent queue waits kept for the stats summary
+ADMISSION_POLL_SECONDS = 0.05  # how often run_waiting retries admission
+
+QUEUE_WAIT = registry.register(Histogram(
+    "admission_queue_wait_seconds", "Time admitted work waited for a pool worker.", labels=("pool",),
+))
+REJECTED = registry.register(MetricCounter(
+    "admission_rejected_total", "Requests rejected with 429 by pool and reason.", labels=("pool", "reason"),
+))
+
+
+class AdmissionPool:
+    def __init__(self, name: str, max_workers: int, per_tenant_limit: int, max_queue: int,
+                 retry_after: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.per_tenant_limit = per_tenant_limit
+        self.max_queue = max_queue
+        self.retry_after = retry_after
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._admitted = 0
+        self._running = 0
+        self._per_tenant = Counter()
+        self._rejected = 0
+        self._waits = deque(maxlen=STATS_WINDOW)
+
+    def _reject(self, reason: str):
+        self._rejected += 1
+        REJECTED.inc(pool=self.name, reason=reason)
+        raise HTTPException(
+            status_code=429,
+            detail=f"{self.name} is busy ({reason}), retry later",
+            headers={"Retry-After": str(self.retry_after)},
+        )
+
+    def _try_admit(self, tenant: str):
+        """Admit the tenant's work; returns None, or why it cannot be admitted now. Called with the lock held."""
+        if self._per_tenant[tenant] >= self.per_tenant_limit:
+            return "per-tenant limit reached"
+        if self._admitted >= self.max_workers + self.max_queue:
+            return "queue full"
+        self._admitted += 1
+        self._per_tenant[tenant] += 1
+        return None
+
+    def _admit(self, tenant: str):
+        with self._lock:
+            reason = self._try_admit(tenant)
+            if reason:
+                self._reject(reason)
+
+    def _release(self, tenant: str):
+        with self._lock:
+            self._admitted -= 1
+            self._per_tenant[tenant] -= 1
+            if not self._per_tenant[tenant]:
+                del self._per_tenant[tenant]
+
+    async def run(self, tenant: str, fn, *args, **kwargs):
+        """Run fn(*args, **kwargs) on this pool's executor, or raise 429 if saturated."""
+        self._admit(tenant)
+        return await self._submit(tenant, fn, *args, **kwargs)
+
+    async def run_waiting(self, tenant: str, timeout: float, fn, *args, **kwargs):
+        """Like run, but waits up to `timeout` seconds for a slot before raising 429."""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                reason = self._try_admit(tenant)
+                if reason and time.monotonic() >= deadline:
+                    self._reject(reason)
+            if not reason:
+                return await self._submit(tenant, fn, *args, **kwargs)
+            await asyncio.sleep(ADMISSION_POLL_SECONDS)
+
+    async def _submit(self, tenant: str, fn, *args, **kwargs):
+        # Called once admitted
+        enqueued_at = time.perf_counter()
+
+        def call():
+            waited = time.perf_counter() - enqueued_at
+            QUEUE_WAIT.observe(waited, pool=self.name)
+            with self._lock:
+                self._running += 1
+                self._waits.append(waited)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._running -= 1
+
+        try:
+            future = self._executor.submit(call)
+        except BaseException:
+            self._release(tenant)
+            raise
+        # Released when the work ends (or is cancelled before it started), not when the
+        # awaiting request goes away: the caps must keep counting a thread still running fn
+        future.add_done_callback(lambda _future: self._release(tenant))
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            waits_ms = np.asarray(self._waits or [0.0]) * 1000
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "per_tenant_limit": self.per_tenant_limit,
+                "running": self._running,
+                "queued": self._admitted - self._running,
+                "tenants": len(self._per_tenant),
+                "rejected": self._rejected,
+                "queue_wait_ms_mean": float(waits_ms.mean()),
+                "queue_wait_ms_p95": float(np.percentile(waits_ms, 95)),
+                "queue_wait_ms_max": float(waits_ms.max()),
+            }
+
+
+ingest_pool = AdmissionPool(
+    "ingest",
+    max_workers=settings.INGEST_WORKERS,
+    per_tenant_limit=settings.INGEST_PER_TENANT,
+    max_queue=settings.INGEST_MAX_QUEUE,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+chat_pool = AdmissionPool(
+    "chat",
+    max_workers=settings.CHAT_WORKERS,
+    per_tenant_limit=settings.CHAT_PER_TENANT,
+    max_queue=settings.CHAT_MAX_QUEUE,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+light_pool = AdmissionPool(
+    "metadata",
+    max_workers=settings.LIGHT_WORKERS,
+    per_tenant_limit=settings.LIGHT_PER_TENANT,
+    max_queue=settings.LIGHT_MAX_QUEUE,
+    retry_after=settings.ADMISSION_RETRY_AFTER,
+)
+
+
+def admission_stats() -> dict:
+    return {pool.name: pool.stats() for pool in (ingest_pool, chat_pool, light_pool)}
+
+
+def _pool_gauge(field: str):
+    def read():
+        return {(name,): stats[field] for name, stats in admission_stats().items()}
+    return read
+
+
+registry.register(CallbackGauge(
+    "admission_running", "Work items currently executing per pool.", ("pool",), _pool_gauge("running"),
+))
+registry.register(CallbackGauge(
+    "admission_queued", "Admitted work items waiting for a worker per pool.", ("pool",), _pool_gauge("queued"),
+))
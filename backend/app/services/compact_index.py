@@ -0,0 +1,369 @@
+# services/compact_index.py
+"""
+Compact per-tenant vector index.
+
+Alongside each tenant's Chroma collection we keep a small first-pass index
+(int8-quantized or truncated-dimension vectors) plus the full-precision float32
+vectors in a flat file, so only the rows of the top candidates are ever paged
+in for exact rescoring. Every file is memory-mapped: loading an index reads
+only meta.json, and a document's row is decoded when it is returned or when a
+filter first needs that metadata key. The float32 copy duplicates vectors
+Chroma also stores, so on disk this mode costs Chroma plus the side index.
+
+Layout of compact_index/<collection>/:
+    CURRENT       name of the live version directory, replaced atomically
+    <version>/    one complete build:
+        meta.json     {"mode", "dim", "first_pass_dim", "count"}
+        codes.npy     int8 (count, dim) or float16 (count, first_pass_dim)
+        scales.npy    float32 (count,) per-vector int8 scale (int8 mode only)
+        full.f32      float32 (count, dim), raw, for np.memmap
+        docs.bin      one JSON {"id", "content", "metadata"} per row, concatenated
+        offsets.npy   int64 (count + 1,) byte offsets of the rows in docs.bin
+
+Builds from before docs.bin have docs.json ([{"id", "content", "metadata"}]),
+which is still read.
+
+A rebuild writes a new version directory and then swaps CURRENT, so a
+concurrent load sees either the old build or the new one, never a mix of
+files from both. The previous version is kept for loads already in flight;
+older ones are removed. Callers build while holding the shard's write lock,
+so builds are published in the order of the writes they reflect.
+"""
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+from collections import defaultdict
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+SCORE_BLOCK_FLOATS = 1 << 18  # float32 scratch per first-pass block (1 MB), small enough to stay in cache
+
+CURRENT_FILE = "CURRENT"
+KEEP_VERSIONS = 2  # the live version and the one before it
+
+_loaded = {}  # index dir -> ((version, meta.json mtime), CompactIndex)
+_loaded_lock = threading.Lock()
+
+
+def _index_dir(collection_name: str) -> str:
+    return os.path.join(settings.COMPACT_INDEX_DIR, collection_name)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _write_atomic(path: str, write):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def metadata_matches(metadata: dict, where: dict) -> bool:
+    """Evaluate the subset of Chroma `where` syntax we use ($and, $or, $in, $eq, $ne, equality)."""
+    for key, condition in where.items():
+        if key == "$and":
+            if not all(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif key == "$or":
+            if not any(metadata_matches(metadata, clause) for clause in condition):
+                return False
+        elif isinstance(condition, dict):
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op == "$in" and value not in operand:
+                    return False
+                if op == "$nin" and value in operand:
+                    return False
+                if op == "$eq" and value != operand:
+                    return False
+                if op == "$ne" and value == operand:
+                    return False
+        elif metadata.get(key) != condition:
+            return False
+    return True
+
+
+def _current_version(index_dir: str):
+    """Name of the live version directory ("." for an index built before versioning), or None."""
+    try:
+        with open(os.path.join(index_dir, CURRENT_FILE), "r") as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        pass
+    if os.path.exists(os.path.join(index_dir, "meta.json")):
+        return "."  # flat layout: files directly in index_dir, until the next rebuild
+    return None
+
+
+def _remove_old_versions(index_dir: str, current: str):
+    versions = sorted(
+        name for name in os.listdir(index_dir)
+        if name.startswith("v") and os.path.isdir(os.path.join(index_dir, name))
+    )
+    # Version names sort by build time; keep the newest few (always including current)
+    for name in versions[:-KEEP_VERSIONS]:
+        if name != current:
+            shutil.rmtree(os.path.join(index_dir, name), ignore_errors=True)
+
+
+def build_compact_index(collection_name: str, ids, embeddings, documents, metadatas):
+    """(Re)write the compact index for a collection from its stored vectors."""
+    index_dir = _index_dir(collection_name)
+    version = f"v{time.time_ns():020d}-{os.getpid()}"
+    version_dir = os.path.join(index_dir, version)
+    os.makedirs(version_dir)
+
+    full = _normalize(np.asarray(embeddings, dtype=np.float32))
+    if full.ndim != 2:
+        full = full.reshape(0, 0)
+    count, dim = full.shape
+    mode = settings.COMPACT_INDEX_QUANTIZATION
+
+    if mode == "int8":
+        scales = np.abs(full).max(axis=1) / 127.0 if count else np.zeros(0, dtype=np.float32)
+        scales[scales == 0] = 1.0
+        codes = np.round(full / scales[:, None]).astype(np.int8)
+        first_pass_dim = dim
+        _write_atomic(os.path.join(version_dir, "scales.npy"), lambda f: np.save(f, scales.astype(np.float32)))
+    elif mode == "truncate":
+        first_pass_dim = min(settings.COMPACT_INDEX_TRUNCATE_DIM, dim)
+        codes = _normalize(full[:, :first_pass_dim]).astype(np.float16)
+    else:
+        shutil.rmtree(version_dir, ignore_errors=True)
+        raise ValueError(f"Unknown COMPACT_INDEX_QUANTIZATION: {mode}")
+
+    rows = [
+        json.dumps({"id": doc_id, "content": content, "metadata": metadata or {}}).encode()
+        for doc_id, content, metadata in zip(ids, documents, metadatas)
+    ]
+    offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum([len(row) for row in rows], out=offsets[1:])
+
+    _write_atomic(os.path.join(version_dir, "codes.npy"), lambda f: np.save(f, codes))
+    _write_atomic(os.path.join(version_dir, "full.f32"), lambda f: f.write(full.tobytes()))
+    _write_atomic(os.path.join(version_dir, "docs.bin"), lambda f: f.writelines(rows))
+    _write_atomic(os.path.join(version_dir, "offsets.npy"), lambda f: np.save(f, offsets))
+    meta = {"mode": mode, "dim": dim, "first_pass_dim": first_pass_dim, "count": count}
+    _write_atomic(os.path.join(version_dir, "meta.json"), lambda f: f.write(json.dumps(meta).encode()))
+    # The swap that publishes the build
+    _write_atomic(os.path.join(index_dir, CURRENT_FILE), lambda f: f.write(version.encode()))
+    _remove_old_versions(index_dir, version)
+    logger.info(f"Built {mode} compact index for {collection_name}: {count} vectors x {dim}")
+
+
+def build_compact_index_from_store(collection_name: str, vectorstore, where: dict = None):
+    data = vectorstore.get(where=where, include=["embeddings", "documents", "metadatas"])
+    build_compact_index(
+        collection_name,
+        data["ids"],
+        data["embeddings"] if data["embeddings"] is not None else [],
+        data["documents"],
+        data["metadatas"],
+    )
+
+
+class _DocTable:
+    """Read-only list of a build's document rows, decoded from the memory-mapped docs.bin on access."""
+
+    def __init__(self, index_dir: str):
+        self._offsets = np.load(os.path.join(index_dir, "offsets.npy"), mmap_mode="r")
+        path = os.path.join(index_dir, "docs.bin")
+        # np.memmap refuses empty files
+        self._data = np.memmap(path, dtype=np.uint8, mode="r") if os.path.getsize(path) else b""
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, row: int) -> dict:
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(bytes(self._data[start:end]))
+
+    def __iter__(self):
+        return (self[row] for row in range(len(self)))
+
+
+class CompactIndex:
+    def __init__(self, index_dir: str):
+        with open(os.path.join(index_dir, "meta.json"), "r") as f:
+            self.meta = json.load(f)
+        self.count = self.meta["count"]
+        self.dim = self.meta["dim"]
+        self.mode = self.meta["mode"]
+        self.codes = np.load(os.path.join(index_dir, "codes.npy"), mmap_mode="r")
+        self.scales = (
+            np.load(os.path.join(index_dir, "scales.npy"), mmap_mode="r") if self.mode == "int8" else None
+        )
+        self.full = (
+            np.memmap(os.path.join(index_dir, "full.f32"), dtype=np.float32, mode="r",
+                      shape=(self.count, self.dim))
+            if self.count else np.zeros((0, self.dim), dtype=np.float32)
+        )
+        if os.path.exists(os.path.join(index_dir, "docs.bin")):
+            self.docs = _DocTable(index_dir)
+        else:
+            with open(os.path.join(index_dir, "docs.json"), "r") as f:
+                self.docs = json.load(f)
+        rows = {len(self.codes), len(self.full), len(self.docs)}
+        if self.scales is not None:
+            rows.add(len(self.scales))
+        if rows != {self.count}:
+            raise ValueError(f"Inconsistent compact index in {index_dir}: row counts {sorted(rows)}, meta {self.count}")
+        self._columns = {}  # metadata key -> {value: row indices}
+        self._columns_lock = threading.Lock()
+
+    def _first_pass_scores(self, query: np.ndarray) -> np.ndarray:
+        # Codes are widened to float32 a cache-sized block at a time: numpy has no
+        # BLAS kernel for int8 or float16, and widening everything at once is slower
+        if self.mode == "int8":
+            first_pass = query
+        else:
+            first_pass = _normalize(query[:self.meta["first_pass_dim"]])
+        rows = max(SCORE_BLOCK_FLOATS // max(len(first_pass), 1), 1)
+        scores = np.empty(self.count, dtype=np.float32)
+        for start in range(0, self.count, rows):
+            scores[start:start + rows] = self.codes[start:start + rows].astype(np.float32) @ first_pass
+        if self.mode == "int8":
+            scores *= self.scales
+        return scores
+
+    def search(self, query_vector, k: int, candidates: int = None, mask: np.ndarray = None):
+        """Return [(row, score)] for the top-k rows by exact cosine similarity."""
+        if not self.count:
+            return []
+        query = _normalize(np.asarray(query_vector, dtype=np.float32))
+        scores = self._first_pass_scores(query)
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+            eligible = int(mask.sum())
+        else:
+            eligible = self.count
+        if not eligible:
+            return []
+
+        candidates = min(max(candidates or settings.COMPACT_INDEX_RESCORE_CANDIDATES, k), eligible)
+        top = np.argpartition(-scores, candidates - 1)[:candidates]
+        top.sort()  # sequential memmap reads
+        exact = self.full[top] @ query
+        order = np.argsort(-exact)[:k]
+        return [(int(top[i]), float(exact[i])) for i in order]
+
+    def mask(self, where: dict = None):
+        """
+        Boolean row mask for a `where` clause, or None when unfiltered. Same
+        result as metadata_matches on every row, computed from per-key
+        value -> rows columns built on a key's first use.
+        """
+        if not where:
+            return None
+        return self._where_mask(where)
+
+    def _column(self, key: str) -> dict:
+        with self._columns_lock:
+            column = self._columns.get(key)
+        if column is not None:
+            return column
+        groups = defaultdict(list)
+        for row, doc in enumerate(self.docs):
+            groups[doc["metadata"].get(key)].append(row)
+        column = {value: np.asarray(rows, dtype=np.int64) for value, rows in groups.items()}
+        with self._columns_lock:
+            self._columns[key] = column
+        return column
+
+    def _rows_with(self, key: str, values) -> np.ndarray:
+        column = self._column(key)
+        mask = np.zeros(self.count, dtype=bool)
+        for value in values:
+            rows = column.get(value)
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _where_mask(self, where: dict) -> np.ndarray:
+        mask = np.ones(self.count, dtype=bool)
+        for key, condition in where.items():
+            if key == "$and":
+                for clause in condition:
+                    mask &= self._where_mask(clause)
+            elif key == "$or":
+                either = np.zeros(self.count, dtype=bool)
+                for clause in condition:
+                    either |= self._where_mask(clause)
+                mask &= either
+            elif isinstance(condition, dict):
+                for op, operand in condition.items():
+                    if op == "$in":
+                        mask &= self._rows_with(key, operand)
+                    elif op == "$nin":
+                        mask &= ~self._rows_with(key, operand)
+                    elif op == "$eq":
+                        mask &= self._rows_with(key, [operand])
+                    elif op == "$ne":
+                        mask &= ~self._rows_with(key, [operand])
+            else:
+                mask &= self._rows_with(key, [condition])
+        return mask
+
+    def documents(self, hits) -> List[Document]:
+        rows = [self.docs[row] for row, _score in hits]
+        return [Document(page_content=doc["content"], metadata=doc["metadata"]) for doc in rows]
+
+
+def load_compact_index(collection_name: str):
+    """Return the tenant's CompactIndex, or None if it has not been built."""
+    index_dir = _index_dir(collection_name)
+    for attempt in range(2):
+        version = _current_version(index_dir)
+        if version is None:
+            return None
+        version_dir = os.path.join(index_dir, version)
+        try:
+            stamp = (version, os.stat(os.path.join(version_dir, "meta.json")).st_mtime_ns)
+            with _loaded_lock:
+                cached = _loaded.get(index_dir)
+                if cached and cached[0] == stamp:
+                    return cached[1]
+            index = CompactIndex(version_dir)
+            break
+        except FileNotFoundError:
+            # Two rebuilds landed between reading CURRENT and opening the files
+            if attempt:
+                raise
+    with _loaded_lock:
+        _loaded[index_dir] = (stamp, index)
+    return index
+
+
+class CompactRetriever(BaseRetriever):
+    """Retriever over a CompactIndex; mirrors the Chroma retriever's k handling."""
+    index: Any
+    embeddings: Any
+    k: int = 4
+    filter: Optional[dict] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        return self.search_by_vector(query_vector, self.filter)
+
+    def search_by_vector(self, query_vector, where: dict = None) -> List[Document]:
+        hits = self.index.search(query_vector, self.k, mask=self.index.mask(where))
+        return self.index.documents(hits)
@@ -0,0 +1,134 @@
+# services/document_router.py
+"""
+Two-stage retrieval for tenants with many documents.
+
+At ingestion each document gets one summary embedding built from its filename,
+section titles and leading text, stored in a per-shard "document_summaries"
+collection. At query time the question embedding first picks the top-N
+candidate documents from those summaries, then chunk search runs only inside
+them through a `source` metadata pre-filter.
+"""
+import hashlib
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain.docstore.document import Document
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.retrievers import BaseRetriever
+
+from app.core.config import settings
+from app.services.shard_store import TENANT_KEY, shard_generation, tenant_filter
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_COLLECTION = "document_summaries"
+SUMMARY_LEADING_CHARS = 1500
+
+# user_id -> (shard generation, summary count); a write to the shard from any worker invalidates it
+_routable_counts: Dict[str, Tuple[int, int]] = {}
+_routable_lock = threading.Lock()
+
+
+def summary_id(user_id: str, filename: str) -> str:
+    return hashlib.sha256(f"{user_id}\x00{filename}".encode("utf-8")).hexdigest()
+
+
+def build_document_summary(filename: str, section_titles: List[str], pages: List[str]) -> str:
+    """Short routing text: filename, distinct section titles, then the document's opening text."""
+    titles = list(dict.fromkeys(section_titles))
+    leading = " ".join(" ".join(page.split()) for page in pages)[:SUMMARY_LEADING_CHARS]
+    parts = [filename]
+    if titles:
+        parts.append("Sections: " + ", ".join(titles))
+    parts.append(leading)
+    return "\n".join(parts)
+
+
+def upsert_document_summary(summaries, user_id: str, filename: str, summary: str, chunks: int):
+    summaries.add_texts(
+        texts=[summary],
+        metadatas=[{TENANT_KEY: user_id, "source": filename, "chunks": chunks}],
+        ids=[summary_id(user_id, filename)],
+    )
+    _forget_routable_count(user_id)
+
+
+def delete_document_summary(summaries, user_id: str, filename: str):
+    summaries.delete(ids=[summary_id(user_id, filename)])
+    _forget_routable_count(user_id)
+
+
+def _forget_routable_count(user_id: str):
+    with _routable_lock:
+        _routable_counts.pop(user_id, None)
+
+
+def count_routable_documents(summaries, user_id: str) -> int:
+    """
+    Number of the tenant's documents with a summary. Cached until the shard's
+    generation changes, so chat queries don't scan the summaries every time.
+    """
+    generation = shard_generation(user_id)  # read before counting, so a racing write forces a recount
+    with _routable_lock:
+        cached = _routable_counts.get(user_id)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+    count = len(summaries.get(where=tenant_filter(user_id), include=[])["ids"])
+    with _routable_lock:
+        _routable_counts[user_id] = (generation, count)
+    return count
+
+
+def route_by_vector(summaries, user_id: str, query_vector, top_n: int, where: dict = None) -> List[str]:
+    """Filenames of the top-N documents whose summaries best match the query."""
+    hits = summaries.similarity_search_by_vector(
+        query_vector, k=top_n, filter=tenant_filter(user_id, where)
+    )
+    return [doc.metadata["source"] for doc in hits]
+
+
+def source_filter(sources: List[str], extra: dict = None) -> dict:
+    clause = {"source": {"$in": sources}}
+    if not extra:
+        return clause
+    return {"$and": [clause, extra]}
+
+
+class RoutedRetriever(BaseRetriever):
+    """
+    Routes the query to candidate documents, then searches chunks inside them.
+
+    The question is embedded once and that vector drives both stages. Chunk
+    search goes through the compact index when one is given, else the shard store.
+    """
+    user_id: str
+    vectorstore: Any
+    summaries: Any
+    embeddings: Any
+    k: int = 4
+    top_n: int = 5
+    filter: Optional[dict] = None
+    compact: Any = None  # CompactRetriever, when VECTOR_INDEX_MODE=compact
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun = None
+    ) -> List[Document]:
+        query_vector = self.embeddings.embed_query(query)
+        sources = route_by_vector(self.summaries, self.user_id, query_vector, self.top_n)
+        logger.debug(f"Routed query for {self.user_id} to {sources}")
+        if not sources:
+            return []
+
+        where = source_filter(sources, self.filter)
+        if self.compact is not None:
+            return self.compact.search_by_vector(query_vector, where)
+        return self.vectorstore.similarity_search_by_vector(
+            query_vector, k=self.k, filter=tenant_filter(self.user_id, where)
+        )
+
+
+def should_route(summaries, user_id: str) -> bool:
+    if not settings.DOCUMENT_ROUTING:
+        return False
+    return count_routable_documents(summaries, user_id) >= settings.ROUTING_MIN_DOCUMENTS
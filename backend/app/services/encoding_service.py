@@ -0,0 +1,170 @@
+# services/encoding_service.py
+"""
+In-process micro-batching for SentenceTransformer encodes.
+
+Chat requests run on many threadpool threads at once, each wanting a handful of
+sentence embeddings. Instead of each thread running its own small forward pass,
+callers enqueue their texts; a single worker thread collects requests for up to
+ENCODER_MAX_WAIT_MS (or until ENCODER_MAX_BATCH_SIZE texts are waiting), runs
+one batched encode, and hands every caller back its own slice of the result.
+
+There is one encoder per sentence model. Reranking in qa_service uses the
+SENTENCE_ENCODER_MODEL one; with EMBEDDING_PROVIDER=huggingface, chunk,
+summary and query embeddings (ingestion and retrieval) go through the
+EMBEDDING_MODEL one via EncoderEmbeddings, and share it with reranking when
+both name the same model. The viewer matches highlight text with difflib
+and does no encoding.
+"""
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.core.config import settings
+from app.services.metrics import Histogram, registry
+from app.services.providers import get_sentence_model
+
+logger = logging.getLogger(__name__)
+
+STATS_WINDOW = 1000  # recent batches/requests kept for the stats summary
+
+BATCH_SIZE = registry.register(Histogram(
+    "encoder_batch_size", "Texts per batched SentenceTransformer forward pass.",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256),
+))
+QUEUE_WAIT = registry.register(Histogram(
+    "encoder_queue_wait_seconds", "Time an encode request waited to join a batch.",
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+))
+
+
+class _EncodeRequest:
+    __slots__ = ("texts", "future", "enqueued_at")
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.future = Future()
+        self.enqueued_at = time.perf_counter()
+
+
+class BatchingEncoder:
+    def __init__(self, model, max_batch_size: int = None, max_wait_ms: float = None):
+        self.model = model
+        self.max_batch_size = max_batch_size or settings.ENCODER_MAX_BATCH_SIZE
+        self.max_wait = (settings.ENCODER_MAX_WAIT_MS if max_wait_ms is None else max_wait_ms) / 1000
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batch_sizes = deque(maxlen=STATS_WINDOW)
+        self._queue_waits = deque(maxlen=STATS_WINDOW)
+        self._total_batches = 0
+        self._total_texts = 0
+        self._worker = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+        self._worker.start()
+
+    def encode(self, texts) -> np.ndarray:
+        """Encode texts (blocking), sharing a forward pass with concurrent callers."""
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, self.model.get_sentence_embedding_dimension()), dtype=np.float32)
+        request = _EncodeRequest(texts)
+        self._queue.put(request)
+        return request.future.result()
+
+    def _collect(self):
+        first = self._queue.get()
+        batch = [first]
+        size = len(first.texts)
+        deadline = first.enqueued_at + self.max_wait
+        while size < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            batch.append(request)
+            size += len(request.texts)
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            started = time.perf_counter()
+            texts = [text for request in batch for text in request.texts]
+            try:
+                # One collected batch is one forward pass; a large single request (an
+                # ingested document's chunks) is still split into max_batch_size passes
+                embeddings = self.model.encode(texts, batch_size=min(len(texts), self.max_batch_size))
+            except Exception as e:
+                logger.error(f"Batched encode of {len(texts)} texts failed: {e}", exc_info=True)
+                for request in batch:
+                    request.future.set_exception(e)
+                continue
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+
+            BATCH_SIZE.observe(len(texts))
+            for request in batch:
+                QUEUE_WAIT.observe(started - request.enqueued_at)
+            with self._stats_lock:
+                self._total_batches += 1
+                self._total_texts += len(texts)
+                self._batch_sizes.append(len(texts))
+                self._queue_waits.extend(started - request.enqueued_at for request in batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            sizes = np.asarray(self._batch_sizes or [0])
+            waits_ms = np.asarray(self._queue_waits or [0.0]) * 1000
+            return {
+                "total_batches": self._total_batches,
+                "total_texts": self._total_texts,
+                "queue_depth": self._queue.qsize(),
+                "batch_size_mean": float(sizes.mean()),
+                "batch_size_max": int(sizes.max()),
+                "queue_wait_ms_mean": float(waits_ms.mean()),
+                "queue_wait_ms_p95": float(np.percentile(waits_ms, 95)),
+                "queue_wait_ms_max": float(waits_ms.max()),
+            }
+
+
+_encoders = {}  # model name (None: the fake reranking model) -> BatchingEncoder
+_encoder_lock = threading.Lock()
+
+
+def get_sentence_encoder(model_name: str = None) -> BatchingEncoder:
+    """
+    Shared batching encoder for a sentence model, loaded on first use: the
+    reranking model by default, or the named SentenceTransformer.
+    """
+    if model_name is None and settings.SENTENCE_ENCODER_PROVIDER == "fake":
+        key = None
+    else:
+        key = model_name or settings.SENTENCE_ENCODER_MODEL
+    with _encoder_lock:
+        encoder = _encoders.get(key)
+        if encoder is None:
+            encoder = _encoders[key] = BatchingEncoder(get_sentence_model(key))
+        return encoder
+
+
+class EncoderEmbeddings(Embeddings):
+    """What HuggingFaceEmbeddings computes, with encodes batched across concurrent callers."""
+
+    def __init__(self, encoder: BatchingEncoder):
+        self.encoder = encoder
+
+    def embed_documents(self, texts):
+        return self.encoder.encode([text.replace("\n", " ") for text in texts]).tolist()
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
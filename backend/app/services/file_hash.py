@@ -0,0 +1,31 @@
+# services/file_hash.py
+import hashlib
+import os
+import threading
+
+CHUNK_SIZE = 1024 * 1024
+
+# (path, size, mtime_ns) -> sha256 hex digest, so repeated lookups of an
+# unchanged file don't re-read it from disk.
+_hash_cache = {}
+_hash_lock = threading.Lock()
+
+
+def compute_file_hash(path: str) -> str:
+    """Return the sha256 hex digest of a file's content."""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _hash_lock:
+        cached = _hash_cache.get(key)
+    if cached:
+        return cached
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    value = digest.hexdigest()
+
+    with _hash_lock:
+        _hash_cache[key] = value
+    return value
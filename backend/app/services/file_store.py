@@ -0,0 +1,86 @@
+# services/file_store.py
+"""
+Process-safe helpers for the JSON files the API keeps its state in.
+
+Writes go to a temporary file in the same directory and are renamed over the
+target, so a reader never sees a half-written file. Read-modify-write cycles
+hold an exclusive flock on a sidecar `<file>.lock`, so updates from several
+uvicorn/gunicorn workers (or threads) are serialized instead of one worker's
+write silently replacing another's. Without fcntl (Windows) locking falls back
+to an in-process lock, which is only safe with a single worker.
+"""
+import json
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX
+    fcntl = None
+
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _thread_lock(path: str) -> threading.Lock:
+    with _thread_locks_guard:
+        return _thread_locks.setdefault(os.path.abspath(path), threading.Lock())
+
+
+@contextmanager
+def file_lock(path: str):
+    """Exclusive lock on `path` across threads and processes (via `path`.lock)."""
+    lock_path = f"{path}.lock"
+    directory = os.path.dirname(lock_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with _thread_lock(lock_path):
+        if fcntl is None:
+            yield
+            return
+        with open(lock_path, "a") as handle:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(handle, fcntl.LOCK_UN)
+
+
+def read_json(path: str, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, "r") as f:
+        return json.load(f)
+
+
+def write_json(path: str, data):
+    """Atomically replace `path` with `data` as JSON."""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+@contextmanager
+def update_json(path: str, default):
+    """
+    Locked read-modify-write: yields the current data for in-place changes and
+    writes it back on normal exit. Raising inside the block leaves the file as is.
+    """
+    with file_lock(path):
+        data = read_json(path, default)
+        yield data
+        write_json(path, data)
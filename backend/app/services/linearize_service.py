@@ -0,0 +1,97 @@
+# services/linearize_service.py
+"""
+Optional "fast web view" copies of uploaded PDFs.
+
+A linearized PDF puts the first page's objects at the front of the file, so the
+viewer can render page one from the first ranged request instead of waiting for
+the whole download. Copies are stored under LINEARIZED_DIR keyed by the
+original's content hash; the original upload is never modified, and a copy is
+removed once no processed upload with that content remains.
+
+Linearizing needs pikepdf or the qpdf command (PyMuPDF dropped support for
+it). When neither is installed, check_linearization turns LINEARIZE_PDFS off
+at startup.
+"""
+import logging
+import os
+import shutil
+import subprocess
+
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pikepdf
+except ImportError:  # the qpdf command is used instead, if installed
+    pikepdf = None
+
+
+def linearizer():
+    """"pikepdf" or "qpdf", whichever is available (pikepdf first), else None."""
+    if pikepdf is not None:
+        return "pikepdf"
+    if shutil.which("qpdf"):
+        return "qpdf"
+    return None
+
+
+def check_linearization():
+    """Disable LINEARIZE_PDFS, with one warning, when nothing can linearize (call at startup)."""
+    if settings.LINEARIZE_PDFS and linearizer() is None:
+        logger.warning("LINEARIZE_PDFS is set but neither pikepdf nor qpdf is installed; not writing linearized copies")
+        settings.LINEARIZE_PDFS = False
+
+
+def linearized_path_for(file_hash: str) -> str:
+    return os.path.join(settings.LINEARIZED_DIR, f"{file_hash}.pdf")
+
+
+def find_linearized_copy(original_path: str, file_hash: str = None):
+    """Path of the linearized copy of this upload, if one has been written."""
+    path = linearized_path_for(file_hash or compute_file_hash(original_path))
+    return path if os.path.isfile(path) else None
+
+
+def remove_linearized_copy(file_hash: str):
+    path = linearized_path_for(file_hash)
+    try:
+        os.remove(path)
+        logger.info(f"Removed linearized copy {path}")
+    except FileNotFoundError:
+        pass
+
+
+def linearize_pdf(original_path: str):
+    """Write a linearized copy of the PDF (with pikepdf or qpdf). Returns its path or None."""
+    tool = linearizer()
+    if tool is None:
+        return None
+    target = linearized_path_for(compute_file_hash(original_path))
+    if os.path.isfile(target):
+        return target
+
+    os.makedirs(settings.LINEARIZED_DIR, exist_ok=True)
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    try:
+        if tool == "pikepdf":
+            with pikepdf.open(original_path) as pdf:
+                pdf.save(tmp_path, linearize=True)
+        else:
+            subprocess.run(
+                ["qpdf", "--linearize", original_path, tmp_path],
+                check=True, capture_output=True, timeout=600,
+            )
+        os.replace(tmp_path, target)
+        logger.info(f"Wrote linearized copy of {original_path} to {target}")
+        return target
+    except Exception as e:
+        # qpdf exits 3 on warnings but still writes a usable file
+        if isinstance(e, subprocess.CalledProcessError) and e.returncode == 3 and os.path.isfile(tmp_path):
+            os.replace(tmp_path, target)
+            return target
+        logger.warning(f"Could not linearize {original_path}: {e}")
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return None
@@ -1,39 +1,99 @@
 # services/metadata_store.py
 import os
-import json
+import socket
+import threading
+import time
 from datetime import datetime
 
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+from app.services.file_store import file_lock, read_json, update_json, write_json
+
 METADATA_FILE = "processed_metadata.json"  # or /mnt/data if persistent volume
+JOBS_FILE = "processing_jobs.json"  # files currently being ingested, by claiming worker
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+# (metadata file size, mtime_ns) and stored upload name -> upload record, rebuilt when the file changes
+_upload_index = (None, {})
+_upload_index_lock = threading.Lock()
 
 def load_metadata():
-    if not os.path.exists(METADATA_FILE):
-        return []
-    with open(METADATA_FILE, "r") as f:
-        return json.load(f)
+    return read_json(METADATA_FILE, [])
 
 def save_metadata(data):
-    with open(METADATA_FILE, "w") as f:
-        json.dump(data, f, indent=2)
+    write_json(METADATA_FILE, data)
 
 def has_already_been_processed(user_id: str, filename: str) -> bool:
     data = load_metadata()
     return any(entry for entry in data if entry["user_id"] == user_id and entry["filename"] == filename)
 
-def mark_as_processed(user_id: str, filename: str, total_chunks: int):
-    data = load_metadata()
+def upload_record(path: str) -> dict:
+    """Content hash of a stored upload plus the stat it was taken at, recorded at ingest."""
+    stat = os.stat(path)
+    return {
+        "name": os.path.basename(path),
+        "sha256": compute_file_hash(path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def mark_as_processed(user_id: str, filename: str, total_chunks: int, path: str = None):
+    upload = upload_record(path) if path else None
+    with update_json(METADATA_FILE, []) as data:
+        # prevent duplicates
+        for d in data:
+            if d["user_id"] == user_id and d["filename"] == filename:
+                if upload and "upload" not in d:
+                    d["upload"] = upload
+                return  # already marked, skip
+
+        entry = {
+            "user_id": user_id,
+            "filename": filename,
+            "processed_at": datetime.utcnow().isoformat(),
+            "total_chunks": total_chunks,
+        }
+        if upload:
+            entry["upload"] = upload
+        data.append(entry)
+
 
-    # prevent duplicates
-    for d in data:
-        if d["user_id"] == user_id and d["filename"] == filename:
-            return  # already marked, skip
+def get_upload_record(stored_name: str):
+    """Upload record for a file in the upload directory, or None if it wasn't recorded at ingest."""
+    global _upload_index
+    try:
+        stat = os.stat(METADATA_FILE)
+    except FileNotFoundError:
+        return None
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _upload_index_lock:
+        if _upload_index[0] == key:
+            return _upload_index[1].get(stored_name)
+    index = {
+        entry["upload"]["name"]: entry["upload"]
+        for entry in load_metadata() if "upload" in entry
+    }
+    with _upload_index_lock:
+        _upload_index = (key, index)
+    return index.get(stored_name)
 
-    data.append({
-        "user_id": user_id,
-        "filename": filename,
-        "processed_at": datetime.utcnow().isoformat(),
-        "total_chunks": total_chunks,
-    })
-    save_metadata(data)
+
+def recorded_content_hash(path: str):
+    """The ingest-time content hash of `path` if the file is unchanged since, else None."""
+    record = get_upload_record(os.path.basename(path))
+    if record is None:
+        return None
+    stat = os.stat(path)
+    if (record["size"], record["mtime_ns"]) != (stat.st_size, stat.st_mtime_ns):
+        return None  # replaced or touched since ingest
+    return record["sha256"]
+
+
+def remove_processed(user_id: str, filename: str):
+    with update_json(METADATA_FILE, []) as data:
+        data[:] = [m for m in data if not (m["filename"] == filename and m["user_id"] == user_id)]
 
 
 def get_total_chunks(user_id: str, filename: str) -> int:
@@ -43,3 +103,41 @@ def get_total_chunks(user_id: str, filename: str) -> int:
             return entry.get("total_chunks", 0)
     return 0
 
+
+def _claim_is_live(claim: dict) -> bool:
+    if time.time() - claim.get("claimed_at", 0) > settings.JOB_CLAIM_TTL:
+        return False
+    host, _, pid = claim.get("worker", "").rpartition(":")
+    if host == socket.gethostname() and pid.isdigit():
+        try:
+            os.kill(int(pid), 0)  # claimant crashed on this host -> claim is stale
+        except ProcessLookupError:
+            return False
+        except PermissionError:
+            pass
+    return True
+
+
+def claim_file(user_id: str, filename: str) -> bool:
+    """
+    Claim a file for ingestion. Exactly one worker gets True for a file that is
+    neither processed nor being processed; call release_file when done.
+    """
+    key = f"{user_id}__{filename}"
+    with file_lock(JOBS_FILE):
+        if has_already_been_processed(user_id, filename):
+            return False
+        jobs = read_json(JOBS_FILE, {})
+        claim = jobs.get(key)
+        if claim and _claim_is_live(claim):
+            return False
+        jobs[key] = {"worker": WORKER_ID, "claimed_at": time.time()}
+        write_json(JOBS_FILE, jobs)
+    return True
+
+
+def release_file(user_id: str, filename: str):
+    key = f"{user_id}__{filename}"
+    with update_json(JOBS_FILE, {}) as jobs:
+        if jobs.get(key, {}).get("worker") == WORKER_ID:
+            del jobs[key]
@@ -0,0 +1,211 @@
+# services/metrics.py
+"""
+Built-in instrumentation: Prometheus-format metrics and optional tracing spans.
+
+The registry is deliberately tiny (counters, histograms and callback gauges
+with labels) so the service needs no extra dependency to expose /metrics.
+`stage("embed")` times a pipeline stage into stage_duration_seconds and, when
+OpenTelemetry is installed and OTEL_TRACING is on, also opens a span.
+"""
+import bisect
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from opentelemetry import trace as _otel_trace
+except ImportError:  # tracing is optional
+    _otel_trace = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, *args, buckets=DEFAULT_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def totals(self, **labels):
+        """(count, sum) observed so far for one label set."""
+        with self._lock:
+            series = self._series.get(self._key(labels))
+            return (series[-1], series[-2]) if series else (0, 0.0)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        lines = self.header()
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.label_names, key, [("le", f"{bound:g}")])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.label_names, key, [("le", "+Inf")])
+            lines.append(f"{self.name}_bucket{labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {series[-1]}")
+        return lines
+
+
+class CallbackGauge(_Metric):
+    """Gauge whose samples are read at scrape time: callback() -> {label tuple: value}."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labels, callback):
+        super().__init__(name, documentation, labels)
+        self.callback = callback
+
+    def render(self):
+        try:
+            samples = self.callback()
+        except Exception as e:
+            logger.warning(f"Gauge {self.name} callback failed: {e}")
+            samples = {}
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {value}"
+            for key, value in sorted(samples.items())
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+REQUEST_LATENCY = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.",
+    labels=("method", "route", "status"),
+))
+STAGE_LATENCY = registry.register(Histogram(
+    "stage_duration_seconds",
+    "Pipeline stage latency (embed, search, llm, rerank, parse, ocr, camelot, upsert, ...).",
+    labels=("stage",),
+))
+CACHE_EVENTS = registry.register(Counter(
+    "cache_events_total", "Cache lookups by cache and result (hit/miss).", labels=("cache", "result"),
+))
+CHUNKS_INGESTED = registry.register(Counter(
+    "chunks_ingested_total", "Chunks written to the vector store.", labels=("type",),
+))
+PAGES_PARSED = registry.register(Counter("pages_parsed_total", "PDF pages loaded for ingestion."))
+
+
+def cache_event(cache: str, hit: bool):
+    CACHE_EVENTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _tracer():
+    if _otel_trace is None or not settings.OTEL_TRACING:
+        return None
+    return _otel_trace.get_tracer("chatbot.backend")
+
+
+@contextmanager
+def stage(name: str, **attributes):
+    """Time a pipeline stage; also a tracing span when OpenTelemetry is enabled."""
+    tracer = _tracer()
+    start = time.perf_counter()
+    try:
+        if tracer is None:
+            yield
+        else:
+            with tracer.start_as_current_span(name, attributes=attributes):
+                yield
+    finally:
+        STAGE_LATENCY.observe(time.perf_counter() - start, stage=name)
+
+
+def render_metrics() -> str:
+    return registry.render()
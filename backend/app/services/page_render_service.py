@@ -0,0 +1,229 @@
+# services/page_render_service.py
+"""
+Server-side page rendering for the viewer.
+
+Pages are rendered with PyMuPDF at a requested zoom and encoded as WebP or PNG.
+Rendered images live in a size-bounded on-disk LRU cache under PAGE_CACHE_DIR,
+keyed by file content hash, page and zoom, so the same PDF uploaded by several
+users (or under several names) shares cache entries. Documents can be
+pre-rendered in the background after ingestion, and documents that keep being
+viewed are pre-rendered in full once they pass PRERENDER_POPULARITY_THRESHOLD.
+"""
+import io
+import logging
+import os
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import fitz
+from PIL import Image
+
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+from app.services.metrics import cache_event, stage
+
+logger = logging.getLogger(__name__)
+
+MIN_ZOOM = 0.25
+MAX_ZOOM = 8.0
+MEDIA_TYPES = {"webp": "image/webp", "png": "image/png"}
+WEBP_QUALITY = 80
+
+
+class PageCache:
+    """On-disk LRU of rendered pages, bounded by total bytes."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._entries = None  # relative path -> size, oldest first
+        self._total = 0
+        self._lock = threading.Lock()
+
+    def _load_index(self):
+        # Called with self._lock held; rebuilds LRU order from mtimes after a restart
+        self._entries = OrderedDict()
+        self._total = 0
+        found = []
+        if os.path.isdir(self.root):
+            for dirpath, _dirs, files in os.walk(self.root):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    path = os.path.join(dirpath, name)
+                    stat = os.stat(path)
+                    found.append((stat.st_mtime, os.path.relpath(path, self.root), stat.st_size))
+        for _mtime, rel, size in sorted(found):
+            self._entries[rel] = size
+            self._total += size
+
+    def contains(self, rel: str) -> bool:
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            return rel in self._entries
+
+    def get(self, rel: str):
+        path = os.path.join(self.root, rel)
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            if rel not in self._entries:
+                return None
+            self._entries.move_to_end(rel)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path)  # keeps LRU order across restarts
+            return data
+        except FileNotFoundError:
+            with self._lock:
+                self._total -= self._entries.pop(rel, 0)
+            return None
+
+    def put(self, rel: str, data: bytes):
+        path = os.path.join(self.root, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        evicted = []
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            self._total -= self._entries.pop(rel, 0)
+            self._entries[rel] = len(data)
+            self._total += len(data)
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_rel, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_rel)
+        for old_rel in evicted:
+            try:
+                os.remove(os.path.join(self.root, old_rel))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            if self._entries is None:
+                self._load_index()
+            return {"entries": len(self._entries), "bytes": self._total, "max_bytes": self.max_bytes}
+
+
+page_cache = PageCache(settings.PAGE_CACHE_DIR, settings.PAGE_CACHE_MAX_BYTES)
+_prerender_pool = ThreadPoolExecutor(max_workers=settings.PRERENDER_WORKERS, thread_name_prefix="prerender")
+_views = Counter()          # file hash -> page-image requests
+_prerendered = set()        # (file hash, zoom, format) already scheduled for full pre-render
+_views_lock = threading.Lock()
+
+
+def normalize_zoom(zoom: float) -> float:
+    return round(min(max(zoom, MIN_ZOOM), MAX_ZOOM), 2)
+
+
+def _cache_key(file_hash: str, page_number: int, zoom: float, fmt: str) -> str:
+    return os.path.join(file_hash, f"{page_number}_{zoom:g}.{fmt}")
+
+
+def _encode(pix, fmt: str) -> bytes:
+    if fmt == "png":
+        return pix.tobytes("png")
+    image = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+    buf = io.BytesIO()
+    image.save(buf, format="WEBP", quality=WEBP_QUALITY)
+    return buf.getvalue()
+
+
+def _render(doc, page_number: int, zoom: float, fmt: str) -> bytes:
+    page = doc[page_number - 1]
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    return _encode(pix, fmt)
+
+
+def render_page(path: str, page_number: int, zoom: float, fmt: str = "webp"):
+    """
+    Rendered page image bytes (cached). page_number is 1-based.
+    Raises ValueError for an unknown format or out-of-range page.
+    """
+    if fmt not in MEDIA_TYPES:
+        raise ValueError(f"Unsupported image format: {fmt}")
+    zoom = normalize_zoom(zoom)
+    file_hash = compute_file_hash(path)
+    key = _cache_key(file_hash, page_number, zoom, fmt)
+
+    data = page_cache.get(key)
+    cache_event("page_images", data is not None)
+    if data is None:
+        with stage("render"), fitz.open(path) as doc:
+            if not 1 <= page_number <= doc.page_count:
+                raise ValueError(f"Page {page_number} out of range (1-{doc.page_count})")
+            data = _render(doc, page_number, zoom, fmt)
+        page_cache.put(key, data)
+
+    _note_view(path, file_hash, zoom, fmt)
+    return data, MEDIA_TYPES[fmt]
+
+
+# (path, size, mtime_ns) -> page count, so cached renders are served without opening the PDF
+_page_counts = {}
+_page_counts_lock = threading.Lock()
+
+
+def page_count(path: str) -> int:
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    with _page_counts_lock:
+        cached = _page_counts.get(key)
+    if cached is not None:
+        return cached
+    with fitz.open(path) as doc:
+        count = doc.page_count
+    with _page_counts_lock:
+        _page_counts[key] = count
+    return count
+
+
+def prerender_document(path: str, zoom: float, fmt: str = "webp", max_pages: int = None):
+    """Render pages that aren't cached yet, opening the PDF once."""
+    zoom = normalize_zoom(zoom)
+    file_hash = compute_file_hash(path)
+    rendered = 0
+    with fitz.open(path) as doc:
+        last = doc.page_count if not max_pages else min(max_pages, doc.page_count)
+        for page_number in range(1, last + 1):
+            key = _cache_key(file_hash, page_number, zoom, fmt)
+            if page_cache.contains(key):
+                continue
+            page_cache.put(key, _render(doc, page_number, zoom, fmt))
+            rendered += 1
+    logger.info(f"Pre-rendered {rendered} pages of {path} at zoom {zoom}")
+    return rendered
+
+
+def _prerender_safely(path, zoom, fmt, max_pages):
+    try:
+        prerender_document(path, zoom, fmt, max_pages)
+    except Exception as e:
+        logger.warning(f"Background pre-render of {path} failed: {e}")
+
+
+def schedule_prerender(path: str, zoom: float = None, fmt: str = "webp", max_pages: int = None):
+    zoom = settings.PRERENDER_ZOOM if zoom is None else zoom
+    _prerender_pool.submit(_prerender_safely, path, zoom, fmt, max_pages)
+
+
+def _note_view(path: str, file_hash: str, zoom: float, fmt: str):
+    threshold = settings.PRERENDER_POPULARITY_THRESHOLD
+    if not threshold:
+        return
+    with _views_lock:
+        _views[file_hash] += 1
+        popular = _views[file_hash] >= threshold and (file_hash, zoom, fmt) not in _prerendered
+        if popular:
+            _prerendered.add((file_hash, zoom, fmt))
+    if popular:
+        schedule_prerender(path, zoom, fmt)
@@ -0,0 +1,138 @@
+# services/providers.py
+"""
+Model provider factories.
+
+qa_service and vectorstore_service get their chat model, embeddings and
+reranking sentence encoder from here, selected by LLM_PROVIDER,
+EMBEDDING_PROVIDER and SENTENCE_ENCODER_PROVIDER. The "fake" providers are
+deterministic and offline (hashed bag-of-words vectors, an extractive answer
+taken from the prompt's context) and sleep FAKE_*_LATENCY_MS per call, so load
+tests exercise the real pipeline without network calls or API spend.
+"""
+import hashlib
+import re
+import time
+from typing import Any, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from app.core.config import settings
+
+TOKEN_RE = re.compile(r"\w+")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+FAKE_NOT_FOUND = "I couldn't find the answer in the documents."
+
+
+def _sleep_ms(ms: float):
+    if ms > 0:
+        time.sleep(ms / 1000)
+
+
+def hashed_vector(text: str, dim: int) -> np.ndarray:
+    """Signed hashing-trick bag of words, L2-normalized; stable across processes."""
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in TOKEN_RE.findall(text.lower()):
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        value = int.from_bytes(digest, "little")
+        vector[value % dim] += 1.0 if (value >> 63) & 1 else -1.0
+    norm = np.linalg.norm(vector)
+    if not norm:
+        vector[0] = 1.0
+        return vector
+    return vector / norm
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic local embeddings: texts sharing words get similar vectors."""
+
+    def __init__(self, dim: int = None, latency_ms: float = None):
+        self.dim = dim or settings.FAKE_EMBEDDING_DIM
+        self.latency_ms = settings.FAKE_EMBEDDING_LATENCY_MS if latency_ms is None else latency_ms
+
+    def embed_documents(self, texts):
+        _sleep_ms(self.latency_ms)
+        return [hashed_vector(text, self.dim).tolist() for text in texts]
+
+    def embed_query(self, text):
+        _sleep_ms(self.latency_ms)
+        return hashed_vector(text, self.dim).tolist()
+
+
+class FakeSentenceModel:
+    """Stands in for SentenceTransformer behind the batching encoder."""
+
+    def __init__(self, dim: int = None, latency_ms: float = None):
+        self.dim = dim or settings.FAKE_EMBEDDING_DIM
+        self.latency_ms = settings.FAKE_EMBEDDING_LATENCY_MS if latency_ms is None else latency_ms
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dim
+
+    def encode(self, texts, batch_size: int = None, **kwargs) -> np.ndarray:
+        _sleep_ms(self.latency_ms)
+        return np.stack([hashed_vector(text, self.dim) for text in texts])
+
+
+class FakeChatModel(BaseChatModel):
+    """Answers with the first sentences of the prompt's context, after a fixed delay."""
+
+    model_name: str = "fake-chat"
+    latency_ms: float = 0.0
+    max_sentences: int = 2
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _answer(self, prompt: str) -> str:
+        context = prompt.partition("Context:")[2].partition("Question:")[0].strip()
+        if not context:
+            return FAKE_NOT_FOUND
+        sentences = SENTENCE_END_RE.split(context)
+        return " ".join(sentences[:self.max_sentences])[:500]
+
+    def _generate(self, messages, stop: Optional[List[str]] = None, run_manager: Any = None, **kwargs):
+        _sleep_ms(self.latency_ms)
+        prompt = "\n".join(str(message.content) for message in messages)
+        message = AIMessage(content=self._answer(prompt))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def get_llm():
+    if settings.LLM_PROVIDER == "fake":
+        return FakeChatModel(latency_ms=settings.FAKE_LLM_LATENCY_MS)
+    if settings.LLM_PROVIDER == "openai":
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            openai_api_key=settings.OPENAI_API_KEY,
+            model_name=settings.LLM_MODEL,
+            temperature=0.1  # More deterministic factual output
+        )
+    raise ValueError(f"Unknown LLM_PROVIDER: {settings.LLM_PROVIDER}")
+
+
+def get_embeddings() -> Embeddings:
+    if settings.EMBEDDING_PROVIDER == "fake":
+        return FakeEmbeddings()
+    if settings.EMBEDDING_PROVIDER == "openai":
+        from langchain_openai import OpenAIEmbeddings
+        return OpenAIEmbeddings(model=settings.EMBEDDING_MODEL, openai_api_key=settings.OPENAI_API_KEY)
+    if settings.EMBEDDING_PROVIDER == "huggingface":
+        # The same SentenceTransformer encode as HuggingFaceEmbeddings, through the shared batching encoder
+        from app.services.encoding_service import EncoderEmbeddings, get_sentence_encoder
+        return EncoderEmbeddings(get_sentence_encoder(settings.EMBEDDING_MODEL))
+    raise ValueError(f"Unknown EMBEDDING_PROVIDER: {settings.EMBEDDING_PROVIDER}")
+
+
+def get_sentence_model(model_name: str = None):
+    """The reranking sentence model, or the named SentenceTransformer."""
+    if model_name is None and settings.SENTENCE_ENCODER_PROVIDER == "fake":
+        return FakeSentenceModel()
+    if model_name is not None or settings.SENTENCE_ENCODER_PROVIDER == "sentence_transformers":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name or settings.SENTENCE_ENCODER_MODEL)
+    raise ValueError(f"Unknown SENTENCE_ENCODER_PROVIDER: {settings.SENTENCE_ENCODER_PROVIDER}")
@@ -1,18 +1,16 @@
 import logging
-from langchain_openai import ChatOpenAI
-from langchain.chains import RetrievalQA
+from langchain.chains.combine_documents import create_stuff_documents_chain
 from langchain_core.prompts import ChatPromptTemplate
 
 from . import vectorstore_service  # Handles vectorstore loading/retrieval
+from .encoding_service import get_sentence_encoder
+from .metrics import stage
+from .providers import get_llm
+from .text_processing import sent_tokenize
 from ..core.config import settings  # Loads env vars like OPENAI_API_KEY
 
 logger = logging.getLogger(__name__)
-#logging.basicConfig(level=settings.LOG_LEVEL)
 
-import nltk
-from nltk.tokenize import sent_tokenize
-
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import numpy as np
 import torch
@@ -20,8 +18,8 @@ import torch
 device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
 
-# Initialize once globally
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# Initialize once globally; encodes from concurrent requests share batched forward passes
+embedding_model = get_sentence_encoder()
 
 def deduplicate_and_rerank_sources(answer: str, sources: list[dict]) -> list[dict]:
     seen = set()
@@ -42,7 +40,8 @@ def deduplicate_and_rerank_sources(answer: str, sources: list[dict]) -> list[dic
 
     # Semantic reranking
     texts = [s["content"] for s in unique_sources]
-    embeddings = embedding_model.encode([answer] + texts)
+    with stage("embed", caller="rerank"):
+        embeddings = embedding_model.encode([answer] + texts)
     answer_emb = embeddings[0].reshape(1, -1)
     sources_emb = embeddings[1:]
 
@@ -64,22 +63,18 @@ def deduplicate_and_rerank_sources(answer: str, sources: list[dict]) -> list[dic
             "metadata": src["metadata"]
         })
     if not reranked:
-        print("[⚠️] No relevant sources above threshold — returning fallback top sources.")
+        logger.warning("No relevant sources above threshold, returning fallback top sources.")
         reranked = [(src, 0.0) for src in unique_sources[:2]]
 
 
     return cleaned_sources[:4]
 
-# Initialize LLM using environment-based API key and model name
+# Initialize the LLM from LLM_PROVIDER / LLM_MODEL
 try:
-    llm = ChatOpenAI(
-        openai_api_key=settings.OPENAI_API_KEY,
-        model_name="gpt-4o-mini-2024-07-18",
-        temperature=0.1  # More deterministic factual output
-    )
-    logger.info(f"Successfully initialized ChatOpenAI model: {llm.model_name}")
+    llm = get_llm()
+    logger.info(f"Successfully initialized {settings.LLM_PROVIDER} chat model: {llm.model_name}")
 except Exception as e:
-    logger.error(f"Failed to initialize ChatOpenAI: {e}", exc_info=True)
+    logger.error(f"Failed to initialize {settings.LLM_PROVIDER} chat model: {e}", exc_info=True)
     llm = None
 
 # Custom multilingual prompt template with fallback logic
@@ -99,59 +94,82 @@ if the language is spanish and the answer is not in the context, say this: \"Lo
 """
 
 prompt_template = ChatPromptTemplate.from_template(PROMPT_TEMPLATE_STR)
+# Built once; it only formats the retrieved chunks into the prompt and calls the LLM
+qa_chain = create_stuff_documents_chain(llm, prompt_template) if llm else None
+
+
+def search_params(filenames=None, sections=None, types=None):
+    """(k, metadata filter) for a question, narrower when it is scoped."""
+    metadata_filter = vectorstore_service.build_metadata_filter(filenames, sections, types)
+    if metadata_filter:
+        # Scoped questions search a much smaller candidate set, so fewer chunks suffice
+        return settings.SCOPED_RETRIEVAL_K, metadata_filter
+    return settings.RETRIEVAL_K, None
+
+
+def answer_from_documents(question, retrieved_docs):
+    """Answer a question from already-retrieved chunks; returns (answer, reranked sources)."""
+    if not qa_chain:
+        return "LLM is not configured or available.", []
+
+    with stage("llm"):
+        answer = qa_chain.invoke({"context": retrieved_docs, "question": question})
+    logger.debug(f"LLM raw answer: {answer}")
+
+    raw_sources = [
+    {
+        "content": doc.page_content,
+        "metadata": doc.metadata
+    } for doc in retrieved_docs
+        ]
+    with stage("rerank"):
+        sources = deduplicate_and_rerank_sources(answer, raw_sources)
+    if answer.strip().lower().startswith("je n'ai pas trouvé la réponse"):
+        sources = []
+
+    logger.info(f"Answer length: {len(answer) if answer else 0}. Sources: {len(sources)}")
+    return answer, sources
 
-def get_answer(question, user_id):
+
+def get_answer(question, user_id, filenames=None, sections=None, types=None):
     if not llm:
         logger.error("LLM is not initialized. Returning fallback response.")
         return "LLM is not configured or available.", []
 
     logger.info(f"Received question from user '{user_id}': '{question}'")
 
-    retriever = vectorstore_service.get_retriever(user_id, search_kwargs={"k": 15})
-    if not retriever:
-        logger.warning("No retriever found; vector store may be empty.")
-        return "Could not access your documents to answer the question.", []
+    k, metadata_filter = search_params(filenames, sections, types)
+    search_kwargs = {"k": k}
+    if metadata_filter:
+        search_kwargs["filter"] = metadata_filter
+        logger.info(f"Scoping question to {metadata_filter}")
 
     try:
-        # 🔍 Manually test retrieval BEFORE building the chain
-        retrieved_docs = retriever.get_relevant_documents(question)
-        for d in retrieved_docs:
-            print(f"→ {d.metadata.get('source')} | {len(d.page_content)} chars | {d.page_content[:100]}")
-
-        print(f"[DEBUG] Retrieved {len(retrieved_docs)} documents for: '{question}'")
-        for d in retrieved_docs:
-            print(f"→ {d.metadata.get('source')} | {d.page_content[:80]}")
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=llm,
-            chain_type="stuff",
-            retriever=retriever,
-            chain_type_kwargs={"prompt": prompt_template},
-            return_source_documents=True
-        )
+        # The session keeps the shard handles the retriever holds open until the search is done
+        with vectorstore_service.shards.session():
+            retriever = vectorstore_service.get_retriever(user_id, search_kwargs=search_kwargs)
+            if not retriever:
+                logger.warning("No retriever found; vector store may be empty.")
+                return "Could not access your documents to answer the question.", []
+            with stage("search"):
+                retrieved_docs = retriever.invoke(question)
+        logger.info(f"Retrieved {len(retrieved_docs)} documents for user '{user_id}'")
+        if logger.isEnabledFor(logging.DEBUG):
+            for d in retrieved_docs:
+                logger.debug(f"→ {d.metadata.get('source')} | {len(d.page_content)} chars | {d.page_content[:100]}")
     except Exception as e:
-        logger.error(f"Error initializing QA chain: {e}", exc_info=True)
+        logger.error(f"Error retrieving documents: {e}", exc_info=True)
         return "An error occurred while setting up the QA process.", []
 
     try:
-        result = qa_chain.invoke({"query": question})
-        answer = result.get("result")
-        sources = []
-        logger.debug(f"LLM raw answer: {answer}")
-
-
-        raw_sources = [
-        {
-            "content": doc.page_content,
-            "metadata": doc.metadata
-        } for doc in result.get("source_documents", [])
-            ]
-        sources = deduplicate_and_rerank_sources(result["result"], raw_sources)
-        if answer.strip().lower().startswith("je n'ai pas trouvé la réponse"):
-            sources = []
-
-        logger.info(f"Answer length: {len(answer) if answer else 0}. Sources: {len(sources)}")
-        return answer, sources
-
+        return answer_from_documents(question, retrieved_docs)
     except Exception as e:
         logger.error(f"Error during QA invoke: {e}", exc_info=True)
         return "An error occurred while trying to find an answer.", []
+
+
+def retrieve_batch(questions, user_id, filenames=None, sections=None, types=None):
+    """Retrieved chunks for each question, embedding and searching the batch together."""
+    k, metadata_filter = search_params(filenames, sections, types)
+    logger.info(f"Retrieving for {len(questions)} batched questions from user '{user_id}'")
+    return vectorstore_service.search_batch(user_id, questions, k, metadata_filter=metadata_filter)
@@ -0,0 +1,331 @@
+# services/shard_store.py
+"""
+Tenant-sharded Chroma storage.
+
+Tenants are hashed into a fixed number of shard stores under chroma_store/
+(shard_00, shard_01, ...). Each shard is a single Chroma database holding many
+tenants' chunks, isolated by a "tenant" metadata field that every read, search
+and delete filters on. Shard handles are opened on first use and closed after
+sitting idle, so a server with thousands of tenants keeps at most a handful of
+SQLite databases and HNSW indexes open.
+
+Several API worker processes can share the shards: writes take a per-shard
+file lock and bump the shard's generation stamp, and a process whose open
+handle predates the current generation reopens it before use, so it neither
+serves a stale in-memory index nor writes one back over other workers' chunks.
+Retrievals, ingests and deletes run inside shards.session(), which keeps the
+handles they use open until they finish.
+"""
+import contextvars
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from langchain_community.vectorstores import Chroma
+
+from app.core.config import settings
+from app.services.file_store import file_lock
+
+logger = logging.getLogger(__name__)
+
+SHARD_COLLECTION = "documents"
+TENANT_KEY = "tenant"
+
+
+def shard_for_tenant(user_id: str) -> int:
+    digest = hashlib.sha256(user_id.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % settings.VECTOR_SHARDS
+
+
+def shard_dir(shard_id: int) -> str:
+    return os.path.join(settings.CHROMA_DIR, f"shard_{shard_id:02d}")
+
+
+def _generation_path(shard_id: int) -> str:
+    return os.path.join(shard_dir(shard_id), ".generation")
+
+
+def _read_generation(shard_id: int) -> int:
+    try:
+        return os.stat(_generation_path(shard_id)).st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _bump_generation(shard_id: int) -> int:
+    path = _generation_path(shard_id)
+    previous = _read_generation(shard_id)
+    with open(path, "a"):
+        pass
+    stamp = max(time.time_ns(), previous + 1)  # strictly increasing even on coarse clocks
+    os.utime(path, ns=(stamp, stamp))
+    return _read_generation(shard_id)
+
+
+def shard_generation(user_id: str) -> int:
+    """Stamp of the last committed write to the tenant's shard, from any worker process."""
+    return _read_generation(shard_for_tenant(user_id))
+
+
+def tenant_filter(user_id: str, extra: dict = None) -> dict:
+    """Chroma `where` clause restricting a query to one tenant (plus optional conditions)."""
+    clause = {TENANT_KEY: user_id}
+    if not extra:
+        return clause
+    return {"$and": [clause, extra]}
+
+
+def _detach_chroma(store: Chroma):
+    """
+    Drop Chroma's cached client system for the shard, so the next open gets a
+    fresh one. Returns the detached system (to stop later) or None. Clients look
+    their system up by path on every call, so keep the returned object: after
+    a reopen, `store._client._system` is the new system.
+    """
+    try:
+        from chromadb.api.client import SharedSystemClient
+
+        return SharedSystemClient._identifier_to_system.pop(store._client._identifier, None)
+    except Exception as e:
+        logger.debug(f"Could not detach Chroma client: {e}")
+        return None
+
+
+def _stop_chroma(system):
+    """Best effort: stop a detached client system so the SQLite file is released."""
+    try:
+        system.stop()
+    except Exception as e:
+        logger.debug(f"Could not fully close Chroma client: {e}")
+
+
+class _Shard:
+    """A shard's open handles (its collections share one Chroma client) and their in-flight users."""
+
+    def __init__(self, generation: int):
+        self.handles = {}  # collection -> Chroma
+        self.generation = generation  # generation the handles were loaded at
+        self.last_used = time.monotonic()
+        self.refs = 0  # sessions currently using the handles
+        self.retired = False  # replaced or closed; stopped once refs drops to 0
+        self.system = None  # detached client system, set when retired
+
+    def any_handle(self) -> Chroma:
+        return next(iter(self.handles.values()), None)
+
+
+class ShardRegistry:
+    """
+    Lazily opened, idle-closed Chroma handles, one per (shard, collection).
+
+    A handle fetched inside session() is reference counted until the session
+    ends: the idle reaper skips shards in use, and a shard reloaded after
+    another worker's write keeps its old client open for the sessions still
+    using it, stopping it only when the last one finishes. Handles are opened
+    outside the registry lock, so a cold open only holds up threads waiting
+    for that same handle.
+    """
+
+    def __init__(self, embedding_factory):
+        self._embedding_factory = embedding_factory
+        self._shards = {}  # shard_id -> _Shard
+        self._write_locks = {}
+        self._opening = {}  # (shard_id, collection) -> lock held while that handle is being opened
+        self._pins = Counter()  # shard_id -> warm tenants keeping it open
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._session = contextvars.ContextVar("shard_session", default=None)
+
+    def get(self, shard_id: int, collection: str = SHARD_COLLECTION) -> Chroma:
+        stale = []
+        reloaded = False
+        try:
+            while True:
+                with self._lock:
+                    generation = _read_generation(shard_id)
+                    shard = self._shards.get(shard_id)
+                    if shard is not None and shard.generation != generation:
+                        # Another worker wrote to this shard since we loaded it
+                        stale.append(self._retire(shard_id))
+                        shard, reloaded = None, True
+                    if shard is None:
+                        shard = self._shards[shard_id] = _Shard(generation)
+                        self._start_reaper()
+                    store = shard.handles.get(collection)
+                    if store is not None:
+                        shard.last_used = time.monotonic()
+                        session = self._session.get()
+                        if session is not None:
+                            shard.refs += 1
+                            session.append(shard)
+                        return store
+                    opening = self._opening.setdefault((shard_id, collection), threading.Lock())
+                # Opening takes long; only threads after this same handle wait for it
+                with opening:
+                    with self._lock:
+                        published = self._shards.get(shard_id) is shard and collection in shard.handles
+                    if not published:
+                        store = self._open(shard_id, collection)
+                        with self._lock:
+                            # Dropped if the shard was reloaded meanwhile; the next pass opens it again
+                            if self._shards.get(shard_id) is shard:
+                                shard.handles.setdefault(collection, store)
+        finally:
+            if reloaded:
+                logger.info(f"Reloaded vector shard {shard_dir(shard_id)} after a write by another worker")
+            for system in stale:
+                if system is not None:
+                    _stop_chroma(system)
+
+    def _open(self, shard_id: int, collection: str) -> Chroma:
+        path = shard_dir(shard_id)
+        os.makedirs(path, exist_ok=True)
+        logger.info(f"Opening vector shard {path} ({collection})")
+        return Chroma(
+            collection_name=collection,
+            persist_directory=path,
+            embedding_function=self._embedding_factory(),
+        )
+
+    def _retire(self, shard_id: int):
+        # Called with self._lock held. Returns a client system to stop now, or None
+        # while sessions still use the shard (the last one to finish stops it)
+        shard = self._shards.pop(shard_id)
+        shard.retired = True
+        handle = shard.any_handle()
+        if handle is None:
+            return None
+        shard.system = _detach_chroma(handle)
+        if shard.refs:
+            logger.debug(f"Keeping replaced shard {shard_dir(shard_id)} open for {shard.refs} in-flight use(s)")
+            return None
+        return shard.system
+
+    @contextmanager
+    def session(self):
+        """
+        Scope of one retrieval, ingest or delete: shard handles fetched with
+        get() inside the block (in this thread or context) are not stopped
+        before it exits, even if they go idle or are reloaded meanwhile.
+        """
+        used = []
+        token = self._session.set(used)
+        try:
+            yield
+        finally:
+            self._session.reset(token)
+            self._release(used)
+
+    def _release(self, used):
+        closing = []
+        now = time.monotonic()
+        with self._lock:
+            for shard in used:
+                shard.refs -= 1
+                shard.last_used = max(shard.last_used, now)
+                if shard.retired and shard.refs == 0 and shard.system is not None:
+                    closing.append(shard.system)
+        for system in closing:
+            _stop_chroma(system)
+
+    def for_tenant(self, user_id: str, collection: str = SHARD_COLLECTION) -> Chroma:
+        return self.get(shard_for_tenant(user_id), collection)
+
+    @contextmanager
+    def _shard_lock(self, shard_id: int):
+        with self._lock:
+            thread_lock = self._write_locks.setdefault(shard_id, threading.Lock())
+        os.makedirs(shard_dir(shard_id), exist_ok=True)
+        with thread_lock, file_lock(os.path.join(settings.CHROMA_DIR, f"shard_{shard_id:02d}")):
+            yield
+
+    @contextmanager
+    def write_lock(self, user_id: str):
+        """
+        Serializes writes into a shard across threads and worker processes. Fetch
+        the store inside the block (get/for_tenant) so it reflects other workers'
+        writes; the shard's generation is bumped on exit.
+        """
+        shard_id = shard_for_tenant(user_id)
+        with self._shard_lock(shard_id):
+            try:
+                yield
+            finally:
+                generation = _bump_generation(shard_id)
+                with self._lock:
+                    # Our own handles saw this write; only other workers need to reload
+                    shard = self._shards.get(shard_id)
+                    if shard is not None:
+                        shard.generation = generation
+
+    @contextmanager
+    def read_lock(self, user_id: str):
+        """
+        Holds off writers to the shard for a consistent multi-call read, without
+        bumping its generation (so other workers keep their handles).
+        """
+        with self._shard_lock(shard_for_tenant(user_id)):
+            yield
+
+    def pin(self, user_id: str, max_shards: int = None) -> bool:
+        """
+        Keep the tenant's shard open through idle periods until unpin(). Returns
+        False (and pins nothing) when that would pin more than `max_shards`
+        distinct shards, so the idle reaper always has shards it may close.
+        """
+        shard_id = shard_for_tenant(user_id)
+        with self._lock:
+            if max_shards is not None and shard_id not in self._pins and len(self._pins) >= max_shards:
+                return False
+            self._pins[shard_id] += 1
+            return True
+
+    def unpin(self, user_id: str):
+        shard_id = shard_for_tenant(user_id)
+        with self._lock:
+            self._pins[shard_id] -= 1
+            if self._pins[shard_id] <= 0:
+                del self._pins[shard_id]
+
+    def close_idle(self, idle_seconds: float = None):
+        idle_seconds = settings.SHARD_IDLE_SECONDS if idle_seconds is None else idle_seconds
+        now = time.monotonic()
+        with self._lock:
+            idle = [
+                shard_id for shard_id, shard in self._shards.items()
+                if now - shard.last_used >= idle_seconds and not shard.refs and not self._pins[shard_id]
+            ]
+            closing = {shard_id: self._retire(shard_id) for shard_id in idle}
+        for shard_id, system in closing.items():
+            logger.info(f"Closing idle vector shard {shard_dir(shard_id)}")
+            if system is not None:
+                _stop_chroma(system)
+
+    def open_shards(self):
+        with self._lock:
+            return sorted(self._shards)
+
+    def pinned_shards(self):
+        with self._lock:
+            return sorted(self._pins)
+
+    def _start_reaper(self):
+        # Called with self._lock held
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap, name="shard-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = max(settings.SHARD_IDLE_SECONDS / 2, 1)
+        while True:
+            time.sleep(interval)
+            self.close_idle()
+            with self._lock:
+                if not self._shards:
+                    self._reaper = None
+                    return
@@ -0,0 +1,504 @@
+# services/snapshot_service.py
+"""
+Tenant snapshots: export a tenant's chunks (with their stored embeddings),
+routing summaries, processing metadata and uploaded files as one tar.gz, and
+import that archive on another node without re-running parsing, OCR, camelot
+or embedding.
+
+Archive layout, written and read as a stream ("w|gz" / "r|gz"):
+
+    manifest.json     tenant, embedding provider/model/dimension, counts, and
+                      the sha256 and size of every other member
+    chunks.jsonl      one {"id", "document", "metadata", "embedding"} per line
+    summaries.jsonl   the same for the tenant's document summaries
+    metadata.json     the tenant's processed_metadata.json entries
+    files/<name>      uploaded files, under their stored names
+
+The manifest comes first, so an import checks each member's hash while it is
+being read and applies nothing unless every member matches. Chunks and
+summaries are dumped under the shard's lock (without marking the shard
+changed), so the export is a consistent point-in-time copy even while other
+workers ingest.
+"""
+import gzip
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import zlib
+from datetime import datetime
+
+from app.core.config import settings
+from app.services.compact_index import build_compact_index_from_store
+from app.services.document_router import summary_id
+from app.services.file_hash import compute_file_hash
+from app.services.file_store import update_json
+from app.services.metadata_store import METADATA_FILE, WORKER_ID, load_metadata
+from app.services.metrics import stage
+from app.services.shard_store import TENANT_KEY, tenant_filter
+from app.services.vectorstore_service import (
+    get_summary_store,
+    get_vectorstore,
+    safe_collection_name,
+    shards,
+)
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_DIR = "uploaded_files"
+SNAPSHOT_FORMAT = "tenant-snapshot"
+SNAPSHOT_VERSION = 1
+MANIFEST = "manifest.json"
+CHUNKS = "chunks.jsonl"
+SUMMARIES = "summaries.jsonl"
+METADATA = "metadata.json"
+FILES_PREFIX = "files/"
+BATCH_SIZE = 1000  # chunks read from / upserted into Chroma per call
+COPY_BLOCK = 1024 * 1024
+SPOOL_BYTES = 16 * 1024 * 1024  # dumps larger than this spill to a temp file
+QUEUE_POLL_SECONDS = 1.0  # how often a blocked export checks whether its client went away
+
+
+def _sha256_file(f) -> str:
+    digest = hashlib.sha256()
+    f.seek(0)
+    for block in iter(lambda: f.read(COPY_BLOCK), b""):
+        digest.update(block)
+    f.seek(0)
+    return digest.hexdigest()
+
+
+def _size(f) -> int:
+    f.seek(0, os.SEEK_END)
+    size = f.tell()
+    f.seek(0)
+    return size
+
+
+def _dump_collection(store, where: dict, out) -> tuple:
+    """Write every record matching `where` as JSON lines; returns (records, embedding dim)."""
+    count, dim, offset = 0, 0, 0
+    while True:
+        page = store.get(
+            where=where, limit=BATCH_SIZE, offset=offset,
+            include=["embeddings", "documents", "metadatas"],
+        )
+        if not page["ids"]:
+            break
+        for record_id, embedding, document, metadata in zip(
+            page["ids"], page["embeddings"], page["documents"], page["metadatas"]
+        ):
+            embedding = [float(x) for x in embedding]
+            dim = dim or len(embedding)
+            out.write(json.dumps({
+                "id": record_id,
+                "document": document,
+                "metadata": metadata or {},
+                "embedding": embedding,
+            }).encode("utf-8") + b"\n")
+            count += 1
+        offset += len(page["ids"])
+    return count, dim
+
+
+def tenant_files(user_id: str, sources) -> list:
+    """Stored names of the tenant's uploads: processed files and chunk sources that exist on disk."""
+    names = set(sources)
+    names.update(entry["filename"] for entry in load_metadata() if entry["user_id"] == user_id)
+    found = set()
+    for name in names:
+        for candidate in (name, f"{user_id}__{name}"):
+            if os.path.isfile(os.path.join(UPLOAD_DIR, candidate)):
+                found.add(candidate)
+    return sorted(found)
+
+
+def export_tenant(user_id: str, fileobj, include_files: bool = True) -> dict:
+    """Write a snapshot of the tenant to `fileobj` as a streamed tar.gz; returns the manifest."""
+    with tempfile.SpooledTemporaryFile(SPOOL_BYTES) as chunks, \
+            tempfile.SpooledTemporaryFile(SPOOL_BYTES) as summaries:
+        with shards.session(), shards.read_lock(user_id), stage("snapshot_dump"):
+            chunk_count, dim = _dump_collection(get_vectorstore(user_id), tenant_filter(user_id), chunks)
+            summary_count, _ = _dump_collection(get_summary_store(user_id), tenant_filter(user_id), summaries)
+            processed = [entry for entry in load_metadata() if entry["user_id"] == user_id]
+
+        sources = set()
+        chunks.seek(0)
+        for line in chunks:
+            source = json.loads(line)["metadata"].get("source")
+            if source:
+                sources.add(source)
+        files = tenant_files(user_id, sources) if include_files else []
+
+        metadata = json.dumps(processed, indent=2).encode("utf-8")
+        members = {
+            CHUNKS: {"sha256": _sha256_file(chunks), "size": _size(chunks)},
+            SUMMARIES: {"sha256": _sha256_file(summaries), "size": _size(summaries)},
+            METADATA: {"sha256": hashlib.sha256(metadata).hexdigest(), "size": len(metadata)},
+        }
+        for name in files:
+            path = os.path.join(UPLOAD_DIR, name)
+            members[FILES_PREFIX + name] = {"sha256": compute_file_hash(path), "size": os.path.getsize(path)}
+
+        manifest = {
+            "format": SNAPSHOT_FORMAT,
+            "version": SNAPSHOT_VERSION,
+            "tenant": user_id,
+            "created_at": datetime.utcnow().isoformat(),
+            "created_by": WORKER_ID,
+            "embedding": {
+                "provider": settings.EMBEDDING_PROVIDER,
+                "model": settings.EMBEDDING_MODEL,
+                "dimension": dim,
+            },
+            "chunks": chunk_count,
+            "summaries": summary_count,
+            "files": files,
+            "members": members,
+        }
+
+        now = time.time()
+
+        def add(name, f, size):
+            info = tarfile.TarInfo(name)
+            info.size = size
+            info.mtime = now
+            info.mode = 0o644
+            tar.addfile(info, f)
+
+        with stage("snapshot_write"), tarfile.open(fileobj=fileobj, mode="w|gz") as tar:
+            manifest_bytes = json.dumps(manifest, indent=2).encode("utf-8")
+            add(MANIFEST, io.BytesIO(manifest_bytes), len(manifest_bytes))
+            add(CHUNKS, chunks, members[CHUNKS]["size"])
+            add(SUMMARIES, summaries, members[SUMMARIES]["size"])
+            add(METADATA, io.BytesIO(metadata), len(metadata))
+            for name in files:
+                member = FILES_PREFIX + name
+                # Hash checked again while copying: an upload replaced since the manifest was written fails here
+                with open(os.path.join(UPLOAD_DIR, name), "rb") as f:
+                    reader = _HashingReader(f)
+                    add(member, reader, members[member]["size"])
+                if reader.hexdigest() != members[member]["sha256"]:
+                    raise ValueError(f"{name} changed while the snapshot was being written")
+
+    logger.info(
+        f"Exported snapshot of {user_id}: {chunk_count} chunks, {summary_count} summaries, {len(files)} files"
+    )
+    return manifest
+
+
+class _HashingReader:
+    """File wrapper that hashes whatever is read through it."""
+
+    def __init__(self, f):
+        self._f = f
+        self._digest = hashlib.sha256()
+
+    def read(self, size=-1):
+        block = self._f.read(size)
+        self._digest.update(block)
+        return block
+
+    def hexdigest(self) -> str:
+        return self._digest.hexdigest()
+
+
+class _ExportCancelled(Exception):
+    pass
+
+
+class _QueueWriter:
+    """
+    Write end of a bounded byte-block queue: the producer blocks while the
+    consumer is behind, and raises once `cancelled` is set (consumer gone).
+    """
+
+    def __init__(self, blocks: queue.Queue, cancelled: threading.Event):
+        self._blocks = blocks
+        self._cancelled = cancelled
+
+    def put(self, item):
+        while True:
+            if self._cancelled.is_set():
+                raise _ExportCancelled()
+            try:
+                self._blocks.put(item, timeout=QUEUE_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+    def write(self, data) -> int:
+        if data:
+            self.put(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+_DONE = object()
+
+
+def iter_export(user_id: str, include_files: bool = True, max_pending: int = 64):
+    """
+    Yield the snapshot archive as byte blocks while it is being written, for a
+    streaming HTTP response. The archive is produced on a background thread;
+    at most `max_pending` blocks are buffered. Closing the generator (client
+    disconnect) stops the producer and releases its files.
+    """
+    blocks = queue.Queue(maxsize=max_pending)
+    cancelled = threading.Event()
+    writer = _QueueWriter(blocks, cancelled)
+    failure = []
+
+    def produce():
+        try:
+            export_tenant(user_id, writer, include_files=include_files)
+        except _ExportCancelled:
+            logger.info(f"Snapshot export of {user_id} cancelled: client went away")
+            return
+        except Exception as e:
+            logger.error(f"Snapshot export of {user_id} failed: {e}", exc_info=True)
+            failure.append(e)
+        try:
+            writer.put(_DONE)
+        except _ExportCancelled:
+            pass
+
+    threading.Thread(target=produce, name="snapshot-export", daemon=True).start()
+    try:
+        while True:
+            block = blocks.get()
+            if block is _DONE:
+                break
+            yield block
+    finally:
+        cancelled.set()
+    if failure:
+        # Truncates the response, so the client's gzip/tar reader sees a broken archive
+        raise failure[0]
+
+
+def _rename_for(source_tenant: str, target_tenant: str):
+    """Map a stored file name from the source tenant's `<user>__` prefix to the target's."""
+    prefix = f"{source_tenant}__"
+
+    def rename(name):
+        if name and source_tenant != target_tenant and name.startswith(prefix):
+            return f"{target_tenant}__{name[len(prefix):]}"
+        return name
+    return rename
+
+
+def _read_manifest(tar) -> dict:
+    member = tar.next()
+    if member is None or member.name != MANIFEST:
+        raise ValueError("Not a tenant snapshot: the archive must start with manifest.json")
+    manifest = json.loads(tar.extractfile(member).read())
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError("Not a tenant snapshot: unknown manifest format")
+    if manifest.get("version", 0) > SNAPSHOT_VERSION:
+        raise ValueError(f"Snapshot version {manifest['version']} is newer than this server supports")
+    for name in manifest["files"]:
+        # Restored straight into UPLOAD_DIR: only plain file names are accepted
+        if not name or os.path.basename(name) != name or name.startswith("."):
+            raise ValueError(f"Invalid file name in snapshot: {name!r}")
+    allowed = {CHUNKS, SUMMARIES, METADATA} | {FILES_PREFIX + name for name in manifest["files"]}
+    if set(manifest["members"]) != allowed:
+        odd = sorted(set(manifest["members"]) ^ allowed)[0]
+        raise ValueError(f"Snapshot manifest members do not match its file list (e.g. {odd!r})")
+    return manifest
+
+
+def _check_embeddings(manifest: dict):
+    embedding = manifest["embedding"]
+    if not manifest["chunks"]:
+        return
+    if (embedding["provider"], embedding["model"]) != (settings.EMBEDDING_PROVIDER, settings.EMBEDDING_MODEL):
+        raise ValueError(
+            f"Snapshot vectors come from {embedding['provider']}/{embedding['model']}, this node embeds "
+            f"queries with {settings.EMBEDDING_PROVIDER}/{settings.EMBEDDING_MODEL}"
+        )
+
+
+def _extract_verified(tar, manifest: dict, staging: str):
+    """Copy every member into `staging`, checking it against the manifest's size and sha256."""
+    expected = manifest["members"]
+    seen = set()
+    while True:
+        member = tar.next()  # not `for member in tar`, which replays the manifest already read
+        if member is None:
+            break
+        name = member.name
+        if name not in expected or name in seen or not member.isfile():
+            raise ValueError(f"Unexpected archive member: {name}")
+        seen.add(name)
+
+        path = os.path.join(staging, name)
+        # Names were checked against the manifest; this also guards against anything the checks missed
+        if not os.path.realpath(path).startswith(os.path.realpath(staging) + os.sep):
+            raise ValueError(f"Archive member escapes the staging directory: {name}")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        digest = hashlib.sha256()
+        source = tar.extractfile(member)
+        with open(path, "wb") as out:
+            for block in iter(lambda: source.read(COPY_BLOCK), b""):
+                digest.update(block)
+                out.write(block)
+        if member.size != expected[name]["size"] or digest.hexdigest() != expected[name]["sha256"]:
+            raise ValueError(f"Integrity check failed for {name}: content does not match the manifest")
+
+    missing = set(expected) - seen
+    if missing:
+        raise ValueError(f"Snapshot is missing {len(missing)} member(s), e.g. {sorted(missing)[0]}")
+
+
+def _unpack_verified(fileobj, staging: str) -> dict:
+    try:
+        with stage("snapshot_verify"), tarfile.open(fileobj=fileobj, mode="r|gz") as tar:
+            manifest = _read_manifest(tar)
+            _extract_verified(tar, manifest, staging)
+    except (tarfile.TarError, EOFError, zlib.error, gzip.BadGzipFile) as e:
+        raise ValueError(f"Unreadable snapshot archive: {e}")
+    return manifest
+
+
+def verify_snapshot(fileobj) -> dict:
+    """Check every member of a snapshot against its manifest without importing; returns the manifest."""
+    staging = tempfile.mkdtemp(prefix="snapshot_verify_")
+    try:
+        return _unpack_verified(fileobj, staging)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+def _read_records(path: str):
+    with open(path, "rb") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def _batches(records, size: int):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _clear_tenant(user_id: str):
+    """Drop the tenant's chunks, summaries and processing metadata (not its files)."""
+    for store in (get_vectorstore(user_id), get_summary_store(user_id)):
+        ids = store.get(where=tenant_filter(user_id), include=[])["ids"]
+        for start in range(0, len(ids), BATCH_SIZE):
+            store.delete(ids=ids[start:start + BATCH_SIZE])
+    with update_json(METADATA_FILE, []) as data:
+        data[:] = [entry for entry in data if entry["user_id"] != user_id]
+
+
+def import_tenant(fileobj, user_id: str = None, replace: bool = False) -> dict:
+    """
+    Restore a snapshot from a tar.gz stream, as tenant `user_id` (default: the
+    tenant it was exported from). Nothing is written until every member has
+    been verified against the manifest. Fails if the tenant already has chunks,
+    unless `replace` is set, in which case its chunks, summaries and processing
+    metadata are dropped first. Chunks keep their stored embeddings.
+    """
+    staging = tempfile.mkdtemp(prefix="snapshot_import_")
+    try:
+        manifest = _unpack_verified(fileobj, staging)
+        _check_embeddings(manifest)
+
+        source_tenant = manifest["tenant"]
+        user_id = user_id or source_tenant
+        rename = _rename_for(source_tenant, user_id)
+
+        def restamp(metadata):
+            metadata = {**metadata, TENANT_KEY: user_id}
+            if metadata.get("source"):
+                metadata["source"] = rename(metadata["source"])
+            return metadata
+
+        def chunk_id(record_id):
+            # Same ids for a same-tenant restore (re-imports overwrite); derived ones for a copy,
+            # which may share the source tenant's shard
+            if user_id == source_tenant:
+                return record_id
+            return str(uuid.uuid5(uuid.NAMESPACE_URL, f"{user_id}\x00{record_id}"))
+
+        # Files first: they are the only part that can clash with another tenant's data
+        for name in manifest["files"]:
+            target = os.path.join(UPLOAD_DIR, rename(name))
+            if os.path.exists(target) and not replace \
+                    and compute_file_hash(target) != manifest["members"][FILES_PREFIX + name]["sha256"]:
+                raise ValueError(f"{os.path.basename(target)} already exists with different content")
+
+        with shards.session(), shards.write_lock(user_id), stage("snapshot_restore"):
+            vectorstore = get_vectorstore(user_id)  # fetched under the lock, as for ingestion
+            summary_store = get_summary_store(user_id)
+            if vectorstore.get(where=tenant_filter(user_id), limit=1, include=[])["ids"]:
+                if not replace:
+                    raise ValueError(f"{user_id} already has indexed chunks; pass replace to overwrite them")
+                _clear_tenant(user_id)
+
+            for batch in _batches(_read_records(os.path.join(staging, CHUNKS)), BATCH_SIZE):
+                vectorstore._collection.upsert(
+                    ids=[chunk_id(r["id"]) for r in batch],
+                    embeddings=[r["embedding"] for r in batch],
+                    documents=[r["document"] for r in batch],
+                    metadatas=[restamp(r["metadata"]) for r in batch],
+                )
+            for batch in _batches(_read_records(os.path.join(staging, SUMMARIES)), BATCH_SIZE):
+                summary_store._collection.upsert(
+                    ids=[summary_id(user_id, rename(r["metadata"]["source"])) for r in batch],
+                    embeddings=[r["embedding"] for r in batch],
+                    documents=[r["document"] for r in batch],
+                    metadatas=[restamp(r["metadata"]) for r in batch],
+                )
+            if settings.VECTOR_INDEX_MODE == "compact":
+                build_compact_index_from_store(
+                    safe_collection_name(user_id), vectorstore, where=tenant_filter(user_id)
+                )
+
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
+        for name in manifest["files"]:
+            target = os.path.join(UPLOAD_DIR, rename(name))
+            # Same-directory rename so a reader never sees a partial file
+            partial = f"{target}.partial"
+            shutil.copyfile(os.path.join(staging, FILES_PREFIX + name), partial)
+            os.replace(partial, target)
+
+        with open(os.path.join(staging, METADATA), "r") as f:
+            processed = json.load(f)
+        with update_json(METADATA_FILE, []) as data:
+            known = {entry["filename"] for entry in data if entry["user_id"] == user_id}
+            for entry in processed:
+                filename = rename(entry["filename"])
+                if filename not in known:
+                    data.append({**entry, "user_id": user_id, "filename": filename})
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    logger.info(
+        f"Imported snapshot of {source_tenant} as {user_id}: {manifest['chunks']} chunks, "
+        f"{manifest['summaries']} summaries, {len(manifest['files'])} files"
+    )
+    return {
+        "tenant": user_id,
+        "source_tenant": source_tenant,
+        "chunks": manifest["chunks"],
+        "summaries": manifest["summaries"],
+        "files": [rename(name) for name in manifest["files"]],
+    }
@@ -0,0 +1,282 @@
+# services/table_service.py
+import json
+import logging
+import multiprocessing
+import os
+import threading
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import camelot
+import fitz
+import pytesseract
+from pdf2image import convert_from_path
+
+from app.core.config import settings
+from app.services.file_hash import compute_file_hash
+from app.services.metrics import cache_event, stage
+
+logger = logging.getLogger(__name__)
+
+# Pre-pass thresholds (PDF points)
+MIN_RULE_LENGTH = 20       # shorter strokes are underlines/glyph art, not table rules
+MIN_HORIZONTAL_RULES = 3
+MIN_VERTICAL_RULES = 2
+MIN_CELL_GAP = 12          # horizontal gap between words that starts a new cell
+MIN_CELLS_PER_ROW = 3
+MIN_ALIGNED_ROWS = 3
+COLUMN_TOLERANCE = 5       # x positions are bucketed to this width
+MIN_TEXT_CHARS = 20        # pages with less text than this are treated as scans
+
+CACHE_VERSION = 2          # bump when the cached chunk format changes (v2: 0-based OCR pages)
+
+# One camelot pool per server process, started on first use. Spawned, not forked:
+# the server has threads (encoder batcher, executors, reapers) whose locks a
+# forked child could inherit held.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def chunk_table_rows(df, rows_per_chunk=10):
+    chunks = []
+    for i in range(0, len(df), rows_per_chunk):
+        md_chunk = df.iloc[i:i + rows_per_chunk].to_markdown(index=False)
+        chunks.append(md_chunk)
+    return chunks
+
+
+def _count_rules(page):
+    horizontal = vertical = 0
+    for drawing in page.get_drawings():
+        for item in drawing["items"]:
+            if item[0] == "l":
+                p1, p2 = item[1], item[2]
+                dx, dy = abs(p1.x - p2.x), abs(p1.y - p2.y)
+            elif item[0] == "re":
+                rect = item[1]
+                dx, dy = rect.width, rect.height
+                # A cell outline contributes both directions
+                if dx >= MIN_RULE_LENGTH and dy >= MIN_RULE_LENGTH:
+                    horizontal += 2
+                    vertical += 2
+                    continue
+            else:
+                continue
+            if dy < 1 and dx >= MIN_RULE_LENGTH:
+                horizontal += 1
+            elif dx < 1 and dy >= MIN_RULE_LENGTH:
+                vertical += 1
+    return horizontal, vertical
+
+
+def _has_aligned_columns(page):
+    """Detect ruling-less tables: several rows whose cells start at the same x positions."""
+    # Ruling-less table rows are often emitted as one PyMuPDF line per cell, so
+    # group words by their rounded top edge rather than by block/line.
+    rows = defaultdict(list)
+    for x0, y0, x1, _y1, *_ in page.get_text("words"):
+        rows[round(y0 / 2)].append((x0, x1))
+
+    column_hits = Counter()
+    for words in rows.values():
+        words.sort()
+        cell_starts = [words[0][0]]
+        for (_, prev_x1), (x0, _) in zip(words, words[1:]):
+            if x0 - prev_x1 >= MIN_CELL_GAP:
+                cell_starts.append(x0)
+        if len(cell_starts) >= MIN_CELLS_PER_ROW:
+            column_hits.update({round(x / COLUMN_TOLERANCE) for x in cell_starts})
+
+    aligned_columns = [col for col, hits in column_hits.items() if hits >= MIN_ALIGNED_ROWS]
+    return len(aligned_columns) >= MIN_CELLS_PER_ROW
+
+
+def find_table_candidate_pages(file_path):
+    """
+    Cheap PyMuPDF pre-pass over a PDF.
+
+    Returns (table_pages, scanned_pages), both 1-based page numbers. Table pages
+    have ruling lines or column-aligned text and are worth running camelot on;
+    scanned pages have no text layer and can only be handled by OCR.
+    """
+    table_pages, scanned_pages = [], []
+    with fitz.open(file_path) as doc:
+        for page_index, page in enumerate(doc):
+            page_number = page_index + 1
+            if len(page.get_text("text").strip()) < MIN_TEXT_CHARS:
+                if page.get_images():
+                    scanned_pages.append(page_number)
+                continue
+
+            horizontal, vertical = _count_rules(page)
+            if horizontal >= MIN_HORIZONTAL_RULES and vertical >= MIN_VERTICAL_RULES:
+                table_pages.append(page_number)
+            elif _has_aligned_columns(page):
+                table_pages.append(page_number)
+    return table_pages, scanned_pages
+
+
+def _read_page_tables(file_path, page_number):
+    """Worker: run camelot on a single page; returns (page, table DataFrames, succeeded)."""
+    try:
+        tables = camelot.read_pdf(file_path, pages=str(page_number), strip_text='\n')
+        return page_number, [table.df for table in tables], True
+    except Exception as e:
+        logger.warning(f"Camelot failed on {file_path} page {page_number}: {e}")
+        return page_number, [], False
+
+
+def _table_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.TABLE_WORKERS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_table_pool():
+    """Stop the camelot worker processes (call on server shutdown)."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def _extract_camelot_tables(file_path, pages):
+    """Returns (table chunks, whether every page was read without error)."""
+    results = None
+    if settings.TABLE_WORKERS > 1 and len(pages) > 1:
+        pool = _table_pool()
+        try:
+            results = list(pool.map(_read_page_tables, [file_path] * len(pages), pages))
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory); start a fresh pool next time, finish this file inline
+            logger.warning(f"Camelot worker pool broke on {file_path}, reading its pages inline: {e}")
+            _discard_pool(pool)
+    if results is None:
+        results = [_read_page_tables(file_path, page) for page in pages]
+
+    tables_text = []
+    table_id = 0
+    for page_number, frames, _ok in sorted(results, key=lambda result: result[0]):
+        for df in frames:
+            for j, chunk in enumerate(chunk_table_rows(df)):
+                tables_text.append({
+                    "content": chunk,
+                    "metadata": {
+                        "type": "table",
+                        "table_id": table_id,
+                        "chunk_id": j,
+                        "page": page_number - 1,  # 0-based, like PyPDFLoader text chunks
+                    }
+                })
+            table_id += 1
+    return tables_text, all(ok for _page, _frames, ok in results)
+
+
+def _extract_ocr_tables(file_path, pages):
+    """Returns (table chunks, whether every page was rasterized without error)."""
+    tables_text = []
+    complete = True
+    for page_number in pages:
+        try:
+            images = convert_from_path(file_path, first_page=page_number, last_page=page_number)
+        except Exception as e:
+            logger.warning(f"OCR rasterization failed on {file_path} page {page_number}: {e}")
+            complete = False
+            continue
+        for image in images:
+            text = pytesseract.image_to_string(image)
+            if any(sym in text for sym in ["|", "+", "---"]):
+                tables_text.append({
+                    "content": text.strip(),
+                    "metadata": {
+                        "type": "ocr_table",
+                        "page": page_number - 1,  # 0-based, like text and camelot chunks
+                    }
+                })
+    return tables_text, complete
+
+
+def _cache_path(file_hash):
+    return os.path.join(settings.TABLE_CACHE_DIR, f"{file_hash}.v{CACHE_VERSION}.json")
+
+
+def _load_cached_tables(file_hash):
+    path = _cache_path(file_hash)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable table cache {path}: {e}")
+        return None
+
+
+def _save_cached_tables(file_hash, tables_text):
+    os.makedirs(settings.TABLE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(file_hash)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(tables_text, f)
+    os.replace(tmp_path, path)
+
+
+def extract_tables_from_pdf(file_path, original_filename, use_cache=True):
+    """
+    Extract table chunks from a PDF.
+
+    Camelot only runs on pages the pre-pass flags as tabular; OCR is the fallback
+    when camelot finds nothing, restricted to those pages plus scanned pages.
+    Results are cached by file content hash, so re-processing the same PDF
+    (under any name or user) skips extraction entirely; a run where camelot or
+    OCR failed on some page is not cached, so it is retried next time. Chunk
+    pages are 0-based for both camelot and OCR tables, like text chunks.
+    """
+    file_hash = compute_file_hash(file_path)
+    tables_text = _load_cached_tables(file_hash) if use_cache else None
+    if use_cache:
+        cache_event("tables", tables_text is not None)
+
+    if tables_text is None:
+        try:
+            table_pages, scanned_pages = find_table_candidate_pages(file_path)
+        except Exception as e:
+            logger.warning(f"Table pre-pass failed on {file_path}, skipping tables: {e}")
+            return []
+
+        with stage("camelot", pages=len(table_pages)):
+            tables_text, complete = _extract_camelot_tables(file_path, table_pages) if table_pages else ([], True)
+        if not tables_text:
+            ocr_pages = sorted(set(table_pages) | set(scanned_pages))
+            try:
+                with stage("ocr", pages=len(ocr_pages)):
+                    tables_text, ocr_complete = _extract_ocr_tables(file_path, ocr_pages)
+                complete = complete and ocr_complete
+            except Exception as ocr_e:
+                logger.error(f"OCR extraction failed: {ocr_e}")
+                tables_text, complete = [], False
+
+        # A transient failure must not be remembered for this content hash forever
+        if use_cache and complete:
+            _save_cached_tables(file_hash, tables_text)
+        elif use_cache:
+            logger.info(f"Not caching tables for {file_path}: extraction hit errors")
+
+    return [
+        {"content": item["content"], "metadata": {"source": original_filename, **item["metadata"]}}
+        for item in tables_text
+    ]
@@ -0,0 +1,149 @@
+# services/text_processing.py
+"""
+Shared text normalization, sentence segmentation and fuzzy line matching.
+
+normalize_text gives exactly the result the viewer's original six-regex
+version did, but with one precompiled pattern, a str.translate table for the
+quote folding and character filtering, and no NFKD pass for ASCII input. The
+punkt tokenizer is located (downloaded if missing) and loaded once per
+process. Normalized page lines are memoized per (file hash, page), so repeated
+highlight requests on a document skip both PyMuPDF text extraction and
+normalization.
+"""
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from difflib import SequenceMatcher
+
+import nltk
+
+from app.services.metrics import cache_event
+
+HEADER_RE = re.compile(r"#+\s*")  # markdown headers, and the whitespace after them
+QUOTES = "“”\"'«»’"
+ALLOWED = set("abcdefghijklmnopqrstuvwxyz0123456789.,;:!?()\"-")
+PAGE_LINES_CACHE_SIZE = 512  # pages
+
+
+class _FoldTable(dict):
+    """
+    str.translate table: quotes -> '"', allowed characters and whitespace kept,
+    everything else dropped. Filled lazily, so any character costs one
+    Python-level lookup the first time and a C dict hit afterwards.
+    """
+
+    def __missing__(self, codepoint):
+        char = chr(codepoint)
+        if char in QUOTES:
+            value = '"'
+        elif char in ALLOWED or char.isspace():
+            value = codepoint
+        else:
+            value = None
+        self[codepoint] = value
+        return value
+
+
+_FOLD = _FoldTable()
+
+
+def normalize_text(text: str) -> str:
+    text = text.lower()
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+    text = HEADER_RE.sub("", text)
+    text = text.translate(_FOLD)
+    return " ".join(text.split())
+
+
+_punkt = None
+_punkt_lock = threading.Lock()
+
+
+def _load_punkt():
+    try:
+        from nltk.tokenize import PunktTokenizer  # nltk >= 3.8.2 ships punkt_tab
+    except ImportError:
+        PunktTokenizer = None
+
+    if PunktTokenizer is not None:
+        try:
+            nltk.data.find("tokenizers/punkt_tab/english/")
+        except LookupError:
+            nltk.download("punkt_tab", quiet=True)
+        return PunktTokenizer("english")
+
+    try:
+        nltk.data.find("tokenizers/punkt")
+    except LookupError:
+        nltk.download("punkt", quiet=True)
+    return nltk.data.load("tokenizers/punkt/english.pickle")
+
+
+def sent_tokenize(text: str) -> list:
+    """nltk.sent_tokenize (English), with the punkt model found and loaded once."""
+    global _punkt
+    if _punkt is None:
+        with _punkt_lock:
+            if _punkt is None:
+                _punkt = _load_punkt()
+    return _punkt.tokenize(text)
+
+
+def normalize_lines(lines) -> list:
+    return [(line, normalize_text(line)) for line in lines]
+
+
+_page_lines = OrderedDict()
+_page_lines_lock = threading.Lock()
+
+
+def cached_page_lines(key, extract) -> list:
+    """
+    Memoized [(line, normalized line)] for one page. `key` must identify the
+    page's content (e.g. file hash and page index); `extract()` returns the
+    page's raw lines on a miss.
+    """
+    with _page_lines_lock:
+        lines = _page_lines.get(key)
+        if lines is not None:
+            _page_lines.move_to_end(key)
+    cache_event("page_lines", lines is not None)
+    if lines is not None:
+        return lines
+
+    lines = normalize_lines(extract())
+    with _page_lines_lock:
+        _page_lines[key] = lines
+        while len(_page_lines) > PAGE_LINES_CACHE_SIZE:
+            _page_lines.popitem(last=False)
+    return lines
+
+
+def best_fuzzy_match(queries, lines, threshold: float):
+    """
+    Best line for any of the normalized `queries`; `lines` is [(line, normalized)].
+    Same result as scanning queries x lines in order with
+    SequenceMatcher(None, query, line).ratio() and keeping the first strictly
+    better score >= threshold, but each line's matcher index is built once and
+    pairs whose ratio upper bounds fall below the threshold are never scored.
+    Returns (line or None, score).
+    """
+    scores = [[0.0] * len(lines) for _ in queries]
+    matcher = SequenceMatcher(None)
+    for j, (_line, line_norm) in enumerate(lines):
+        matcher.set_seq2(line_norm)
+        for i, query in enumerate(queries):
+            matcher.set_seq1(query)
+            if matcher.real_quick_ratio() >= threshold and matcher.quick_ratio() >= threshold:
+                scores[i][j] = matcher.ratio()
+
+    best_score = 0
+    best_line = None
+    for row in scores:
+        for (line, _line_norm), score in zip(lines, row):
+            if score > best_score and score >= threshold:
+                best_score = score
+                best_line = line
+    return best_line, best_score
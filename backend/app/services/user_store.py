@@ -1,15 +1,18 @@
 # services/user_store.py
-import json
-import os
+from app.services.file_store import read_json, update_json, write_json
 
 USER_FILE = "users.json"
 
 def load_users():
-    if not os.path.exists(USER_FILE):
-        return {}
-    with open(USER_FILE, "r") as f:
-        return json.load(f)
+    return read_json(USER_FILE, {})
 
 def save_users(users: dict):
-    with open(USER_FILE, "w") as f:
-        json.dump(users, f, indent=2)
+    write_json(USER_FILE, users)
+
+def add_user(email: str, record: dict) -> bool:
+    """Insert a user unless the email is taken; atomic across workers."""
+    with update_json(USER_FILE, {}) as users:
+        if email in users:
+            return False
+        users[email] = record
+    return True
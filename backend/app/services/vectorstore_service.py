@@ -1,22 +1,38 @@
+import logging
 import os
 import re
 import tempfile
-import camelot
-import pytesseract
+import threading
 from typing import List
-from pdf2image import convert_from_path
 from fastapi import UploadFile
 from langchain_community.document_loaders import PyPDFLoader
-from langchain_community.vectorstores import Chroma
-from langchain_openai import OpenAIEmbeddings
+from langchain_core.embeddings import Embeddings
 from langchain.docstore.document import Document
 from app.core.config import settings
 from app.services.metadata_store import mark_as_processed
-from langchain_community.embeddings import HuggingFaceEmbeddings
-
-
-
-CHROMA_DIR = "chroma_store"
+from app.services.providers import get_embeddings
+from app.services.table_service import extract_tables_from_pdf
+from app.services.compact_index import (
+    CompactRetriever,
+    build_compact_index_from_store,
+    load_compact_index,
+)
+from app.services.shard_store import ShardRegistry, TENANT_KEY, tenant_filter
+from app.services.document_router import (
+    SUMMARY_COLLECTION,
+    RoutedRetriever,
+    build_document_summary,
+    delete_document_summary,
+    route_by_vector,
+    should_route,
+    source_filter,
+    upsert_document_summary,
+)
+from app.services.metrics import CHUNKS_INGESTED, PAGES_PARSED, stage
+
+logger = logging.getLogger(__name__)
+
+CHROMA_DIR = settings.CHROMA_DIR
 
 def safe_collection_name(user_id: str) -> str:
     return user_id.replace("@", "_at_").replace(".", "_dot_")
@@ -49,78 +65,25 @@ def split_by_sections(text):
             structured.append((title.title(), content))
     return structured
 
-def chunk_table_rows(df, rows_per_chunk=10):
-    chunks = []
-    for i in range(0, len(df), rows_per_chunk):
-        md_chunk = df.iloc[i:i + rows_per_chunk].to_markdown(index=False)
-        chunks.append(md_chunk)
-    return chunks
+def process_documents_for_user(filepaths: List[str], user_id: str) -> int:
+    with shards.session():
+        return _process_documents_for_user(filepaths, user_id)
 
-def extract_tables_from_pdf(file_path, original_filename):
-    tables_text = []
-    try:
-        tables = camelot.read_pdf(file_path, pages='all', strip_text='\n')
-        if not tables:
-            raise ValueError("No tables found with Camelot, trying OCR fallback...")
-        for i, table in enumerate(tables):
-            df = table.df
-            for j, chunk in enumerate(chunk_table_rows(df)):
-                tables_text.append({
-                    "content": chunk,
-                    "metadata": {
-                        "source": original_filename,
-                        "type": "table",
-                        "table_id": i,
-                        "chunk_id": j
-                    }
-                })
-    except Exception:
-        try:
-            for i, image in enumerate(convert_from_path(file_path)):
-                text = pytesseract.image_to_string(image)
-                if any(sym in text for sym in ["|", "+", "---"]):
-                    tables_text.append({
-                        "content": text.strip(),
-                        "metadata": {
-                            "source": original_filename,
-                            "type": "ocr_table",
-                            "page": i + 1
-                        }
-                    })
-        except Exception as ocr_e:
-            print(f"OCR extraction failed: {ocr_e}")
-    return tables_text
 
-def process_documents_for_user(filepaths: List[str], user_id: str) -> int:
-    print(f"[PROCESS] Starting document processing for user: {user_id}")
+def _process_documents_for_user(filepaths: List[str], user_id: str) -> int:
+    logger.info(f"Starting document processing for user: {user_id}")
 
     documents = []
+    summaries = []  # (filename, routing summary, chunk count)
     collection_name = safe_collection_name(user_id)
-    user_store_dir = os.path.join(CHROMA_DIR, collection_name)  # ✅ safe path
-
-    os.makedirs(user_store_dir, exist_ok=True)
-
-    print(f"[RAG] Using vectorstore: {user_store_dir}, collection: {collection_name}")
-    print(f"[PROCESS] Saving {len(documents)} documents to vectorstore at {user_store_dir}")
 
     existing_sources = set()
-    if os.path.exists(os.path.join(user_store_dir, "chroma.sqlite3")):
-        print(f"[SKIP] Found existing chroma.sqlite3 for {user_id}, checking for duplicates")
-        try:
-            vectorstore = Chroma(
-                embedding_function=OpenAIEmbeddings(
-                    model="text-embedding-3-large",
-                    openai_api_key=settings.OPENAI_API_KEY
-                ),
-                persist_directory=user_store_dir,
-                collection_name=collection_name
-            )
-            existing_sources = {
-                meta.get("source")
-                for meta in vectorstore.get(include=["metadatas"])['metadatas']
-            }
-        except Exception as e:
-            print(f"Failed to load existing vectorstore: {e}")
+    try:
+        existing_sources = get_tenant_sources(user_id)
+        if existing_sources:
+            logger.debug(f"{user_id} already has {len(existing_sources)} sources, checking for duplicates")
+    except Exception as e:
+        logger.warning(f"Failed to load existing vectorstore: {e}")
 
     for filepath in filepaths:
         filename = os.path.basename(filepath)
@@ -130,24 +93,29 @@ def process_documents_for_user(filepaths: List[str], user_id: str) -> int:
         try:
             loader = PyPDFLoader(filepath)
             try:
-                raw_docs = loader.load()
-                print(f"[LOAD] Loaded {len(raw_docs)} raw pages from {filepath}")
+                with stage("parse"):
+                    raw_docs = loader.load()
+                PAGES_PARSED.inc(len(raw_docs))
+                logger.info(f"Loaded {len(raw_docs)} raw pages from {filepath}")
             except Exception as e:
-                print(f"[LOAD] Failed to load {filepath} with PyPDFLoader, trying fallback: {e}")
+                logger.error(f"Failed to load {filepath} with PyPDFLoader: {e}")
                 return 0
 
+            file_start = len(documents)
+            section_titles = []
             for doc in raw_docs:
                 sections = split_by_sections(doc.page_content)
                 if sections:
                     for title, text in sections:
+                        section_titles.append(title)
                         documents.append(Document(
                             page_content=f"# {title}\n\n{text}",
-                            metadata={**doc.metadata, "section": title, "source": filename}
+                            metadata={**doc.metadata, "section": title, "source": filename, "type": "text"}
                         ))
                 else:
                     documents.append(Document(
                         page_content=doc.page_content,
-                        metadata={**doc.metadata, "source": filename}
+                        metadata={**doc.metadata, "source": filename, "type": "text"}
                     ))
 
             for item in extract_tables_from_pdf(filepath, filename):
@@ -156,77 +124,230 @@ def process_documents_for_user(filepaths: List[str], user_id: str) -> int:
                     metadata=item["metadata"]
                 ))
 
-            mark_as_processed(user_id, filename, len(documents))
+            summaries.append((
+                filename,
+                build_document_summary(filename, section_titles, [d.page_content for d in raw_docs[:3]]),
+                len(documents) - file_start,
+            ))
+            mark_as_processed(user_id, filename, len(documents), path=filepath)
 
         except Exception as e:
-            print(f"Failed to process {filename}: {e}")
+            logger.error(f"Failed to process {filename}: {e}", exc_info=True)
 
     if not documents:
         return 0
 
-    vectorstore = Chroma.from_documents(
-        documents=documents,
-        embedding=OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=settings.OPENAI_API_KEY
-        ),
-        persist_directory=user_store_dir,
-        collection_name=collection_name
-    )
-    vectorstore.persist()
+    for doc in documents:
+        doc.metadata[TENANT_KEY] = user_id
+
+    logger.info(f"Saving {len(documents)} documents to vector shard for {user_id}")
+    with shards.write_lock(user_id), stage("upsert"):
+        vectorstore = get_vectorstore(user_id)  # re-fetched under the lock: picks up other workers' writes
+        vectorstore.add_documents(documents)
+        summary_store = get_summary_store(user_id)
+        for filename, summary, chunks in summaries:
+            upsert_document_summary(summary_store, user_id, filename, summary, chunks)
+        vectorstore.persist()
+        if settings.VECTOR_INDEX_MODE == "compact":
+            # Under the lock, so builds publish in the same order as the writes they include
+            build_compact_index_from_store(collection_name, vectorstore, where=tenant_filter(user_id))
+    for doc in documents:
+        CHUNKS_INGESTED.inc(type=doc.metadata.get("type", "text"))
 
     return len(documents)
 
-def load_vectorstore(user_id: str):
-    user_dir = os.path.join(CHROMA_DIR, safe_collection_name(user_id))  # ✅ safe path
-    embeddings = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    return Chroma(persist_directory=user_dir, embedding_function=embeddings)
+
+class TimedEmbeddings(Embeddings):
+    """Records every embedding call under the "embed" stage metric/span."""
+
+    def __init__(self, inner: Embeddings):
+        self.inner = inner
+
+    def embed_documents(self, texts):
+        with stage("embed", texts=len(texts)):
+            return self.inner.embed_documents(texts)
+
+    def embed_query(self, text):
+        with stage("embed", texts=1):
+            return self.inner.embed_query(text)
+
+
+_embedding_function = None
+_embedding_function_lock = threading.Lock()
+
+
+def get_embedding_function():
+    """Shared embedder; built once so a local model is loaded (and warmed) only once."""
+    global _embedding_function
+    with _embedding_function_lock:
+        if _embedding_function is None:
+            _embedding_function = TimedEmbeddings(get_embeddings())
+        return _embedding_function
+
+
+shards = ShardRegistry(get_embedding_function)
 
 
 def get_vectorstore(user_id):
-    user_store_dir = os.path.join(CHROMA_DIR, safe_collection_name(user_id))  # ✅ safe path
-    return Chroma(
-        collection_name=safe_collection_name(user_id),
-        persist_directory=user_store_dir,
-        embedding_function=OpenAIEmbeddings(
-            model="text-embedding-3-large",
-            openai_api_key=settings.OPENAI_API_KEY
-        )
-    )
+    """
+    Return the shard store holding this tenant's chunks.
+
+    The store is shared with other tenants: every get/search/delete against it
+    must be restricted with tenant_filter(user_id).
+    """
+    return shards.for_tenant(user_id)
+
+
+def get_summary_store(user_id):
+    """Per-shard collection of document summary embeddings used for routing."""
+    return shards.for_tenant(user_id, SUMMARY_COLLECTION)
+
+
+def get_tenant_sources(user_id) -> set:
+    with shards.session():
+        results = get_vectorstore(user_id).get(where=tenant_filter(user_id), include=["metadatas"])
+    return {meta.get("source") for meta in results["metadatas"] if meta.get("source")}
+
+
+def build_metadata_filter(filenames=None, sections=None, types=None):
+    """
+    Chroma `where` clause scoping a query to some documents, sections and/or
+    chunk types, using the metadata ingestion writes (source, section, type).
+    Returns None when nothing is scoped.
+    """
+    clauses = []
+    if filenames:
+        clauses.append({"source": {"$in": list(filenames)}})
+    if sections:
+        # Ingestion stores section titles title-cased (see split_by_sections)
+        clauses.append({"section": {"$in": [section.strip().title() for section in sections]}})
+    if types:
+        clauses.append({"type": {"$in": list(types)}})
+
+    if not clauses:
+        return None
+    if len(clauses) == 1:
+        return clauses[0]
+    return {"$and": clauses}
+
 
+def _compact_retriever(user_id, k, metadata_filter=None):
+    if settings.VECTOR_INDEX_MODE != "compact":
+        return None
+    index = load_compact_index(safe_collection_name(user_id))
+    if index is None:
+        logger.warning(f"No compact index for {user_id} yet, falling back to Chroma")
+        return None
+    return CompactRetriever(index=index, embeddings=get_embedding_function(), k=k, filter=metadata_filter)
 
 
-def get_retriever(user_id, search_kwargs=None):
+def get_retriever(user_id, search_kwargs=None, route=True):
     if search_kwargs is None:
         search_kwargs = {"k": 4}
     try:
+        k = search_kwargs.get("k", 4)
+        compact = _compact_retriever(user_id, k, search_kwargs.get("filter"))
+
         vectorstore = get_vectorstore(user_id)
+        summary_store = get_summary_store(user_id)
+        # A metadata scope selects chunks itself; routing first could drop every document that matches it
+        if route and not search_kwargs.get("filter") and should_route(summary_store, user_id):
+            return RoutedRetriever(
+                user_id=user_id,
+                vectorstore=vectorstore,
+                summaries=summary_store,
+                embeddings=get_embedding_function(),
+                k=k,
+                top_n=settings.ROUTING_TOP_DOCUMENTS,
+                filter=search_kwargs.get("filter"),
+                compact=compact,
+            )
+        if compact is not None:
+            return compact
+
+        search_kwargs = {
+            **search_kwargs,
+            "filter": tenant_filter(user_id, search_kwargs.get("filter")),
+        }
         return vectorstore.as_retriever(search_kwargs=search_kwargs)
     except Exception as e:
-        print(f"[RAG] Failed to load retriever for user {user_id}: {e}")
+        logger.error(f"Failed to load retriever for user {user_id}: {e}", exc_info=True)
         return None
 
-def delete_file_chunks(user_id: str, filename: str):
-    collection_name = safe_collection_name(user_id)
-    persist_directory = os.path.join(CHROMA_DIR, collection_name)  # ✅ safe path
 
-    embedding_function = HuggingFaceEmbeddings(model_name="BAAI/bge-small-en-v1.5")
-    vectorstore = Chroma(
-        collection_name=collection_name,
-        embedding_function=embedding_function,
-        persist_directory=persist_directory,
+def _query_chunks(vectorstore, query_vectors, k, where):
+    # One Chroma query for many vectors instead of a round trip per question
+    results = vectorstore._collection.query(
+        query_embeddings=[list(vector) for vector in query_vectors],
+        n_results=k,
+        where=where,
+        include=["documents", "metadatas"],
     )
+    return [
+        [Document(page_content=text, metadata=meta or {}) for text, meta in zip(texts, metas)]
+        for texts, metas in zip(results["documents"], results["metadatas"])
+    ]
+
+
+def search_batch(user_id, questions, k, metadata_filter=None, route=True):
+    """
+    Retrieve k chunks for each of many questions: one embedding call for the
+    whole batch, then a single vectorized Chroma query (or per-question routing
+    / compact-index search on the precomputed vectors). Mirrors get_retriever,
+    including never routing a scoped (metadata_filter) search.
+    """
+    with shards.session():
+        return _search_batch(user_id, questions, k, metadata_filter, route)
+
+
+def _search_batch(user_id, questions, k, metadata_filter, route):
+    query_vectors = get_embedding_function().embed_documents(list(questions))
+    vectorstore = get_vectorstore(user_id)
+    compact = _compact_retriever(user_id, k, metadata_filter)
+    summary_store = get_summary_store(user_id)
+
+    with stage("search", questions=len(questions)):
+        if route and not metadata_filter and should_route(summary_store, user_id):
+            results = []
+            for query_vector in query_vectors:
+                sources = route_by_vector(summary_store, user_id, query_vector, settings.ROUTING_TOP_DOCUMENTS)
+                if not sources:
+                    results.append([])
+                    continue
+                where = source_filter(sources, metadata_filter)
+                if compact is not None:
+                    results.append(compact.search_by_vector(query_vector, where))
+                else:
+                    results.extend(_query_chunks(vectorstore, [query_vector], k, tenant_filter(user_id, where)))
+            return results
+        if compact is not None:
+            return [compact.search_by_vector(query_vector, metadata_filter) for query_vector in query_vectors]
+        return _query_chunks(vectorstore, query_vectors, k, tenant_filter(user_id, metadata_filter))
+
 
-    results = vectorstore.get()
+def delete_file_chunks(user_id: str, filename: str):
+    with shards.session():
+        _delete_file_chunks(user_id, filename)
 
-    to_delete = []
-    for i, meta in enumerate(results["metadatas"]):
-        if meta.get("source") == filename:
-            to_delete.append(results["ids"][i])
+
+def _delete_file_chunks(user_id: str, filename: str):
+    vectorstore = get_vectorstore(user_id)
+
+    results = vectorstore.get(where=tenant_filter(user_id, {"source": filename}), include=[])
+    to_delete = results["ids"]
+
+    with shards.write_lock(user_id):
+        delete_document_summary(get_summary_store(user_id), user_id, filename)
 
     if not to_delete:
-        print(f"[INFO] No chunks found for {filename}")
+        logger.info(f"No chunks found for {filename}")
         return
 
-    vectorstore.delete(ids=to_delete)
-    print(f"[INFO] Deleted {len(to_delete)} chunks for {filename}")
+    with shards.write_lock(user_id):
+        vectorstore = get_vectorstore(user_id)
+        vectorstore.delete(ids=to_delete)
+        if settings.VECTOR_INDEX_MODE == "compact":
+            build_compact_index_from_store(
+                safe_collection_name(user_id), vectorstore, where=tenant_filter(user_id)
+            )
+    logger.info(f"Deleted {len(to_delete)} chunks for {filename}")
@@ -0,0 +1,249 @@
+# services/warmup_service.py
+"""
+Tenant warm-up and the warm-tenant pool.
+
+A tenant's first question otherwise pays for opening its Chroma shard, paging
+its HNSW index and SQLite data into memory, loading its compact index and the
+first call into the embedding and reranking models. On login a warm-up of all
+of that is queued on a small background pool. Warm tenants (warmed up, or
+simply queried recently) pin their shard open so the idle reaper keeps it;
+the pool is bounded by WARM_TENANTS_MAX and tenants drop out after
+WARM_TENANT_IDLE_SECONDS without a query. Chat latency is recorded separately
+for cold and warm tenants so the pool can be sized.
+
+All of this state is per worker process. So that a login served by one
+worker warms the tenant wherever its chat requests land, request_warmup
+records the request in a shared file that every worker polls (start_sync)
+and warms from. Pins are capped at WARM_PINNED_SHARDS_MAX shards per
+process, so warm tenants can never keep every shard open.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from app.core.config import settings
+from app.services.file_store import read_json, update_json
+from app.services.compact_index import load_compact_index
+from app.services.encoding_service import get_sentence_encoder
+from app.services.metrics import CallbackGauge, Counter, Histogram, registry, stage
+from app.services.shard_store import tenant_filter
+from app.services.vectorstore_service import (
+    get_embedding_function,
+    get_summary_store,
+    get_vectorstore,
+    safe_collection_name,
+    shards,
+)
+
+logger = logging.getLogger(__name__)
+
+WARM_REQUESTS_FILE = "warm_requests.json"  # user_id -> time of the last login asking for a warm-up
+
+QUERY_LATENCY = registry.register(Histogram(
+    "chat_query_duration_seconds", "Chat answer latency by whether the tenant was warm.", labels=("tenant_state",),
+))
+EVICTIONS = registry.register(Counter(
+    "warm_tenant_evictions_total", "Tenants dropped from the warm pool.", labels=("reason",),
+))
+
+
+def warm_tenant(user_id: str):
+    """Open the tenant's stores and touch every index a query will use."""
+    with shards.session():
+        vectorstore = get_vectorstore(user_id)
+        get_summary_store(user_id)
+        sample = vectorstore.get(where=tenant_filter(user_id), limit=1, include=["embeddings"])
+        if sample["ids"]:
+            # One tiny query loads the shard's HNSW index and the tenant's metadata pages
+            vectorstore._collection.query(
+                query_embeddings=[list(sample["embeddings"][0])], n_results=1, where=tenant_filter(user_id)
+            )
+    if settings.VECTOR_INDEX_MODE == "compact":
+        load_compact_index(safe_collection_name(user_id))
+    _warm_models()
+
+
+_models_warm = False
+_models_lock = threading.Lock()
+
+
+def _warm_models():
+    global _models_warm
+    with _models_lock:
+        if _models_warm:
+            return
+        get_embedding_function().embed_query("warm-up")
+        get_sentence_encoder().encode(["warm-up"])
+        _models_warm = True
+
+
+class WarmTenantPool:
+    def __init__(self, max_tenants: int, idle_seconds: float, workers: int, max_pinned_shards: int):
+        self.max_tenants = max_tenants
+        self.idle_seconds = idle_seconds
+        self.max_pinned_shards = max_pinned_shards
+        self._tenants = OrderedDict()  # user_id -> last use (monotonic), least recent first
+        self._pinned = set()  # warm tenants holding a shard pin
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="warmup")
+        self._reaper = None
+        self._warmups = 0
+        self._failures = 0
+        self._sync = None
+        self._synced_until = time.time()  # warm requests up to here have been picked up
+
+    def touch(self, user_id: str) -> str:
+        """Mark the tenant used now; returns its state before this use ("warm" or "cold")."""
+        evicted = []
+        with self._lock:
+            state = "warm" if user_id in self._tenants else "cold"
+            if state == "cold":
+                while self._tenants and len(self._tenants) >= self.max_tenants:
+                    tenant = self._tenants.popitem(last=False)[0]
+                    self._unpin(tenant)  # before pinning below, so its pin slot can be reused
+                    evicted.append(tenant)
+            if user_id not in self._pinned and shards.pin(user_id, self.max_pinned_shards):
+                # Retried on later uses if the pinned-shard cap was reached
+                self._pinned.add(user_id)
+            self._tenants[user_id] = time.monotonic()
+            self._tenants.move_to_end(user_id)
+            self._start_reaper()
+        for tenant in evicted:
+            self._evict(tenant, "capacity")
+        return state
+
+    def schedule(self, user_id: str) -> bool:
+        """Queue a background warm-up unless the tenant is warm or already queued."""
+        with self._lock:
+            if user_id in self._tenants or user_id in self._pending:
+                return False
+            self._pending.add(user_id)
+        self._executor.submit(self._warm, user_id)
+        return True
+
+    def _warm(self, user_id: str):
+        try:
+            with stage("warmup"):
+                warm_tenant(user_id)
+            self.touch(user_id)
+            with self._lock:
+                self._warmups += 1
+            logger.info(f"Warmed retrieval state for {user_id}")
+        except Exception as e:
+            with self._lock:
+                self._failures += 1
+            logger.warning(f"Warm-up for {user_id} failed: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(user_id)
+
+    def _unpin(self, user_id: str):
+        # Called with self._lock held
+        if user_id in self._pinned:
+            self._pinned.discard(user_id)
+            shards.unpin(user_id)
+
+    def _evict(self, user_id: str, reason: str):
+        EVICTIONS.inc(reason=reason)
+        logger.debug(f"Evicted {user_id} from the warm pool ({reason})")
+
+    def evict_idle(self):
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            idle = [tenant for tenant, last_used in self._tenants.items() if last_used <= cutoff]
+            for tenant in idle:
+                del self._tenants[tenant]
+                self._unpin(tenant)
+        for tenant in idle:
+            self._evict(tenant, "idle")
+
+    def _start_reaper(self):
+        # Called with self._lock held
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._reaper = threading.Thread(target=self._reap, name="warm-tenant-reaper", daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = max(self.idle_seconds / 4, 1)
+        while True:
+            time.sleep(interval)
+            self.evict_idle()
+            with self._lock:
+                if not self._tenants:
+                    self._reaper = None
+                    return
+
+    def request(self, user_id: str):
+        """Warm the tenant here and, through the shared requests file, in every other worker."""
+        now = time.time()
+        with update_json(WARM_REQUESTS_FILE, {}) as requests:
+            requests[user_id] = now
+            for tenant in [t for t, at in requests.items() if now - at > self.idle_seconds]:
+                del requests[tenant]
+        self.schedule(user_id)
+
+    def sync(self):
+        """Schedule warm-ups requested (by any worker) since the last sync."""
+        requests = read_json(WARM_REQUESTS_FILE, {})
+        since = self._synced_until
+        newest = max(requests.values(), default=since)
+        for user_id, requested_at in requests.items():
+            if requested_at > since:
+                self.schedule(user_id)
+        self._synced_until = max(since, newest)
+
+    def start_sync(self, interval: float):
+        """Start polling the shared warm requests (call once per worker process)."""
+        with self._lock:
+            if self._sync is not None:
+                return
+            self._sync = threading.Thread(target=self._sync_loop, args=(interval,), name="warm-sync", daemon=True)
+            self._sync.start()
+
+    def _sync_loop(self, interval: float):
+        while True:
+            time.sleep(interval)
+            try:
+                self.sync()
+            except Exception as e:
+                logger.warning(f"Could not read shared warm-up requests: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "warm_tenants": len(self._tenants),
+                "max_tenants": self.max_tenants,
+                "pinned_shards": len(shards.pinned_shards()),
+                "max_pinned_shards": self.max_pinned_shards,
+                "pending_warmups": len(self._pending),
+                "warmups": self._warmups,
+                "failed_warmups": self._failures,
+            }
+        for state in ("cold", "warm"):
+            count, total = QUERY_LATENCY.totals(tenant_state=state)
+            stats[f"{state}_queries"] = count
+            stats[f"{state}_query_ms_mean"] = total / count * 1000 if count else 0.0
+        return stats
+
+
+warm_tenants = WarmTenantPool(
+    max_tenants=settings.WARM_TENANTS_MAX,
+    idle_seconds=settings.WARM_TENANT_IDLE_SECONDS,
+    workers=settings.WARMUP_WORKERS,
+    max_pinned_shards=settings.WARM_PINNED_SHARDS_MAX,
+)
+
+registry.register(CallbackGauge(
+    "warm_tenants", "Tenants currently in the warm pool.", (), lambda: {(): warm_tenants.stats()["warm_tenants"]},
+))
+
+
+def timed_query(user_id: str, fn, *args, **kwargs):
+    """Run a chat query, recording its latency as cold or warm for the tenant."""
+    state = warm_tenants.touch(user_id)
+    with QUERY_LATENCY.time(tenant_state=state):
+        return fn(*args, **kwargs)
@@ -0,0 +1,159 @@
+"""
+Compact index vs. Chroma: memory, disk size, latency and recall@k.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_compact_index --synthetic 20000
+    python -m benchmarks.bench_compact_index --user someone@example.com
+
+Synthetic mode builds a throwaway Chroma collection of clustered 3072-d unit
+vectors; --user benchmarks a real tenant's existing collection. Queries are
+perturbed copies of stored vectors, so no embedding API calls are made.
+Recall@k is measured against exact float32 brute force.
+
+"disk MB" is everything the path needs on disk: the compact index is a side
+index next to the Chroma store, so its total includes Chroma ("side MB").
+"anon MB" is the private memory a path adds; "mapped MB" is file-backed
+pages it has memory-mapped, which the kernel can drop and re-read.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from app.core.config import settings
+from app.services import compact_index
+from app.services.shard_store import SHARD_COLLECTION, tenant_filter
+from app.services.vectorstore_service import get_vectorstore, safe_collection_name
+
+CHROMA_ADD_BATCH = 4000
+
+
+def memory_bytes():
+    """(anonymous, file-backed) resident bytes of this process."""
+    with open("/proc/self/statm") as f:
+        _size, resident, shared = (int(field) for field in f.read().split()[:3])
+    page = os.sysconf("SC_PAGE_SIZE")
+    return (resident - shared) * page, shared * page
+
+
+def memory_delta(before):
+    anon, mapped = memory_bytes()
+    return f"{(anon - before[0]) / 1e6:8.1f} {(mapped - before[1]) / 1e6:9.1f}"
+
+
+def dir_size(path):
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _dirs, files in os.walk(path)
+        for name in files
+    )
+
+
+def percentile(values, pct):
+    return float(np.percentile(np.asarray(values) * 1000, pct))
+
+
+def synthetic_store(count, dim, workdir):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(max(count // 50, 1), dim)).astype(np.float32)
+    vectors = centers[rng.integers(0, len(centers), count)] + 0.3 * rng.normal(size=(count, dim))
+    vectors = compact_index._normalize(vectors.astype(np.float32))
+
+    store = Chroma(collection_name="bench", persist_directory=os.path.join(workdir, "chroma"))
+    for start in range(0, count, CHROMA_ADD_BATCH):
+        end = min(start + CHROMA_ADD_BATCH, count)
+        store._collection.add(
+            ids=[str(i) for i in range(start, end)],
+            embeddings=vectors[start:end].tolist(),
+            documents=[f"chunk {i}" for i in range(start, end)],
+            metadatas=[{"source": f"doc{i % 100}.pdf"} for i in range(start, end)],
+        )
+    return store, os.path.join(workdir, "chroma")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--synthetic", type=int, metavar="N", help="number of synthetic vectors")
+    source.add_argument("--user", help="benchmark an existing tenant collection")
+    parser.add_argument("--dim", type=int, default=3072)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=15)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_compact_")
+    settings.COMPACT_INDEX_DIR = os.path.join(workdir, "compact")
+    try:
+        if args.synthetic:
+            store, chroma_dir = synthetic_store(args.synthetic, args.dim, workdir)
+            chroma_collection = collection_name = "bench"
+            where = None
+        else:
+            store = get_vectorstore(args.user)
+            chroma_collection = SHARD_COLLECTION
+            collection_name = safe_collection_name(args.user)
+            chroma_dir = store._persist_directory
+            where = tenant_filter(args.user)
+
+        data = store.get(where=where, include=["embeddings"])
+        full = compact_index._normalize(np.asarray(data["embeddings"], dtype=np.float32))
+        rng = np.random.default_rng(1)
+        picks = rng.integers(0, len(full), args.queries)
+        queries = compact_index._normalize(full[picks] + 0.05 * rng.normal(size=(args.queries, full.shape[1])))
+        truth = [set(np.argsort(-(full @ q))[:args.k]) for q in queries]
+        id_to_row = {doc_id: row for row, doc_id in enumerate(data["ids"])}
+        print(f"{len(full)} vectors x {full.shape[1]} dims, {args.queries} queries, k={args.k}")
+        print(f"{'path':<18} {'disk MB':>8} {'side MB':>8} {'anon MB':>8} {'mapped MB':>9} "
+              f"{'cold ms':>8} {'p50 ms':>8} {'p95 ms':>8} {'recall':>7}")
+        chroma_size = dir_size(chroma_dir)
+
+        # Current get_retriever path: Chroma similarity search on the query vector
+        before = memory_bytes()
+        start = time.perf_counter()
+        chroma = Chroma(collection_name=chroma_collection, persist_directory=chroma_dir)
+        chroma._collection.query(query_embeddings=[queries[0].tolist()], n_results=args.k, where=where)
+        cold = time.perf_counter() - start
+        latencies, recalls = [], []
+        for q, expected in zip(queries, truth):
+            start = time.perf_counter()
+            hits = chroma._collection.query(
+                query_embeddings=[q.tolist()], n_results=args.k, where=where, include=[]
+            )
+            latencies.append(time.perf_counter() - start)
+            recalls.append(len({id_to_row[i] for i in hits["ids"][0]} & expected) / args.k)
+        print(f"{'chroma':<18} {chroma_size / 1e6:8.1f} {0:8.1f} {memory_delta(before)} "
+              f"{cold * 1000:8.1f} {percentile(latencies, 50):8.2f} {percentile(latencies, 95):8.2f} "
+              f"{np.mean(recalls):7.3f}")
+
+        for mode in ("int8", "truncate"):
+            settings.COMPACT_INDEX_QUANTIZATION = mode
+            name = f"{collection_name}_{mode}"
+            compact_index.build_compact_index(
+                name, data["ids"], full, [""] * len(full), [{}] * len(full)
+            )
+            before = memory_bytes()
+            start = time.perf_counter()
+            index = compact_index.load_compact_index(name)
+            index.search(queries[0], args.k)
+            cold = time.perf_counter() - start
+            latencies, recalls = [], []
+            for q, expected in zip(queries, truth):
+                start = time.perf_counter()
+                hits = index.search(q, args.k)
+                latencies.append(time.perf_counter() - start)
+                recalls.append(len({row for row, _ in hits} & expected) / args.k)
+            side_size = dir_size(compact_index._index_dir(name))
+            print(f"{'compact/' + mode:<18} {(chroma_size + side_size) / 1e6:8.1f} {side_size / 1e6:8.1f} "
+                  f"{memory_delta(before)} {cold * 1000:8.1f} "
+                  f"{percentile(latencies, 50):8.2f} {percentile(latencies, 95):8.2f} {np.mean(recalls):7.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Flat vs. document-routed retrieval as a tenant's corpus grows.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_document_routing [--sizes 50 200 800]
+
+Builds throwaway Chroma collections of synthetic vectors: each document has a
+topic centre, its chunks and its summary sit near that centre, and each query
+is a perturbed chunk whose document is the expected answer source. Reports
+p50/p95 latency and answer-source precision (share of the k retrieved chunks
+that come from the expected document) for both paths.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.vectorstores import Chroma
+
+from app.services.document_router import route_by_vector, source_filter
+from app.services.shard_store import TENANT_KEY, tenant_filter
+
+TENANT = "bench@example.com"
+ADD_BATCH = 4000
+
+
+def unit(vectors):
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def add_vectors(store, ids, vectors, metadatas):
+    for start in range(0, len(ids), ADD_BATCH):
+        end = start + ADD_BATCH
+        store._collection.add(
+            ids=ids[start:end],
+            embeddings=vectors[start:end].tolist(),
+            documents=[""] * len(ids[start:end]),
+            metadatas=metadatas[start:end],
+        )
+
+
+def build_corpus(workdir, n_docs, chunks_per_doc, dim, rng):
+    centres = unit(rng.normal(size=(n_docs, dim)))
+    doc_of_chunk = np.repeat(np.arange(n_docs), chunks_per_doc)
+    chunk_vectors = unit(centres[doc_of_chunk] + 0.8 * unit(rng.normal(size=(len(doc_of_chunk), dim))))
+    summary_vectors = unit(centres + 0.3 * unit(rng.normal(size=(n_docs, dim))))
+
+    path = os.path.join(workdir, f"corpus_{n_docs}")
+    chunks = Chroma(collection_name="documents", persist_directory=path)
+    summaries = Chroma(collection_name="document_summaries", persist_directory=path)
+    add_vectors(
+        chunks,
+        [f"c{i}" for i in range(len(doc_of_chunk))],
+        chunk_vectors,
+        [{TENANT_KEY: TENANT, "source": f"doc{d}.pdf"} for d in doc_of_chunk],
+    )
+    add_vectors(
+        summaries,
+        [f"s{d}" for d in range(n_docs)],
+        summary_vectors,
+        [{TENANT_KEY: TENANT, "source": f"doc{d}.pdf"} for d in range(n_docs)],
+    )
+    return chunks, summaries, chunk_vectors, doc_of_chunk
+
+
+def measure(search, queries, expected):
+    latencies, precisions = [], []
+    for query, source in zip(queries, expected):
+        start = time.perf_counter()
+        docs = search(query)
+        latencies.append(time.perf_counter() - start)
+        precisions.append(sum(d.metadata["source"] == source for d in docs) / max(len(docs), 1))
+    ms = np.asarray(latencies) * 1000
+    return np.percentile(ms, 50), np.percentile(ms, 95), np.mean(precisions)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 800])
+    parser.add_argument("--chunks-per-doc", type=int, default=40)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("-k", type=int, default=15)
+    parser.add_argument("--top-docs", type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    workdir = tempfile.mkdtemp(prefix="bench_routing_")
+    print(f"{'docs':>6} {'chunks':>7} {'path':<7} {'p50 ms':>8} {'p95 ms':>8} {'precision':>9}")
+    try:
+        for n_docs in args.sizes:
+            chunks, summaries, chunk_vectors, doc_of_chunk = build_corpus(
+                workdir, n_docs, args.chunks_per_doc, args.dim, rng
+            )
+            picks = rng.integers(0, len(chunk_vectors), args.queries)
+            queries = unit(chunk_vectors[picks] + 0.3 * unit(rng.normal(size=(args.queries, args.dim))))
+            expected = [f"doc{doc_of_chunk[i]}.pdf" for i in picks]
+
+            def flat(query):
+                return chunks.similarity_search_by_vector(query.tolist(), k=args.k, filter=tenant_filter(TENANT))
+
+            def routed(query):
+                sources = route_by_vector(summaries, TENANT, query.tolist(), args.top_docs)
+                return chunks.similarity_search_by_vector(
+                    query.tolist(), k=args.k, filter=tenant_filter(TENANT, source_filter(sources))
+                )
+
+            for label, search in (("flat", flat), ("routed", routed)):
+                p50, p95, precision = measure(search, queries, expected)
+                print(f"{n_docs:>6} {len(chunk_vectors):>7} {label:<7} {p50:8.2f} {p95:8.2f} {precision:9.3f}")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+"""
+End-to-end load test: upload, process, chat, highlight-snippet and delete under concurrent users.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_load [--users 8] [--questions 5] [--corpus DIR] [--url URL]
+
+Without --url the app runs in-process (httpx ASGI transport) inside a scratch
+working directory with the fake LLM, embedding and sentence-encoder providers,
+so nothing calls OpenAI or touches the real data directories. Set
+FAKE_LLM_LATENCY_MS / FAKE_EMBEDDING_LATENCY_MS to model provider latency.
+With --url the script drives an already running server, configured however
+that server is. Without --corpus a few synthetic PDFs are generated with
+PyMuPDF. Each simulated user uploads the corpus, processes it, asks questions,
+highlights snippets and deletes its files; the report gives p50/p95/p99
+latency, failures and throughput per operation.
+"""
+import argparse
+import asyncio
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import fitz
+import httpx
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADMIN_EMAIL = "loadtest-admin@example.com"
+ADMIN_PASSWORD = "loadtest-password"
+OPERATIONS = ("upload", "process", "chat", "highlight", "delete")
+
+SECTIONS = ("Introduction", "Methods", "Results", "Discussion", "Conclusion")
+VOCABULARY = (
+    "latency throughput sensor network protocol sample cohort treatment dosage "
+    "reservoir turbine voltage catalyst enzyme membrane lattice spectrum signal "
+    "budget revenue margin supplier inventory warehouse freight contract tariff "
+    "river basin sediment rainfall drought harvest yield soil nitrogen erosion"
+).split()
+SENTENCE_RE = re.compile(r"[^.!?]{40,200}[.!?]")
+
+
+def synthetic_sentence(rng):
+    words = rng.sample(VOCABULARY, 9)
+    return f"The {words[0]} of the {words[1]} depends on {words[2]} and {words[3]} " \
+           f"when {words[4]} and {words[5]} change the {words[6]} {words[7]} {words[8]}."
+
+
+def build_synthetic_corpus(directory, n_docs, pages, seed=0):
+    rng = random.Random(seed)
+    paths = []
+    for d in range(n_docs):
+        doc = fitz.open()
+        for p in range(pages):
+            section = SECTIONS[p % len(SECTIONS)]
+            body = " ".join(synthetic_sentence(rng) for _ in range(12))
+            page = doc.new_page()
+            page.insert_textbox(fitz.Rect(50, 50, 545, 790), f"{section}\n{body}\n", fontsize=10)
+        path = os.path.join(directory, f"loadtest_doc{d}.pdf")
+        doc.save(path)
+        doc.close()
+        paths.append(path)
+    return paths
+
+
+def corpus_sentences(paths, limit=200):
+    sentences = []
+    for path in paths:
+        with fitz.open(path) as doc:
+            for page in doc:
+                text = " ".join(page.get_text().split())
+                sentences.extend(m.group(0).strip() for m in SENTENCE_RE.finditer(text))
+                if len(sentences) >= limit:
+                    return sentences
+    return sentences
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.failures = defaultdict(int)
+        self.rejected = defaultdict(int)
+
+    async def call(self, op, request):
+        start = time.perf_counter()
+        try:
+            response = await request
+        except httpx.HTTPError:
+            self.failures[op] += 1
+            return None
+        self.latencies[op].append(time.perf_counter() - start)
+        if response.status_code == 429:
+            self.rejected[op] += 1
+        elif response.status_code >= 400:
+            self.failures[op] += 1
+        return response
+
+    def report(self, wall):
+        print(f"{'operation':<10} {'count':>6} {'fail':>5} {'429':>5} "
+              f"{'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'ops/s':>8}")
+        for op in OPERATIONS:
+            samples = self.latencies.get(op)
+            if not samples:
+                continue
+            ms = np.asarray(samples) * 1000
+            p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+            print(f"{op:<10} {len(samples):>6} {self.failures[op]:>5} {self.rejected[op]:>5} "
+                  f"{p50:9.1f} {p95:9.1f} {p99:9.1f} {len(samples) / wall:8.2f}")
+        total = sum(len(v) for v in self.latencies.values())
+        print(f"\n{total} requests in {wall:.1f}s ({total / wall:.2f} req/s)")
+
+
+async def admin_token(client):
+    credentials = {"email": ADMIN_EMAIL, "password": ADMIN_PASSWORD}
+    response = await client.post("/api/auth/signup", json={**credentials, "role": "admin"})
+    if response.status_code == 400:  # already registered on this server
+        response = await client.post("/api/auth/login", json=credentials)
+    response.raise_for_status()
+    return response.json()["access_token"]
+
+
+async def simulate_user(client, recorder, user_index, corpus, sentences, args, token, rng):
+    user_id = f"loadtest{user_index}@example.com"
+    filenames = [f"u{user_index}_{os.path.basename(path)}" for path in corpus]
+
+    for path, filename in zip(corpus, filenames):
+        with open(path, "rb") as f:
+            content = f.read()
+        await recorder.call("upload", client.post(
+            "/api/v2/uploads/upload", files={"file": (filename, content, "application/pdf")}
+        ))
+
+    await recorder.call("process", client.post(
+        "/api/v2/documents/process", json={"user_id": user_id, "filenames": filenames}
+    ))
+
+    for _ in range(args.questions):
+        words = rng.choice(sentences).split()
+        question = f"What does the document say about {' '.join(words[1:6])}?"
+        response = await recorder.call("chat", client.post(
+            "/api/v2/chat/", json={"question": question, "user_id": user_id}
+        ))
+        sources = response.json().get("sources", []) if response is not None and response.is_success else []
+        snippet = sources[0]["snippet"] if sources else rng.choice(sentences)
+        filename = sources[0]["metadata"].get("source", filenames[0]) if sources else filenames[0]
+        await recorder.call("highlight", client.get(
+            "/api/highlight-snippet", params={"file": filename, "text": snippet}
+        ))
+
+    for filename in filenames:
+        await recorder.call("delete", client.delete(
+            f"/api/v2/documents/delete/{filename}",
+            params={"user_id": user_id},
+            headers={"Authorization": f"Bearer {token}"},
+        ))
+
+
+async def run(args, corpus, sentences, client):
+    recorder = Recorder()
+    token = await admin_token(client)
+    rng = random.Random(args.seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        simulate_user(client, recorder, i, corpus, sentences, args, token, random.Random(rng.random()))
+        for i in range(args.users)
+    ))
+    recorder.report(time.perf_counter() - start)
+
+
+def in_process_client(workdir):
+    """Import the app inside a scratch cwd with offline providers (settings read env at import)."""
+    for name, value in (("LLM_PROVIDER", "fake"), ("EMBEDDING_PROVIDER", "fake"),
+                        ("SENTENCE_ENCODER_PROVIDER", "fake"), ("LOG_LEVEL", "WARNING")):
+        os.environ.setdefault(name, value)
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    from app.main import app
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadtest", timeout=None)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--users", type=int, default=8, help="concurrent simulated users")
+    parser.add_argument("--questions", type=int, default=5, help="chat + highlight rounds per user")
+    parser.add_argument("--corpus", help="directory of fixture PDFs (default: synthetic)")
+    parser.add_argument("--docs", type=int, default=3, help="synthetic documents per user")
+    parser.add_argument("--pages", type=int, default=5, help="pages per synthetic document")
+    parser.add_argument("--url", help="drive a running server instead of an in-process app")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="bench_load_")
+    try:
+        if args.corpus:
+            corpus = sorted(
+                os.path.join(args.corpus, name) for name in os.listdir(args.corpus)
+                if name.lower().endswith(".pdf")
+            )
+        else:
+            os.makedirs(os.path.join(workdir, "corpus"))
+            corpus = build_synthetic_corpus(os.path.join(workdir, "corpus"), args.docs, args.pages, args.seed)
+        sentences = corpus_sentences(corpus)
+        if not corpus or not sentences:
+            parser.error("corpus has no PDFs with extractable text")
+
+        if args.url:
+            client = httpx.AsyncClient(base_url=args.url, timeout=None)
+        else:
+            client = in_process_client(workdir)
+        print(f"{args.users} users x {len(corpus)} PDFs, {args.questions} questions each "
+              f"({'server ' + args.url if args.url else 'in-process, fake providers'})\n")
+
+        async def session():
+            async with client:
+                await run(args, corpus, sentences, client)
+
+        asyncio.run(session())
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
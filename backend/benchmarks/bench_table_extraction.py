@@ -0,0 +1,81 @@
+"""
+Table extraction throughput: full-document camelot vs. pre-pass + per-page pool.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_table_extraction [corpus_dir]
+
+The corpus defaults to the fixture PDFs (fixtures/pdfs/, one of which has a
+ruled table); point it at uploaded_files/ or a mix of text-only and
+table-heavy PDFs to get a representative number. The table cache is bypassed so every run does the
+real work.
+"""
+import argparse
+import os
+import time
+
+import camelot
+import fitz
+
+from app.services.table_service import extract_tables_from_pdf, find_table_candidate_pages, shutdown_table_pool
+
+FIXTURE_PDFS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "fixtures", "pdfs")
+
+
+def legacy_extract(path):
+    try:
+        return len(camelot.read_pdf(path, pages="all", strip_text="\n"))
+    except Exception:
+        return 0
+
+
+def prepass_extract(path):
+    return len(extract_tables_from_pdf(path, os.path.basename(path), use_cache=False))
+
+
+def run(label, fn, pdfs, total_pages):
+    start = time.perf_counter()
+    found = sum(fn(path) for path in pdfs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<22} {elapsed:8.2f}s  {total_pages / elapsed:8.2f} pages/s  ({found} tables/chunks)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("corpus", nargs="?", default=FIXTURE_PDFS)
+    parser.add_argument("--skip-legacy", action="store_true", help="only time the new pipeline")
+    args = parser.parse_args()
+
+    pdfs = sorted(
+        os.path.join(args.corpus, name)
+        for name in os.listdir(args.corpus)
+        if name.lower().endswith(".pdf")
+    )
+    if not pdfs:
+        raise SystemExit(f"No PDFs found in {args.corpus}")
+
+    total_pages = 0
+    candidate_pages = 0
+    for path in pdfs:
+        with fitz.open(path) as doc:
+            total_pages += doc.page_count
+        table_pages, scanned_pages = find_table_candidate_pages(path)
+        candidate_pages += len(table_pages) + len(scanned_pages)
+
+    print(f"Corpus: {len(pdfs)} PDFs, {total_pages} pages, {candidate_pages} candidate pages")
+    start = time.perf_counter()
+    for path in pdfs:
+        find_table_candidate_pages(path)
+    prepass = time.perf_counter() - start
+    print(f"{'pre-pass only':<22} {prepass:8.2f}s  {total_pages / prepass:8.2f} pages/s")
+
+    if not args.skip_legacy:
+        run("camelot pages='all'", legacy_extract, pdfs, total_pages)
+    try:
+        run("pre-pass + pool", prepass_extract, pdfs, total_pages)
+    finally:
+        shutdown_table_pool()
+
+
+if __name__ == "__main__":
+    main()
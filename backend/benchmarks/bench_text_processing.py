@@ -0,0 +1,162 @@
+"""
+Per-line cost of the viewer's text normalization and snippet matching, before and after.
+
+Run from the backend directory:
+
+    python -m benchmarks.bench_text_processing [--pdf some.pdf] [--lines 5000]
+
+"Before" is the original viewer code kept here verbatim (six regex
+substitutions per string, nltk.data.find on every long snippet, every page
+line re-normalized for every snippet sentence); "after" is
+app.services.text_processing. Lines come from the PDF's pages when --pdf is
+given, else synthetic mixed ASCII / accented text. Both versions are checked
+to return identical results before timings are reported.
+"""
+import argparse
+import random
+import re
+import time
+import unicodedata
+from difflib import SequenceMatcher
+
+import nltk
+
+from app.services.text_processing import (
+    best_fuzzy_match,
+    cached_page_lines,
+    normalize_lines,
+    normalize_text,
+    sent_tokenize,
+)
+
+WORDS = (
+    "the results show that latency drops when the cache is warm; however, "
+    "résumé naïve café « quoted » “smart” ’apostrophe’ ## Methods 42 (table 3) - "
+    "throughput, p95 and p99 were measured across 12 tenants."
+).split()
+
+
+def legacy_normalize_text(text: str) -> str:
+    text = text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = re.sub(r'#+\s*', '', text)
+    text = re.sub(r'[“”"\'«»’]', '"', text)
+    text = re.sub(r'[^a-z0-9\s.,;:!?()\"-]', "", text)
+    text = re.sub(r'\s+', " ", text)
+    text = re.sub(r'\n+', " ", text)
+    return text.strip()
+
+
+def legacy_find_best_match(text, sentences, threshold=0.7):
+    text_norm = legacy_normalize_text(text)
+    best_score = 0
+    best_sentence = None
+    if len(text_norm) > 100:
+        try:
+            nltk.data.find('tokenizers/punkt')
+        except LookupError:
+            nltk.download('punkt')
+        for sentence in nltk.sent_tokenize(text):
+            sentence_norm = legacy_normalize_text(sentence)
+            for s in sentences:
+                score = SequenceMatcher(None, sentence_norm, legacy_normalize_text(s)).ratio()
+                if score > best_score and score >= threshold:
+                    best_score = score
+                    best_sentence = s
+    else:
+        for s in sentences:
+            score = SequenceMatcher(None, text_norm, legacy_normalize_text(s)).ratio()
+            if score > best_score and score >= threshold:
+                best_score = score
+                best_sentence = s
+    return best_sentence, best_score
+
+
+def new_find_best_match(text, lines, threshold=0.7):
+    text_norm = normalize_text(text)
+    if len(text_norm) > 100:
+        queries = [normalize_text(sentence) for sentence in sent_tokenize(text)]
+    else:
+        queries = [text_norm]
+    return best_fuzzy_match(queries, lines, threshold)
+
+
+def load_pages(args, rng):
+    if args.pdf:
+        import fitz
+
+        from app.api.viewer import page_lines
+        with fitz.open(args.pdf) as doc:
+            return [page_lines(page) for page in doc]
+    pages, remaining = [], args.lines
+    while remaining > 0:
+        count = min(50, remaining)
+        pages.append([" ".join(rng.choice(WORDS) for _ in range(rng.randint(3, 14))) for _ in range(count)])
+        remaining -= count
+    return pages
+
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--pdf", help="take page lines from this PDF")
+    parser.add_argument("--lines", type=int, default=5000, help="synthetic lines (without --pdf)")
+    parser.add_argument("--snippets", type=int, default=20)
+    parser.add_argument("--threshold", type=float, default=0.7)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    pages = load_pages(args, rng)
+    lines = [line for page in pages for line in page]
+    if not lines:
+        parser.error("no text lines found")
+    # Snippets as the chat UI sends them: a source's first sentence, short or long
+    snippets = [" ".join(rng.sample(lines, rng.choice([1, 3]))) for _ in range(args.snippets)]
+
+    old_t, old_norm = timed(lambda: [legacy_normalize_text(line) for line in lines])
+    new_t, new_norm = timed(lambda: [normalize_text(line) for line in lines])
+    assert old_norm == new_norm, "normalize_text output differs from the original"
+    print(f"normalize_text      {len(lines)} lines: "
+          f"{old_t / len(lines) * 1e6:7.2f} us/line -> {new_t / len(lines) * 1e6:7.2f} us/line "
+          f"({old_t / new_t:.1f}x)")
+
+    old_t, old_sents = timed(lambda: [nltk.sent_tokenize(s) for s in snippets])
+    new_t, new_sents = timed(lambda: [sent_tokenize(s) for s in snippets])
+    assert old_sents == new_sents, "sent_tokenize output differs"
+    print(f"sent_tokenize       {len(snippets)} snippets: "
+          f"{old_t / len(snippets) * 1e6:7.1f} us -> {new_t / len(snippets) * 1e6:7.1f} us")
+
+    def legacy_highlight():
+        return [[legacy_find_best_match(s, page, args.threshold) for page in pages] for s in snippets]
+
+    def new_highlight(cached):
+        results = []
+        for s in snippets:
+            row = []
+            for i, page in enumerate(pages):
+                page_norm = cached_page_lines(("bench", i), lambda: page) if cached else normalize_lines(page)
+                row.append(new_find_best_match(s, page_norm, args.threshold))
+            results.append(row)
+        return results
+
+    per = len(snippets) * len(lines)
+    old_t, old_match = timed(legacy_highlight, repeat=1)
+    new_t, new_match = timed(lambda: new_highlight(False), repeat=1)
+    cached_t, cached_match = timed(lambda: new_highlight(True), repeat=1)
+    assert old_match == new_match == cached_match, "match results differ from the original"
+    print(f"snippet matching    {len(snippets)} snippets x {len(lines)} lines: "
+          f"{old_t / per * 1e6:7.2f} us/line -> {new_t / per * 1e6:7.2f} us/line "
+          f"({old_t / new_t:.1f}x), with memoized page lines {cached_t / per * 1e6:7.2f} us/line "
+          f"({old_t / cached_t:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Create routing summaries for documents ingested before two-stage retrieval.
+
+Run from the backend directory:
+
+    python -m scripts.backfill_document_summaries [--user someone@example.com]
+
+Summaries are rebuilt from the chunks already in the vector store (section
+titles plus the text of the first pages), so the original PDFs are not needed.
+Documents that already have a summary are skipped.
+"""
+import argparse
+from collections import defaultdict
+
+from app.services.document_router import build_document_summary, summary_id, upsert_document_summary
+from app.services.metadata_store import load_metadata
+from app.services.shard_store import tenant_filter
+from app.services.user_store import load_users
+from app.services.vectorstore_service import get_summary_store, get_vectorstore, shards
+
+LEADING_PAGES = 3
+
+
+def backfill_tenant(user_id: str) -> int:
+    chunks = get_vectorstore(user_id).get(where=tenant_filter(user_id), include=["documents", "metadatas"])
+    by_source = defaultdict(list)
+    for content, meta in zip(chunks["documents"], chunks["metadatas"]):
+        if meta.get("source"):
+            by_source[meta["source"]].append((meta, content))
+
+    summaries = get_summary_store(user_id)
+    existing = set(summaries.get(where=tenant_filter(user_id), include=[])["ids"])
+    created = 0
+    for filename, items in sorted(by_source.items()):
+        if summary_id(user_id, filename) in existing:
+            continue
+        text_items = sorted(
+            (item for item in items if item[0].get("type") not in ("table", "ocr_table")),
+            key=lambda item: item[0].get("page", 0),
+        )
+        titles = [meta["section"] for meta, _ in text_items if meta.get("section")]
+        pages = [content for meta, content in text_items if meta.get("page", 0) < LEADING_PAGES]
+        with shards.write_lock(user_id):
+            upsert_document_summary(
+                get_summary_store(user_id), user_id, filename, build_document_summary(filename, titles, pages), len(items)
+            )
+        created += 1
+    return created
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--user", help="only backfill this tenant")
+    args = parser.parse_args()
+
+    if args.user:
+        tenants = [args.user]
+    else:
+        tenants = set(load_users())
+        tenants.update(entry["user_id"] for entry in load_metadata())
+        tenants = sorted(tenants)
+
+    for user_id in tenants:
+        print(f"{user_id}: {backfill_tenant(user_id)} summaries created")
+
+
+if __name__ == "__main__":
+    main()
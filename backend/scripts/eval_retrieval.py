@@ -0,0 +1,196 @@
+"""
+Offline retrieval evaluation over a golden question set.
+
+Run from the backend directory:
+
+    python -m scripts.eval_retrieval [--corpus fixtures/pdfs] [--golden fixtures/golden.json]
+        [--modes flat routed compact] [--k 6 15] [--embedder fake|huggingface] [--output report.json]
+
+Without --corpus/--golden it runs on the small committed fixture corpus (five
+two-page PDFs with keyword sections) and its golden set. The default fake
+embedder (hashed bag of words) runs fully offline, e.g. as a smoke test of the
+retrieval paths; pass `--embedder huggingface` for real quality numbers (it
+downloads EMBEDDING_MODEL on first use).
+
+The corpus is indexed into a scratch working directory through the real
+process_documents_for_user path (section splitting, tables, summaries), using
+a local embedder, so nothing is sent to OpenAI and the real stores are not
+touched. The golden set is a JSON list of
+
+    {"question": "...", "source": "report.pdf", "page": 3, "section": "Results"}
+
+where page (1-based, as shown in a PDF viewer) and section are optional. A
+retrieved chunk is relevant when it matches every field given. For each
+retriever configuration (mode x k) the report gives recall@k (share of
+questions with a relevant chunk in the top k), source recall@k (right
+document, any page), MRR, mean context tokens handed to the LLM and
+retrieval latency split into the embed stage and the rest (search/routing).
+"""
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+EVAL_USER = "eval@example.com"
+FIXTURES_DIR = os.path.join(BACKEND_DIR, "fixtures")
+TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    # Word/punctuation pieces: close enough to BPE counts for comparing configs
+    return len(TOKEN_RE.findall(text))
+
+
+def page_number(metadata) -> int:
+    """1-based page of a chunk; chunk metadata pages are 0-based for every chunk type."""
+    page = metadata.get("page")
+    if page is None:
+        return None
+    return int(page) + 1
+
+
+def is_relevant(metadata, expected) -> bool:
+    if metadata.get("source") != expected["source"]:
+        return False
+    if expected.get("page") is not None and page_number(metadata) != int(expected["page"]):
+        return False
+    if expected.get("section") and metadata.get("section") != expected["section"].strip().title():
+        return False
+    return True
+
+
+def configure_environment(workdir, embedder):
+    """Point every store at the scratch dir and pick a local embedder before app modules import settings."""
+    os.environ["EMBEDDING_PROVIDER"] = embedder
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+
+
+def index_corpus(pdfs):
+    from app.services.metrics import STAGE_LATENCY
+    from app.services.vectorstore_service import process_documents_for_user
+
+    start = time.perf_counter()
+    chunks = process_documents_for_user(pdfs, EVAL_USER)
+    elapsed = time.perf_counter() - start
+    print(f"Indexed {len(pdfs)} PDFs into {chunks} chunks in {elapsed:.1f}s")
+    for name in ("parse", "camelot", "ocr", "embed", "upsert"):
+        count, total = STAGE_LATENCY.totals(stage=name)
+        if count:
+            print(f"  {name:<8} {total * 1000:9.1f} ms over {count} calls")
+    return chunks
+
+
+def retriever_for(mode, k):
+    from app.core.config import settings
+    from app.services.vectorstore_service import get_retriever
+
+    settings.VECTOR_INDEX_MODE = "compact" if mode == "compact" else "chroma"
+    if mode == "routed":
+        # Route regardless of corpus size so small fixture corpora still exercise it
+        settings.DOCUMENT_ROUTING = True
+        settings.ROUTING_MIN_DOCUMENTS = 1
+    return get_retriever(EVAL_USER, search_kwargs={"k": k}, route=mode == "routed")
+
+
+def evaluate(mode, k, golden):
+    from app.services.metrics import STAGE_LATENCY
+
+    retriever = retriever_for(mode, k)
+    if retriever is None:
+        raise RuntimeError(f"No retriever for mode {mode}")
+
+    hits, source_hits, reciprocal_ranks, tokens, latencies = [], [], [], [], []
+    embed_count, embed_before = STAGE_LATENCY.totals(stage="embed")
+    for item in golden:
+        start = time.perf_counter()
+        docs = retriever.invoke(item["question"])
+        latencies.append(time.perf_counter() - start)
+
+        rank = next((i + 1 for i, d in enumerate(docs) if is_relevant(d.metadata, item)), None)
+        hits.append(rank is not None)
+        source_hits.append(any(d.metadata.get("source") == item["source"] for d in docs))
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+        tokens.append(sum(count_tokens(d.page_content) for d in docs))
+    _, embed_after = STAGE_LATENCY.totals(stage="embed")
+
+    ms = np.asarray(latencies) * 1000
+    embed_ms = (embed_after - embed_before) * 1000 / len(golden)
+    return {
+        "mode": mode,
+        "k": k,
+        "recall": float(np.mean(hits)),
+        "source_recall": float(np.mean(source_hits)),
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "context_tokens": float(np.mean(tokens)),
+        "latency_ms_p50": float(np.percentile(ms, 50)),
+        "latency_ms_p95": float(np.percentile(ms, 95)),
+        "embed_ms_mean": embed_ms,
+        "search_ms_mean": float(ms.mean()) - embed_ms,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--corpus", default=os.path.join(FIXTURES_DIR, "pdfs"), help="directory of fixture PDFs")
+    parser.add_argument("--golden", default=os.path.join(FIXTURES_DIR, "golden.json"),
+                        help="golden question set (JSON list)")
+    parser.add_argument("--modes", nargs="+", default=["flat", "routed"], choices=["flat", "routed", "compact"])
+    parser.add_argument("--k", type=int, nargs="+", default=[6, 15])
+    parser.add_argument("--embedder", default="fake", choices=["fake", "huggingface"],
+                        help="fake (offline, default) or huggingface (downloads the model; real quality)")
+    parser.add_argument("--output", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    corpus_dir = os.path.abspath(args.corpus)
+    pdfs = sorted(os.path.join(corpus_dir, n) for n in os.listdir(corpus_dir) if n.lower().endswith(".pdf"))
+    with open(args.golden, "r", encoding="utf-8") as f:
+        golden = json.load(f)
+    if not pdfs or not golden:
+        parser.error("need at least one PDF and one golden question")
+    output = os.path.abspath(args.output) if args.output else None
+
+    workdir = tempfile.mkdtemp(prefix="eval_retrieval_")
+    try:
+        configure_environment(workdir, args.embedder)
+        if not index_corpus(pdfs):
+            sys.exit("Nothing was indexed")
+        if "compact" in args.modes:
+            from app.services.compact_index import build_compact_index_from_store
+            from app.services.shard_store import tenant_filter
+            from app.services.vectorstore_service import get_vectorstore, safe_collection_name
+            build_compact_index_from_store(
+                safe_collection_name(EVAL_USER), get_vectorstore(EVAL_USER), where=tenant_filter(EVAL_USER)
+            )
+
+        results = []
+        print(f"\n{len(golden)} questions, embedder={args.embedder}\n")
+        print(f"{'mode':<8} {'k':>3} {'recall':>7} {'src rec':>7} {'MRR':>6} {'ctx tok':>8} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'embed':>7} {'search':>7}")
+        for mode in args.modes:
+            for k in args.k:
+                r = evaluate(mode, k, golden)
+                results.append(r)
+                print(f"{mode:<8} {k:>3} {r['recall']:7.3f} {r['source_recall']:7.3f} {r['mrr']:6.3f} "
+                      f"{r['context_tokens']:8.0f} {r['latency_ms_p50']:8.1f} {r['latency_ms_p95']:8.1f} "
+                      f"{r['embed_ms_mean']:7.1f} {r['search_ms_mean']:7.1f}")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"embedder": args.embedder, "questions": len(golden), "results": results}, f, indent=2)
+        print(f"\nWrote {output}")
+
+
+if __name__ == "__main__":
+    main()
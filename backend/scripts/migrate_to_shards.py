@@ -0,0 +1,114 @@
+"""
+Move legacy per-user Chroma directories (chroma_store/<safe user id>/) into the
+tenant-sharded layout (chroma_store/shard_NN/), reusing the stored embeddings.
+
+Run from the backend directory:
+
+    python -m scripts.migrate_to_shards [--dry-run] [--remove-legacy]
+
+Chunks are upserted by their original ids, so the migration can be re-run
+safely after an interruption. Legacy directories are left in place unless
+--remove-legacy is given, and are only removed once the shard holds every chunk.
+"""
+import argparse
+import os
+import shutil
+
+from langchain_community.vectorstores import Chroma
+
+from app.core.config import settings
+from app.services.metadata_store import load_metadata
+from app.services.shard_store import TENANT_KEY, shard_dir, shard_for_tenant, tenant_filter
+from app.services.user_store import load_users
+from app.services.vectorstore_service import safe_collection_name, shards
+
+BATCH_SIZE = 1000
+
+
+def known_tenants() -> dict:
+    """safe collection name -> user id, from every place user ids are recorded."""
+    user_ids = set(load_users())
+    user_ids.update(entry["user_id"] for entry in load_metadata())
+    return {safe_collection_name(user_id): user_id for user_id in user_ids}
+
+
+def guess_user_id(dirname: str) -> str:
+    return dirname.replace("_at_", "@").replace("_dot_", ".")
+
+
+def legacy_dirs():
+    if not os.path.isdir(settings.CHROMA_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(settings.CHROMA_DIR)
+        if not name.startswith("shard_")
+        and os.path.isfile(os.path.join(settings.CHROMA_DIR, name, "chroma.sqlite3"))
+    )
+
+
+def migrate_tenant(dirname: str, user_id: str, dry_run: bool) -> bool:
+    path = os.path.join(settings.CHROMA_DIR, dirname)
+    legacy = Chroma(collection_name=dirname, persist_directory=path)
+    data = legacy.get(include=["embeddings", "documents", "metadatas"])
+    count = len(data["ids"])
+    target = shard_dir(shard_for_tenant(user_id))
+    print(f"{dirname}: {count} chunks -> {target} as tenant {user_id!r}")
+    if dry_run or not count:
+        return True
+
+    with shards.write_lock(user_id):
+        store = shards.for_tenant(user_id)
+        for start in range(0, count, BATCH_SIZE):
+            end = start + BATCH_SIZE
+            store._collection.upsert(
+                ids=data["ids"][start:end],
+                embeddings=[list(map(float, e)) for e in data["embeddings"][start:end]],
+                documents=data["documents"][start:end],
+                # Older text chunks carry no "type"; stamp it so type-scoped queries match them
+                metadatas=[{"type": "text", **(m or {}), TENANT_KEY: user_id} for m in data["metadatas"][start:end]],
+            )
+
+    migrated = store.get(where=tenant_filter(user_id), include=[])["ids"]
+    missing = set(data["ids"]) - set(migrated)
+    if missing:
+        print(f"  !! {len(missing)} chunks missing from shard after migration")
+        return False
+    print(f"  ok ({len(migrated)} chunks for tenant in shard)")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--dry-run", action="store_true", help="report what would move")
+    parser.add_argument("--remove-legacy", action="store_true", help="delete migrated legacy directories")
+    args = parser.parse_args()
+
+    tenants = known_tenants()
+    dirs = legacy_dirs()
+    if not dirs:
+        print(f"No legacy per-user stores found in {settings.CHROMA_DIR}")
+        return
+
+    failures = 0
+    for dirname in dirs:
+        user_id = tenants.get(dirname)
+        if user_id is None:
+            user_id = guess_user_id(dirname)
+            print(f"{dirname}: not a known user, assuming {user_id!r}")
+        try:
+            ok = migrate_tenant(dirname, user_id, args.dry_run)
+        except Exception as e:
+            print(f"{dirname}: migration failed: {e}")
+            ok = False
+        if not ok:
+            failures += 1
+        elif args.remove_legacy and not args.dry_run:
+            shutil.rmtree(os.path.join(settings.CHROMA_DIR, dirname))
+            print(f"  removed legacy directory {dirname}")
+
+    if failures:
+        raise SystemExit(f"{failures} tenant(s) failed to migrate")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,213 @@
+"""
+Multi-process stress check for the shared JSON stores and shard writes.
+
+Run from the backend directory:
+
+    python -m scripts.stress_shared_state [--workers 8] [--rounds 50] [--chroma] [--timeout 300]
+
+Spawns worker processes in a scratch directory that race through the same
+store calls the API makes under several uvicorn/gunicorn workers: signing up
+users (plus everyone registering one shared email), claiming and processing a
+common set of files, and uploading, recording, then deleting half of their own
+files through the real delete endpoint code (chunk deletion under the shard
+write lock, metadata removal, file removal). All workers' files live in one
+vector shard (fake embeddings). Afterwards it checks that no update was lost:
+every user exists, the shared email was taken exactly once, each shared file
+was claimed and recorded exactly once, and exactly the non-deleted files
+remain in the metadata, on disk and in the shard. --chroma also has every
+worker add extra chunk batches to the shard and checks the final count.
+Exits non-zero when any check fails, a worker crashes, or --timeout expires.
+"""
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SHARED_EMAIL = "shared@example.com"
+CHROMA_TENANT = "stress@example.com"
+
+
+def add_chunks(filename, texts):
+    from langchain.docstore.document import Document
+    from app.services.shard_store import TENANT_KEY
+    from app.services.vectorstore_service import get_vectorstore, shards
+
+    docs = [
+        Document(page_content=text, metadata={TENANT_KEY: CHROMA_TENANT, "source": filename})
+        for text in texts
+    ]
+    with shards.session(), shards.write_lock(CHROMA_TENANT):
+        get_vectorstore(CHROMA_TENANT).add_documents(docs)
+
+
+def worker(index, args, barrier, results):
+    sys.path.insert(0, BACKEND_DIR)
+    from app.api.delete import UPLOAD_DIR, _delete_document
+    from app.services.metadata_store import claim_file, mark_as_processed, release_file
+    from app.services.user_store import add_user
+
+    rng = random.Random(index)
+    barrier.wait()
+    counts = {"shared_signup": 0, "claims": []}
+
+    if add_user(SHARED_EMAIL, {"email": SHARED_EMAIL, "worker": index}):
+        counts["shared_signup"] += 1
+
+    shared_files = [f"shared_{i}.pdf" for i in range(args.rounds)]
+    rng.shuffle(shared_files)
+    for i in range(args.rounds):
+        add_user(f"w{index}-u{i}@example.com", {"email": f"w{index}-u{i}@example.com", "worker": index})
+
+        filename = shared_files[i]
+        if claim_file("shared-tenant", filename):
+            try:
+                time.sleep(rng.uniform(0, 0.002))  # stands in for ingestion work
+                mark_as_processed("shared-tenant", filename, 1)
+                counts["claims"].append(filename)
+            finally:
+                release_file("shared-tenant", filename)
+
+        # Upload, ingest and (for odd rounds) delete one of the worker's own files; all
+        # workers' files share the tenant, so deletes race other workers' writes to the shard
+        own = f"w{index}_{i}.pdf"
+        with open(os.path.join(UPLOAD_DIR, f"{CHROMA_TENANT}__{own}"), "wb") as f:
+            f.write(b"%PDF-1.4 stress")
+        add_chunks(own, [f"{own} chunk {j}" for j in range(2)])
+        mark_as_processed(CHROMA_TENANT, own, 2)
+        if i % 2:
+            _delete_document(own, CHROMA_TENANT)
+
+    if args.chroma:
+        for i in range(args.chroma_batches):
+            add_chunks(f"w{index}.pdf", [f"worker {index} batch {i} chunk {j}" for j in range(10)])
+
+    results.put((index, counts))
+
+
+def chroma_sources():
+    from collections import Counter
+    from app.services.shard_store import tenant_filter
+    from app.services.vectorstore_service import get_vectorstore
+
+    metadatas = get_vectorstore(CHROMA_TENANT).get(where=tenant_filter(CHROMA_TENANT), include=["metadatas"])["metadatas"]
+    return Counter(meta.get("source") for meta in metadatas)
+
+
+def check(args, counts):
+    from app.services.metadata_store import load_metadata
+    from app.services.user_store import load_users
+
+    failures = []
+    users = load_users()
+    missing = [
+        f"w{w}-u{i}@example.com" for w in range(args.workers) for i in range(args.rounds)
+        if f"w{w}-u{i}@example.com" not in users
+    ]
+    if missing:
+        failures.append(f"{len(missing)} signups lost (e.g. {missing[0]})")
+    shared_signups = sum(c["shared_signup"] for c in counts.values())
+    if shared_signups != 1:
+        failures.append(f"shared email registered {shared_signups} times")
+
+    claims = [f for c in counts.values() for f in c["claims"]]
+    if len(claims) != len(set(claims)):
+        failures.append(f"{len(claims) - len(set(claims))} files were claimed by more than one worker")
+    if len(set(claims)) != args.rounds:
+        failures.append(f"{args.rounds - len(set(claims))} shared files were never processed")
+
+    metadata = load_metadata()
+    shared_entries = [m for m in metadata if m["user_id"] == "shared-tenant"]
+    if len(shared_entries) != args.rounds:
+        failures.append(f"{len(shared_entries)} shared metadata entries, expected {args.rounds}")
+    kept = {m["filename"] for m in metadata if m["user_id"] == CHROMA_TENANT}
+    on_disk = {
+        name.split("__", 1)[1] for name in os.listdir("uploaded_files") if name.startswith(f"{CHROMA_TENANT}__")
+    }
+    sources = chroma_sources()
+    for w in range(args.workers):
+        expected = {f"w{w}_{i}.pdf" for i in range(args.rounds) if not i % 2}
+        own = {f"w{w}_{i}.pdf" for i in range(args.rounds)}
+        if kept & own != expected:
+            failures.append(f"worker{w}: {len((kept & own) ^ expected)} metadata entries wrong after deletes")
+        if on_disk & own != expected:
+            failures.append(f"worker{w}: {len((on_disk & own) ^ expected)} uploaded files wrong after deletes")
+        wrong = [name for name in own if sources.get(name, 0) != (2 if name in expected else 0)]
+        if wrong:
+            failures.append(f"worker{w}: chunks wrong for {len(wrong)} files after deletes (e.g. {wrong[0]})")
+
+    if args.chroma:
+        expected_chunks = args.workers * args.chroma_batches * 10
+        found = sum(sources.get(f"w{w}.pdf", 0) for w in range(args.workers))
+        if found != expected_chunks:
+            failures.append(f"vector shard holds {found} batch chunks, expected {expected_chunks}")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rounds", type=int, default=50)
+    parser.add_argument("--chroma", action="store_true", help="also race extra chunk batches into the vector shard")
+    parser.add_argument("--chroma-batches", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds to wait for the workers")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="stress_shared_state_")
+    os.environ["EMBEDDING_PROVIDER"] = "fake"
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    sys.path.insert(0, BACKEND_DIR)
+    os.chdir(workdir)
+    os.makedirs("uploaded_files")
+    failures = []
+    try:
+        # spawn, not fork: each worker opens its own files and Chroma clients like a real server process
+        ctx = multiprocessing.get_context("spawn")
+        barrier = ctx.Barrier(args.workers)
+        results = ctx.Queue()
+        processes = [ctx.Process(target=worker, args=(i, args, barrier, results)) for i in range(args.workers)]
+        start = time.perf_counter()
+        for p in processes:
+            p.start()
+        deadline = start + args.timeout
+        counts = {}
+        while len(counts) < len(processes):
+            try:
+                index, worker_counts = results.get(timeout=1)
+                counts[index] = worker_counts
+                continue
+            except queue.Empty:
+                pass
+            # A crashed worker never reports; stop waiting once it has exited or time is up
+            if time.perf_counter() > deadline or not any(p.is_alive() for p in processes):
+                failures.append(f"only {len(counts)} of {len(processes)} workers reported")
+                break
+        for p in processes:
+            p.join(timeout=max(deadline - time.perf_counter(), 1))
+            if p.is_alive():
+                p.terminate()
+                p.join()
+            if p.exitcode != 0:
+                failures.append(f"worker process {p.pid} exited with code {p.exitcode}")
+        elapsed = time.perf_counter() - start
+
+        if not failures:
+            failures = check(args, counts)
+        print(f"{args.workers} workers x {args.rounds} rounds in {elapsed:.1f}s")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        if not failures:
+            print("OK: no lost or duplicated updates")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+Export a tenant's index to a snapshot archive, or import one, without re-embedding.
+
+Run from the backend directory:
+
+    python -m scripts.tenant_snapshot export alice@example.com -o alice.tar.gz [--no-files]
+    python -m scripts.tenant_snapshot import alice.tar.gz [--as bob@example.com] [--replace]
+    python -m scripts.tenant_snapshot verify alice.tar.gz
+
+The archive holds the tenant's chunks with their stored embeddings, routing
+summaries, processing metadata and uploaded files, plus a manifest of sha256
+hashes that import (and verify) check before anything is written. "-" reads
+or writes stdin/stdout, so a tenant can be piped straight to another node:
+
+    python -m scripts.tenant_snapshot export alice@example.com -o - | ssh node2 \\
+        "cd backend && python -m scripts.tenant_snapshot import -"
+
+The importing node must embed queries with the same provider and model.
+"""
+import argparse
+import json
+import sys
+
+from app.core.config import settings
+from app.services.snapshot_service import export_tenant, import_tenant, verify_snapshot
+
+
+def open_input(path: str):
+    return sys.stdin.buffer if path == "-" else open(path, "rb")
+
+
+def run_export(args):
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        manifest = export_tenant(args.user_id, out, include_files=not args.no_files)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(
+        f"{args.user_id}: {manifest['chunks']} chunks, {manifest['summaries']} summaries, "
+        f"{len(manifest['files'])} files -> {args.output}",
+        file=sys.stderr,
+    )
+
+
+def run_import(args):
+    with open_input(args.archive) as f:
+        result = import_tenant(f, user_id=args.as_user, replace=args.replace)
+    print(json.dumps(result, indent=2))
+
+
+def run_verify(args):
+    with open_input(args.archive) as f:
+        manifest = verify_snapshot(f)
+    print(f"ok: tenant {manifest['tenant']!r}, {manifest['chunks']} chunks, {len(manifest['files'])} files, "
+          f"all {len(manifest['members'])} members match the manifest")
+    embedding = manifest["embedding"]
+    if (embedding["provider"], embedding["model"]) != (settings.EMBEDDING_PROVIDER, settings.EMBEDDING_MODEL):
+        print(f"warning: vectors come from {embedding['provider']}/{embedding['model']}, this node uses "
+              f"{settings.EMBEDDING_PROVIDER}/{settings.EMBEDDING_MODEL}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="write a tenant snapshot")
+    export.add_argument("user_id")
+    export.add_argument("-o", "--output", required=True, help="archive path, or - for stdout")
+    export.add_argument("--no-files", action="store_true", help="leave the uploaded files out")
+    export.set_defaults(run=run_export)
+
+    restore = commands.add_parser("import", help="restore a tenant snapshot")
+    restore.add_argument("archive", help="archive path, or - for stdin")
+    restore.add_argument("--as", dest="as_user", help="restore as this tenant instead of the exported one")
+    restore.add_argument("--replace", action="store_true", help="drop the tenant's existing chunks first")
+    restore.set_defaults(run=run_import)
+
+    verify = commands.add_parser("verify", help="check an archive against its manifest without importing")
+    verify.add_argument("archive", help="archive path, or - for stdin")
+    verify.set_defaults(run=run_verify)
+
+    args = parser.parse_args()
+    try:
+        args.run(args)
+    except ValueError as e:
+        raise SystemExit(f"error: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+# tests/conftest.py
+"""
+Shared test setup. Model providers are the offline fakes, and every test runs
+in its own scratch working directory, since the stores use relative paths.
+"""
+import os
+import sys
+
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("SENTENCE_ENCODER_PROVIDER", "fake")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+import fitz  # noqa: E402
+import pytest  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    yield tmp_path
+    # Process-wide handles and caches are keyed by relative store paths; drop them
+    # so the next test's scratch directory starts empty
+    vectorstore_service = sys.modules.get("app.services.vectorstore_service")
+    if vectorstore_service is not None:
+        vectorstore_service.shards.close_idle(0)
+    document_router = sys.modules.get("app.services.document_router")
+    if document_router is not None:
+        document_router._routable_counts.clear()
+
+
+@pytest.fixture
+def punkt():
+    """Skips the test when nltk's punkt data is neither installed nor downloadable."""
+    from app.services.text_processing import sent_tokenize
+
+    try:
+        sent_tokenize("One. Two.")
+    except LookupError:
+        pytest.skip("nltk punkt data is not available")
+
+
+@pytest.fixture
+def corpus():
+    """Paths of the committed fixture PDFs (see fixtures/golden.json for questions about them)."""
+    pdf_dir = os.path.join(BACKEND_DIR, "fixtures", "pdfs")
+    return sorted(os.path.join(pdf_dir, name) for name in os.listdir(pdf_dir))
+
+
+@pytest.fixture
+def make_pdf(tmp_path):
+    """make_pdf(name, pages) writes a PDF with one page per list of text lines and returns its path."""
+    def make(name, pages):
+        path = str(tmp_path / name)
+        doc = fitz.open()
+        for lines in pages:
+            page = doc.new_page()
+            for i, line in enumerate(lines):
+                page.insert_text((72, 72 + 16 * i), line, fontsize=11)
+        doc.save(path)
+        doc.close()
+        return path
+    return make
@@ -0,0 +1,91 @@
+import asyncio
+import threading
+
+import pytest
+from fastapi import HTTPException
+
+from app.services.admission import AdmissionPool
+
+
+def _pool(**overrides):
+    options = {"max_workers": 1, "per_tenant_limit": 2, "max_queue": 1, "retry_after": 7}
+    options.update(overrides)
+    return AdmissionPool("test", **options)
+
+
+async def _started(pool, tenant, gate):
+    """Admit a call that blocks on `gate`, returning its task once it is admitted."""
+    task = asyncio.ensure_future(pool.run(tenant, gate.wait, 5))
+    await asyncio.sleep(0.05)
+    return task
+
+
+def test_per_tenant_and_queue_caps():
+    async def scenario():
+        pool = _pool()
+        gate = threading.Event()
+        first = await _started(pool, "a", gate)
+        second = await _started(pool, "a", gate)  # queued behind the single worker
+        with pytest.raises(HTTPException, match="per-tenant"):
+            await pool.run("a", lambda: None)
+        with pytest.raises(HTTPException, match="queue full") as info:
+            await pool.run("b", lambda: None)
+        assert info.value.headers == {"Retry-After": "7"}
+        assert pool.stats()["running"] == 1 and pool.stats()["queued"] == 1
+        assert pool.stats()["rejected"] == 2
+
+        gate.set()
+        assert await first and await second
+        assert await pool.run("b", lambda: "done") == "done"
+        assert pool.stats()["running"] == 0 and pool.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_caller_keeps_its_slot_until_the_work_ends():
+    async def scenario():
+        pool = _pool(per_tenant_limit=1)
+        gate = threading.Event()
+        task = await _started(pool, "a", gate)
+        task.cancel()
+        await asyncio.sleep(0.05)
+        # The thread is still running fn, so the tenant is still at its cap
+        with pytest.raises(HTTPException, match="per-tenant"):
+            await pool.run("a", lambda: None)
+        gate.set()
+        await asyncio.sleep(0.05)
+        assert await pool.run("a", lambda: "ok") == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_failures_release_the_slot():
+    async def scenario():
+        pool = _pool(per_tenant_limit=1)
+
+        def boom():
+            raise RuntimeError("boom")
+
+        with pytest.raises(RuntimeError):
+            await pool.run("a", boom)
+        assert await pool.run("a", lambda: "ok") == "ok"
+
+    asyncio.run(scenario())
+
+
+def test_run_waiting_takes_the_next_free_slot_or_times_out():
+    async def scenario():
+        pool = _pool(per_tenant_limit=1)
+        gate = threading.Event()
+        first = await _started(pool, "a", gate)
+        with pytest.raises(HTTPException, match="per-tenant"):
+            await pool.run_waiting("a", 0.1, lambda: None)
+        assert pool.stats()["rejected"] == 1  # retries while waiting are not counted
+
+        waiting = asyncio.ensure_future(pool.run_waiting("a", 5, lambda: "second"))
+        await asyncio.sleep(0.1)
+        assert not waiting.done()
+        gate.set()
+        assert await first and await waiting == "second"
+
+    asyncio.run(scenario())
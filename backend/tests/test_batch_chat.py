@@ -0,0 +1,120 @@
+import json
+import threading
+
+import pytest
+from fastapi import FastAPI, HTTPException
+from fastapi.testclient import TestClient
+
+from app.api import chat
+from app.core.config import settings
+from app.services.admission import AdmissionPool
+from app.services import vectorstore_service
+
+USER = "batch@example.com"
+
+
+def _answer(question, docs):
+    return f"{len(docs)} chunks for {question}", [{"snippet": docs[0].page_content[:20], "metadata": docs[0].metadata}]
+
+
+class BusyForQuestion:
+    """chat_pool stand-in that rejects the answer to one question like a saturated pool."""
+    per_tenant_limit = 4
+
+    def __init__(self, busy_question=None):
+        self.busy_question = busy_question
+        self.answered = []
+
+    async def run(self, tenant, fn, *args, **kwargs):
+        if fn is _answer:
+            if args[0] == self.busy_question:
+                raise HTTPException(status_code=429, detail="chat is busy", headers={"Retry-After": "5"})
+            self.answered.append(args[0])
+        return fn(*args, **kwargs)
+
+    async def run_waiting(self, tenant, timeout, fn, *args, **kwargs):
+        return await self.run(tenant, fn, *args, **kwargs)
+
+
+@pytest.fixture
+def client(monkeypatch, corpus):
+    vectorstore_service.process_documents_for_user(corpus, USER)
+    monkeypatch.setattr(chat, "answer_from_documents", _answer)
+    monkeypatch.setattr(chat.warm_tenants, "touch", lambda user_id: None)
+    app = FastAPI()
+    app.include_router(chat.router, prefix="/chat")
+    return TestClient(app)
+
+
+def _lines(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_batch_streams_one_line_per_question(client, monkeypatch):
+    pool = BusyForQuestion()
+    monkeypatch.setattr(chat, "chat_pool", pool)
+    questions = ["How long is parental leave?", "When are light roasts dropped?", "Was customer data taken?"]
+    response = client.post("/chat/batch", json={"questions": questions, "user_id": USER, "types": ["text"]})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    lines = sorted(_lines(response), key=lambda line: line["index"])
+    assert [line["question"] for line in lines] == questions
+    assert all(line["answer"].endswith(line["question"]) and line["user_id"] == USER for line in lines)
+    assert sorted(pool.answered) == sorted(questions)
+
+
+def test_rejected_answers_become_error_lines(client, monkeypatch):
+    monkeypatch.setattr(chat, "chat_pool", BusyForQuestion(busy_question="second"))
+    lines = {line["question"]: line for line in _lines(client.post(
+        "/chat/batch", json={"questions": ["first", "second"], "user_id": USER}
+    ))}
+    assert "answer" in lines["first"]
+    assert lines["second"]["status"] == 429
+    assert lines["second"]["retry_after"] == "5"
+    assert lines["second"]["error"] == "chat is busy"
+
+
+def test_empty_and_oversized_batches_are_rejected(client, monkeypatch):
+    monkeypatch.setattr(settings, "BATCH_MAX_QUESTIONS", 2)
+    assert client.post("/chat/batch", json={"questions": [], "user_id": USER}).status_code == 400
+    assert client.post("/chat/batch", json={"questions": ["a", "b", "c"], "user_id": USER}).status_code == 400
+
+
+def test_answers_wait_for_slots_held_by_the_tenants_other_requests(client, monkeypatch):
+    pool = AdmissionPool("chat", max_workers=4, per_tenant_limit=2, max_queue=4, retry_after=5)
+    monkeypatch.setattr(chat, "chat_pool", pool)
+    monkeypatch.setattr(settings, "BATCH_ADMISSION_TIMEOUT", 10)
+    # Another chat request of the tenant holds one of its two slots for a while
+    other = threading.Event()
+    pool._admit(USER)
+    pool._executor.submit(other.wait, 5).add_done_callback(lambda _future: pool._release(USER))
+    threading.Timer(0.3, other.set).start()
+
+    questions = [f"question {i}" for i in range(6)]
+    lines = _lines(client.post("/chat/batch", json={"questions": questions, "user_id": USER}))
+    assert sorted(line["index"] for line in lines) == list(range(6))
+    assert all("answer" in line for line in lines)
+
+
+def test_answers_give_up_after_the_admission_timeout(client, monkeypatch):
+    pool = AdmissionPool("chat", max_workers=4, per_tenant_limit=1, max_queue=4, retry_after=5)
+    monkeypatch.setattr(chat, "chat_pool", pool)
+    monkeypatch.setattr(settings, "BATCH_ADMISSION_TIMEOUT", 0.2)
+
+    async def run_unadmitted(tenant, fn, *args, **kwargs):
+        return fn(*args, **kwargs)
+
+    monkeypatch.setattr(pool, "run", run_unadmitted)  # only the answers compete for the slot
+    pool._admit(USER)  # held by another request for the whole batch
+    try:
+        lines = _lines(client.post("/chat/batch", json={"questions": ["only"], "user_id": USER}))
+    finally:
+        pool._release(USER)
+    assert lines[0]["status"] == 429 and lines[0]["retry_after"] == "5"
+
+
+def test_startup_warns_when_batch_concurrency_exceeds_the_tenant_cap(monkeypatch, caplog):
+    monkeypatch.setattr(settings, "BATCH_LLM_CONCURRENCY", 8)
+    chat.check_batch_concurrency()
+    assert "exceeds CHAT_PER_TENANT" in caplog.text
@@ -0,0 +1,117 @@
+import os
+import random
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import compact_index
+from app.services.compact_index import build_compact_index, load_compact_index, metadata_matches
+
+SOURCES = ["a.pdf", "b.pdf", "c.pdf"]
+TYPES = ["text", "table", "ocr_table"]
+
+
+def _build(name="tenant", count=200, dim=32, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim)).astype(np.float32)
+    metadatas = [
+        {"tenant": "t", "source": SOURCES[i % 3], "type": TYPES[(i // 3) % 3], "page": i % 4}
+        for i in range(count)
+    ]
+    build_compact_index(name, [f"id{i}" for i in range(count)], vectors, [f"doc {i}" for i in range(count)], metadatas)
+    return vectors, metadatas
+
+
+def _random_where(rng, depth=0):
+    key = rng.choice(["source", "type", "page"])
+    values = {"source": SOURCES + ["missing.pdf"], "type": TYPES, "page": [0, 1, 2, 3]}[key]
+    roll = rng.random()
+    if depth < 2 and roll < 0.2:
+        return {rng.choice(["$and", "$or"]): [_random_where(rng, depth + 1) for _ in range(rng.randint(1, 3))]}
+    if roll < 0.4:
+        return {key: rng.choice(values)}
+    op = rng.choice(["$in", "$nin", "$eq", "$ne"])
+    operand = rng.sample(values, rng.randint(1, 2)) if op in ("$in", "$nin") else rng.choice(values)
+    return {key: {op: operand}}
+
+
+def test_metadata_matches_operators():
+    meta = {"source": "a.pdf", "type": "text"}
+    assert metadata_matches(meta, {"source": "a.pdf"})
+    assert metadata_matches(meta, {"source": {"$in": ["a.pdf", "b.pdf"]}})
+    assert not metadata_matches(meta, {"source": {"$nin": ["a.pdf"]}})
+    assert metadata_matches(meta, {"$and": [{"source": "a.pdf"}, {"type": {"$ne": "table"}}]})
+    assert metadata_matches(meta, {"$or": [{"source": "b.pdf"}, {"type": {"$eq": "text"}}]})
+    assert not metadata_matches(meta, {"$or": [{"source": "b.pdf"}, {"type": "table"}]})
+
+
+def test_mask_agrees_with_metadata_matches():
+    _vectors, metadatas = _build()
+    index = load_compact_index("tenant")
+    rng = random.Random(1)
+    for _ in range(300):
+        where = _random_where(rng)
+        expected = np.array([metadata_matches(m, where) for m in metadatas])
+        assert np.array_equal(index.mask(where), expected), where
+    assert index.mask(None) is None
+
+
+@pytest.mark.parametrize("mode", ["int8", "truncate"])
+def test_search_rescores_exactly(monkeypatch, mode):
+    monkeypatch.setattr(settings, "COMPACT_INDEX_QUANTIZATION", mode)
+    monkeypatch.setattr(settings, "COMPACT_INDEX_TRUNCATE_DIM", 8)
+    vectors, metadatas = _build()
+    index = load_compact_index("tenant")
+    query = vectors[17] + 0.01
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    exact = normalized @ (query / np.linalg.norm(query))
+    hits = index.search(query, k=5, candidates=200)
+    assert [row for row, _ in hits] == list(np.argsort(-exact)[:5])
+    assert hits[0][1] == pytest.approx(exact[17], abs=1e-5)
+
+    where = {"source": "b.pdf"}
+    filtered = index.search(query, k=5, mask=index.mask(where))
+    assert filtered and all(metadatas[row]["source"] == "b.pdf" for row, _ in filtered)
+
+
+def test_rebuild_publishes_a_new_version_and_prunes_old_ones():
+    _build(seed=0)
+    first = load_compact_index("tenant")
+    for seed in range(1, 4):
+        _build(seed=seed, count=50)
+    index = load_compact_index("tenant")
+    assert index is not first and index.count == 50
+
+    index_dir = compact_index._index_dir("tenant")
+    versions = [name for name in os.listdir(index_dir) if name.startswith("v")]
+    assert len(versions) == compact_index.KEEP_VERSIONS
+    assert compact_index._current_version(index_dir) in versions
+    assert load_compact_index("tenant") is index  # unchanged version is served from memory
+
+
+def test_missing_index_loads_as_none():
+    assert load_compact_index("nobody") is None
+
+
+def test_builds_run_under_the_shard_write_lock(monkeypatch, corpus):
+    from app.services import vectorstore_service
+    from app.services.shard_store import shard_generation
+
+    user = "compact@example.com"
+    monkeypatch.setattr(settings, "VECTOR_INDEX_MODE", "compact")
+    built_at = []
+    build = vectorstore_service.build_compact_index_from_store
+    monkeypatch.setattr(
+        vectorstore_service, "build_compact_index_from_store",
+        lambda *args, **kwargs: (built_at.append(shard_generation(user)), build(*args, **kwargs)),
+    )
+
+    vectorstore_service.process_documents_for_user(corpus[:2], user)
+    vectorstore_service._delete_file_chunks(user, os.path.basename(corpus[0]))
+    # The generation is bumped when the write lock is released, i.e. after each build
+    after_ingest, after_delete = built_at
+    assert after_ingest < after_delete < shard_generation(user)
+    index = load_compact_index(vectorstore_service.safe_collection_name(user))
+    assert {doc["metadata"]["source"] for doc in index.docs} == {os.path.basename(corpus[1])}
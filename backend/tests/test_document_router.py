@@ -0,0 +1,49 @@
+import pytest
+
+from app.core.config import settings
+from app.services import document_router, vectorstore_service
+from app.services.document_router import RoutedRetriever, build_document_summary, count_routable_documents
+
+USER = "router@example.com"
+
+
+@pytest.fixture
+def routing(monkeypatch):
+    monkeypatch.setattr(settings, "DOCUMENT_ROUTING", True)
+    monkeypatch.setattr(settings, "ROUTING_MIN_DOCUMENTS", 2)
+    monkeypatch.setattr(settings, "ROUTING_TOP_DOCUMENTS", 1)
+
+
+def test_summary_has_filename_distinct_titles_and_leading_text():
+    summary = build_document_summary("a.pdf", ["Results", "Methods", "Results"], ["one  two\nthree", "x" * 5000])
+    lines = summary.split("\n")
+    assert lines[0] == "a.pdf"
+    assert lines[1] == "Sections: Results, Methods"
+    assert lines[2].startswith("one two three")
+    assert len(lines[2]) == document_router.SUMMARY_LEADING_CHARS
+
+
+def test_routed_retriever_searches_only_the_best_document(corpus, routing):
+    vectorstore_service.process_documents_for_user(corpus, USER)
+    retriever = vectorstore_service.get_retriever(USER, search_kwargs={"k": 3})
+    assert isinstance(retriever, RoutedRetriever)
+
+    docs = retriever.invoke("How many days of annual vacation leave do employees accrue?")
+    assert docs and {d.metadata["source"] for d in docs} == {"leave_policy.pdf"}
+
+
+def test_routable_count_is_cached_until_the_shard_changes(corpus, routing, monkeypatch):
+    vectorstore_service.process_documents_for_user(corpus[:2], USER)
+    summaries = vectorstore_service.get_summary_store(USER)
+    scans = []
+    get = summaries.get
+    monkeypatch.setattr(summaries, "get", lambda **kwargs: (scans.append(kwargs), get(**kwargs))[1])
+
+    assert count_routable_documents(summaries, USER) == 2
+    assert count_routable_documents(summaries, USER) == 2
+    assert len(scans) == 1
+
+    vectorstore_service.delete_file_chunks(USER, "coffee_roasting.pdf")
+    assert count_routable_documents(summaries, USER) == 1
+    assert len(scans) == 2
+    assert not isinstance(vectorstore_service.get_retriever(USER), RoutedRetriever)  # below ROUTING_MIN_DOCUMENTS
@@ -0,0 +1,83 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.core.config import settings
+from app.services import encoding_service, providers
+from app.services.encoding_service import BatchingEncoder, EncoderEmbeddings
+from app.services.providers import FakeSentenceModel
+
+
+class RecordingModel(FakeSentenceModel):
+    def __init__(self, fail=False):
+        super().__init__(dim=16, latency_ms=0)
+        self.batches = []
+        self.batch_sizes = []
+        self.fail = fail
+
+    def encode(self, texts, batch_size=None, **kwargs):
+        self.batches.append(list(texts))
+        self.batch_sizes.append(batch_size)
+        if self.fail:
+            raise RuntimeError("model down")
+        return super().encode(texts, batch_size=batch_size)
+
+
+def test_concurrent_callers_share_batches_and_get_their_own_rows():
+    model = RecordingModel()
+    encoder = BatchingEncoder(model, max_batch_size=64, max_wait_ms=50)
+    start = threading.Barrier(8)
+    results = {}
+
+    def call(i):
+        texts = [f"caller {i} text {j}" for j in range(3)]
+        start.wait()
+        results[i] = (texts, encoder.encode(texts))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(model.batches) < 8
+    reference = FakeSentenceModel(dim=16, latency_ms=0)
+    for texts, embeddings in results.values():
+        assert np.allclose(embeddings, reference.encode(texts))
+    assert encoder.stats()["total_texts"] == 24
+
+
+def test_oversized_request_is_encoded_whole():
+    model = RecordingModel()
+    encoder = BatchingEncoder(model, max_batch_size=4, max_wait_ms=1000)
+    encoder.encode([f"t{i}" for i in range(6)])  # the cap stops collecting; it never splits a request
+    assert model.batches == [[f"t{i}" for i in range(6)]]
+    assert model.batch_sizes == [4]  # but the model runs it in passes of at most max_batch_size
+    assert encoder.encode([]).shape == (0, 16)
+
+
+def test_model_errors_reach_every_caller():
+    encoder = BatchingEncoder(RecordingModel(fail=True), max_wait_ms=0)
+    with pytest.raises(RuntimeError, match="model down"):
+        encoder.encode(["x"])
+    with pytest.raises(RuntimeError):
+        encoder.encode(["y"])  # the worker keeps serving after a failure
+
+
+def test_huggingface_embeddings_share_the_rerankers_encoder(monkeypatch):
+    models = {}
+    monkeypatch.setattr(encoding_service, "_encoders", {})
+    monkeypatch.setattr(encoding_service, "get_sentence_model", lambda name: models.setdefault(name, RecordingModel()))
+    monkeypatch.setattr(settings, "EMBEDDING_PROVIDER", "huggingface")
+    monkeypatch.setattr(settings, "SENTENCE_ENCODER_PROVIDER", "sentence_transformers")
+    monkeypatch.setattr(settings, "EMBEDDING_MODEL", settings.SENTENCE_ENCODER_MODEL)
+
+    embeddings = providers.get_embeddings()
+    assert isinstance(embeddings, EncoderEmbeddings)
+    assert embeddings.encoder is encoding_service.get_sentence_encoder()
+    assert list(models) == [settings.SENTENCE_ENCODER_MODEL]  # one model loaded for both
+
+    vectors = embeddings.embed_documents(["line one\nline two", "other"])
+    assert models[settings.SENTENCE_ENCODER_MODEL].batches == [["line one line two", "other"]]
+    assert embeddings.embed_query("other") == vectors[1]
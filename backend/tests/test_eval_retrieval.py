@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+from scripts.eval_retrieval import BACKEND_DIR, count_tokens, is_relevant, page_number
+
+
+def test_relevance_matches_every_given_field():
+    chunk = {"source": "a.pdf", "page": 2, "section": "Results"}
+    assert page_number(chunk) == 3
+    assert page_number({"source": "a.pdf"}) is None
+    assert is_relevant(chunk, {"source": "a.pdf"})
+    assert is_relevant(chunk, {"source": "a.pdf", "page": 3, "section": "results "})
+    assert not is_relevant(chunk, {"source": "a.pdf", "page": 2})
+    assert not is_relevant(chunk, {"source": "b.pdf"})
+    assert count_tokens("Hello, world!") == 4
+
+
+def test_default_fixture_run_is_offline_and_finds_every_answer(tmp_path):
+    output = tmp_path / "report.json"
+    env = {**os.environ, "PYTHONPATH": BACKEND_DIR}
+    subprocess.run(
+        [sys.executable, "-m", "scripts.eval_retrieval", "--modes", "flat", "compact",
+         "--k", "6", "--output", str(output)],
+        cwd=BACKEND_DIR, env=env, check=True, capture_output=True, timeout=300,
+    )
+    report = json.loads(output.read_text())
+    assert report["embedder"] == "fake"  # the default needs no network
+    with open(os.path.join(BACKEND_DIR, "fixtures", "golden.json")) as f:
+        assert report["questions"] == len(json.load(f))
+    assert [(r["mode"], r["k"]) for r in report["results"]] == [("flat", 6), ("compact", 6)]
+    assert all(r["recall"] == 1.0 for r in report["results"])
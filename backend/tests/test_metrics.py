@@ -0,0 +1,62 @@
+import pytest
+
+from app.services.metrics import CallbackGauge, Counter, Histogram, Registry, STAGE_LATENCY, stage
+
+
+def test_counter_renders_labelled_series():
+    counter = Counter("events_total", "Events.", labels=("kind",))
+    counter.inc(kind="a")
+    counter.inc(2, kind="a")
+    counter.inc(kind='say "hi"\n')
+    assert counter.render() == [
+        "# HELP events_total Events.",
+        "# TYPE events_total counter",
+        'events_total{kind="a"} 3',
+        'events_total{kind="say \\"hi\\"\\n"} 1',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency.", buckets=(0.1, 1))
+    for value in (0.05, 0.5, 0.7, 3):
+        histogram.observe(value)
+    lines = histogram.render()[2:]
+    assert lines == [
+        'latency_seconds_bucket{le="0.1"} 1',
+        'latency_seconds_bucket{le="1"} 3',
+        'latency_seconds_bucket{le="+Inf"} 4',
+        "latency_seconds_sum 4.25",
+        "latency_seconds_count 4",
+    ]
+    assert histogram.totals() == (4, pytest.approx(4.25))
+
+
+def test_gauge_callback_failures_render_no_samples():
+    registry = Registry()
+    registry.register(CallbackGauge("ok", "Fine.", ("pool",), lambda: {("chat",): 2}))
+    registry.register(CallbackGauge("broken", "Raises.", (), lambda: 1 / 0))
+    text = registry.render()
+    assert 'ok{pool="chat"} 2' in text
+    assert "# TYPE broken gauge" in text
+    assert not [line for line in text.splitlines() if line.startswith("broken")]
+
+
+def test_stage_records_latency_even_when_the_stage_fails():
+    before, _ = STAGE_LATENCY.totals(stage="unit-test")
+    with stage("unit-test"):
+        pass
+    with pytest.raises(ValueError):
+        with stage("unit-test"):
+            raise ValueError
+    assert STAGE_LATENCY.totals(stage="unit-test")[0] == before + 2
+
+
+def test_metrics_endpoint_exposes_request_latency():
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+
+    client = TestClient(app)
+    client.get("/metrics")
+    body = client.get("/metrics").text
+    assert 'http_request_duration_seconds_count{method="GET",route="/metrics",status="200"}' in body
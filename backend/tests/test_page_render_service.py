@@ -0,0 +1,77 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import serve_files, viewer
+from app.services import page_render_service
+from app.services.page_render_service import PageCache, normalize_zoom, page_count, render_page
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    cache = PageCache(str(tmp_path / "pages"), 10 ** 9)
+    monkeypatch.setattr(page_render_service, "page_cache", cache)
+    return cache
+
+
+@pytest.fixture
+def no_fitz(monkeypatch):
+    """Fails the test if anything opens a PDF after this fixture is requested."""
+    def activate():
+        monkeypatch.setattr(page_render_service.fitz, "open", lambda *args, **kwargs: pytest.fail("opened the PDF"))
+    return activate
+
+
+def test_lru_evicts_oldest_entries_by_bytes(tmp_path):
+    cache = PageCache(str(tmp_path / "pages"), max_bytes=25)
+    cache.put("h/1.webp", b"a" * 10)
+    cache.put("h/2.webp", b"b" * 10)
+    assert cache.get("h/1.webp") == b"a" * 10  # now the most recent
+    cache.put("h/3.webp", b"c" * 10)
+    assert cache.get("h/2.webp") is None
+    assert cache.stats() == {"entries": 2, "bytes": 20, "max_bytes": 25}
+
+    reopened = PageCache(str(tmp_path / "pages"), max_bytes=25)
+    assert reopened.contains("h/1.webp") and reopened.contains("h/3.webp")
+
+
+def test_zoom_is_clamped_and_rounded():
+    assert normalize_zoom(100) == page_render_service.MAX_ZOOM
+    assert normalize_zoom(0) == page_render_service.MIN_ZOOM
+    assert normalize_zoom(1.23456) == 1.23
+
+
+def test_render_is_cached_and_page_range_checked(make_pdf, cache, no_fitz):
+    path = make_pdf("doc.pdf", [["first"], ["second"]])
+    data, media_type = render_page(path, 2, 1.0, "png")
+    assert media_type == "image/png" and data.startswith(b"\x89PNG")
+    with pytest.raises(ValueError):
+        render_page(path, 3, 1.0, "png")
+    with pytest.raises(ValueError):
+        render_page(path, 1, 1.0, "gif")
+
+    assert page_count(path) == 2
+    no_fitz()
+    assert render_page(path, 2, 1.0, "png")[0] == data
+    assert page_count(path) == 2
+
+
+def test_page_image_endpoint_serves_cached_renders_without_opening_the_pdf(make_pdf, cache, no_fitz):
+    os.makedirs(serve_files.UPLOAD_DIR)
+    os.replace(make_pdf("doc.pdf", [["first"], ["second"]]), os.path.join(serve_files.UPLOAD_DIR, "dave__doc.pdf"))
+    app = FastAPI()
+    app.include_router(viewer.router)
+    client = TestClient(app)
+
+    first = client.get("/api/page-image", params={"file": "doc.pdf", "page": 1, "zoom": 1})
+    assert first.status_code == 200 and first.headers["x-page-count"] == "2"
+    no_fitz()
+    again = client.get("/api/page-image", params={"file": "doc.pdf", "page": 1, "zoom": 1})
+    assert again.content == first.content and again.headers["x-page-count"] == "2"
+    revalidated = client.get(
+        "/api/page-image", params={"file": "doc.pdf", "page": 1, "zoom": 1},
+        headers={"If-None-Match": first.headers["etag"]},
+    )
+    assert revalidated.status_code == 304
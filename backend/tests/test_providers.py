@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+from langchain_core.messages import HumanMessage
+
+from app.core.config import settings
+from app.services import providers
+from app.services.providers import FAKE_NOT_FOUND, FakeChatModel, FakeEmbeddings, FakeSentenceModel, hashed_vector
+
+
+def test_hashed_vectors_are_deterministic_and_normalized():
+    vector = hashed_vector("Solar panels need cleaning", 64)
+    assert np.array_equal(vector, hashed_vector("solar PANELS need cleaning", 64))
+    assert np.linalg.norm(vector) == pytest.approx(1.0)
+    assert np.linalg.norm(hashed_vector("", 64)) == pytest.approx(1.0)
+
+
+def test_fake_embeddings_rank_shared_words_higher():
+    embeddings = FakeEmbeddings(dim=256, latency_ms=0)
+    query = np.array(embeddings.embed_query("parental leave weeks"))
+    related, unrelated = np.array(embeddings.embed_documents(
+        ["Parental leave is sixteen weeks", "Roast coffee past second crack"]
+    ))
+    assert query @ related > query @ unrelated
+    assert FakeSentenceModel(dim=256, latency_ms=0).encode(["parental leave weeks"])[0] == pytest.approx(query)
+
+
+def test_fake_chat_model_answers_from_the_context():
+    model = FakeChatModel(max_sentences=1)
+    prompt = "Context:\nLeave is sixteen weeks. It is paid.\n\nQuestion:\nHow long?"
+    assert model.invoke([HumanMessage(content=prompt)]).content == "Leave is sixteen weeks."
+    empty = "Context:\n\nQuestion:\nHow long?"
+    assert model.invoke([HumanMessage(content=empty)]).content == FAKE_NOT_FOUND
+
+
+def test_factories_select_the_fakes_and_reject_unknown_providers(monkeypatch):
+    assert isinstance(providers.get_llm(), FakeChatModel)
+    assert isinstance(providers.get_embeddings(), FakeEmbeddings)
+    assert isinstance(providers.get_sentence_model(), FakeSentenceModel)
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "nope")
+    with pytest.raises(ValueError):
+        providers.get_llm()
@@ -0,0 +1,65 @@
+from app.core.config import settings
+from app.services import qa_service, vectorstore_service
+from app.services.vectorstore_service import build_metadata_filter
+
+USER = "scoped@example.com"
+
+
+def test_metadata_filter_combines_scopes():
+    assert build_metadata_filter() is None
+    assert build_metadata_filter(filenames=["a.pdf"]) == {"source": {"$in": ["a.pdf"]}}
+    assert build_metadata_filter(filenames=["a.pdf"], sections=[" results "], types=["table"]) == {
+        "$and": [
+            {"source": {"$in": ["a.pdf"]}},
+            {"section": {"$in": ["Results"]}},
+            {"type": {"$in": ["table"]}},
+        ]
+    }
+
+
+def test_scoped_questions_use_the_smaller_k():
+    assert qa_service.search_params() == (settings.RETRIEVAL_K, None)
+    k, where = qa_service.search_params(sections=["methods"])
+    assert k == settings.SCOPED_RETRIEVAL_K
+    assert where == {"section": {"$in": ["Methods"]}}
+
+
+def test_scoped_retrieval_only_returns_matching_chunks(corpus):
+    vectorstore_service.process_documents_for_user(corpus, USER)
+
+    for filenames, sections in ([["leave_policy.pdf"], None], [None, ["Recommendations"]]):
+        docs = qa_service.retrieve_batch(["What is recommended?"], USER, filenames=filenames, sections=sections)[0]
+        assert docs
+        if filenames:
+            assert {d.metadata["source"] for d in docs} == {"leave_policy.pdf"}
+        if sections:
+            assert {d.metadata["section"] for d in docs} == {"Recommendations"}
+            assert {d.metadata["source"] for d in docs} == {"leave_policy.pdf", "incident_report.pdf"}
+
+
+def test_get_answer_cites_only_the_scoped_document(corpus, punkt):
+    vectorstore_service.process_documents_for_user(corpus, USER)
+    answer, sources = qa_service.get_answer("How long is parental leave?", USER, filenames=["leave_policy.pdf"])
+    assert "sixteen weeks" in answer
+    assert sources and {s["metadata"]["source"] for s in sources} == {"leave_policy.pdf"}
+
+
+def test_scoped_questions_skip_routing(corpus, monkeypatch):
+    from app.services.document_router import route_by_vector
+
+    monkeypatch.setattr(settings, "ROUTING_MIN_DOCUMENTS", 2)
+    monkeypatch.setattr(settings, "ROUTING_TOP_DOCUMENTS", 1)
+    vectorstore_service.process_documents_for_user(corpus, USER)
+    question = "How often should the solar panels be cleaned?"
+    # "Limitations" only exists in coffee_roasting.pdf, which routing would not pick for this question
+    with vectorstore_service.shards.session():
+        query_vector = vectorstore_service.get_embedding_function().embed_query(question)
+        routed = route_by_vector(vectorstore_service.get_summary_store(USER), USER, query_vector, 1)
+    assert routed == ["solar_maintenance.pdf"]
+
+    batched = qa_service.retrieve_batch([question], USER, sections=["Limitations"])[0]
+    with vectorstore_service.shards.session():
+        retriever = vectorstore_service.get_retriever(USER, search_kwargs={"k": 6, "filter": {"section": "Limitations"}})
+        single = retriever.invoke(question)
+    for docs in (batched, single):
+        assert docs and {d.metadata["source"] for d in docs} == {"coffee_roasting.pdf"}
@@ -0,0 +1,150 @@
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import serve_files
+from app.api.serve_files import _etag_matches, _parse_range
+from app.services.file_hash import compute_file_hash
+from app.services.metadata_store import mark_as_processed
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(serve_files.router)
+    return TestClient(app)
+
+
+@pytest.fixture
+def upload(make_pdf):
+    os.makedirs(serve_files.UPLOAD_DIR)
+    path = make_pdf("source.pdf", [["Page one text"], ["Page two text"]])
+    target = os.path.join(serve_files.UPLOAD_DIR, "bob@example.com__report.pdf")
+    os.replace(path, target)
+    return target
+
+
+@pytest.mark.parametrize("header, expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=1000-", "unsatisfiable"),
+    ("bytes=50-10", "unsatisfiable"),
+    ("bytes=-0", "unsatisfiable"),
+    ("bytes=0-1,5-6", None),
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert _parse_range(header, 1000) == expected
+
+
+def test_etag_matching_is_weak():
+    assert _etag_matches('W/"abc"', '"abc"')
+    assert _etag_matches('"x", "abc"', '"abc"')
+    assert _etag_matches("*", '"abc"')
+    assert not _etag_matches('"abd"', '"abc"')
+
+
+def test_full_conditional_and_ranged_responses(client, upload):
+    body = open(upload, "rb").read()
+    full = client.get("/files/report.pdf")
+    assert full.status_code == 200 and full.content == body
+    etag = full.headers["etag"]
+    assert etag == f'"{compute_file_hash(upload)}"'
+    assert full.headers["accept-ranges"] == "bytes"
+
+    assert client.get("/files/report.pdf", headers={"If-None-Match": etag}).status_code == 304
+
+    part = client.get("/files/report.pdf", headers={"Range": "bytes=10-19"})
+    assert part.status_code == 206
+    assert part.content == body[10:20]
+    assert part.headers["content-range"] == f"bytes 10-19/{len(body)}"
+
+    stale = client.get("/files/report.pdf", headers={"Range": "bytes=10-19", "If-Range": '"old"'})
+    assert stale.status_code == 200 and stale.content == body
+
+    unsatisfiable = client.get("/files/report.pdf", headers={"Range": f"bytes={len(body)}-"})
+    assert unsatisfiable.status_code == 416
+    assert unsatisfiable.headers["content-range"] == f"bytes */{len(body)}"
+
+
+def test_head_returns_the_get_headers_without_a_body(client, upload):
+    size = os.path.getsize(upload)
+    full = client.head("/files/report.pdf")
+    assert full.status_code == 200 and full.content == b""
+    assert full.headers["content-length"] == str(size)
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["etag"] == client.get("/files/report.pdf").headers["etag"]
+
+    part = client.head("/files/report.pdf", headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206 and part.content == b""
+    assert part.headers["content-length"] == "10"
+    assert part.headers["content-range"] == f"bytes 0-9/{size}"
+    assert client.head("/files/missing.pdf").status_code == 404
+
+
+def test_etag_comes_from_the_ingest_record_while_the_file_is_unchanged(client, upload, monkeypatch):
+    mark_as_processed("bob@example.com", "report.pdf", 2, path=upload)
+    hashed = []
+    monkeypatch.setattr(serve_files, "compute_file_hash", lambda path: hashed.append(path) or compute_file_hash(path))
+    recorded = client.get("/files/report.pdf").headers["etag"]
+    assert hashed == []
+
+    with open(upload, "ab") as f:
+        f.write(b"%% appended")
+    changed = client.get("/files/report.pdf").headers["etag"]
+    assert changed != recorded
+    assert changed == f'"{compute_file_hash(upload)}"'
+    assert hashed == [upload]
+
+
+def test_unknown_or_traversing_names_are_404(client, upload):
+    assert client.get("/files/missing.pdf").status_code == 404
+    assert serve_files.resolve_upload_path("../secret.pdf") is None
+
+
+def test_delete_removes_a_linearized_copy_once_unshared(upload):
+    from app.api.delete import _delete_document
+    from app.services.linearize_service import linearized_path_for
+
+    twin = os.path.join(serve_files.UPLOAD_DIR, "carol@example.com__report.pdf")
+    with open(upload, "rb") as src, open(twin, "wb") as dst:
+        dst.write(src.read())
+    mark_as_processed("bob@example.com", "report.pdf", 2, path=upload)
+    mark_as_processed("carol@example.com", "report.pdf", 2, path=twin)
+    copy = linearized_path_for(compute_file_hash(upload))
+    os.makedirs(os.path.dirname(copy))
+    open(copy, "wb").close()
+
+    _delete_document("report.pdf", "bob@example.com")
+    assert not os.path.exists(upload) and os.path.exists(copy)  # carol's upload has the same bytes
+    _delete_document("report.pdf", "carol@example.com")
+    assert not os.path.exists(copy)
+
+
+def test_linearized_copy_starts_with_a_linearization_dict(corpus):
+    from app.services import linearize_service
+
+    if linearize_service.linearizer() is None:
+        pytest.skip("neither pikepdf nor qpdf is installed")
+    copy = linearize_service.linearize_pdf(corpus[0])
+    assert copy == linearize_service.find_linearized_copy(corpus[0])
+    with open(copy, "rb") as f:
+        assert b"/Linearized" in f.read(1024)
+
+
+def test_linearization_is_disabled_without_a_linearizer(monkeypatch, corpus):
+    from app.core.config import settings
+    from app.services import linearize_service
+
+    monkeypatch.setattr(linearize_service, "linearizer", lambda: None)
+    monkeypatch.setattr(settings, "LINEARIZE_PDFS", True)
+    linearize_service.check_linearization()
+    assert settings.LINEARIZE_PDFS is False
+    assert linearize_service.linearize_pdf(corpus[0]) is None
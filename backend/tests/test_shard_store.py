@@ -0,0 +1,114 @@
+import threading
+
+import pytest
+
+from app.core.config import settings
+from app.services import shard_store
+from app.services.providers import FakeEmbeddings
+from app.services.shard_store import ShardRegistry, shard_for_tenant, shard_generation, tenant_filter
+
+USER = "alice@example.com"
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    stopped = []
+    stop = shard_store._stop_chroma
+    monkeypatch.setattr(shard_store, "_stop_chroma", lambda system: (stopped.append(system), stop(system)))
+    registry = ShardRegistry(FakeEmbeddings)
+    registry.stopped = stopped
+    yield registry
+    for shard_id in registry.pinned_shards():
+        registry._pins.pop(shard_id)
+    registry.close_idle(0)
+
+
+def _write_elsewhere(user_id):
+    # What another worker process's write_lock does on exit
+    shard_store._bump_generation(shard_for_tenant(user_id))
+
+
+def test_tenants_hash_to_a_stable_shard():
+    assert shard_for_tenant(USER) == shard_for_tenant(USER)
+    assert 0 <= shard_for_tenant(USER) < settings.VECTOR_SHARDS
+    assert tenant_filter(USER) == {"tenant": USER}
+    assert tenant_filter(USER, {"source": "a.pdf"}) == {"$and": [{"tenant": USER}, {"source": "a.pdf"}]}
+
+
+def test_write_lock_bumps_generation_and_read_lock_does_not(registry):
+    before = shard_generation(USER)
+    with registry.read_lock(USER):
+        pass
+    assert shard_generation(USER) == before
+    with registry.write_lock(USER):
+        registry.for_tenant(USER).add_texts(["hello"], metadatas=[{"tenant": USER}])
+    assert shard_generation(USER) > before
+
+
+def test_reload_keeps_replaced_handle_open_until_session_ends(registry):
+    with registry.session():
+        old = registry.for_tenant(USER)
+        old.add_texts(["first"], metadatas=[{"tenant": USER}])
+        _write_elsewhere(USER)
+        with registry.session():
+            new = registry.for_tenant(USER)
+            assert new is not old
+            new.add_texts(["second"], metadatas=[{"tenant": USER}])
+        assert registry.stopped == []
+        assert old._collection.count() == 2  # still usable by the in-flight session
+    assert len(registry.stopped) == 1
+    assert new._collection.count() == 2  # stopping the old system left the new one alone
+
+
+def test_close_idle_skips_shards_in_use_or_pinned(registry):
+    other = next(f"user{i}@example.com" for i in range(100) if shard_for_tenant(f"user{i}@example.com") != shard_for_tenant(USER))
+    registry.for_tenant(other)
+    with registry.session():
+        registry.for_tenant(USER)
+        registry.close_idle(0)
+        assert registry.open_shards() == [shard_for_tenant(USER)]
+    registry.for_tenant(other)
+    assert registry.pin(other)
+    registry.close_idle(0)
+    assert registry.open_shards() == [shard_for_tenant(other)]
+    registry.unpin(other)
+    registry.close_idle(0)
+    assert registry.open_shards() == []
+
+
+def test_pin_respects_the_shard_cap(registry):
+    users = {}
+    for i in range(200):
+        users.setdefault(shard_for_tenant(f"user{i}@example.com"), f"user{i}@example.com")
+    first, second = list(users.values())[:2]
+    assert registry.pin(first, max_shards=1)
+    assert registry.pin(first, max_shards=1)  # same shard: no new slot needed
+    assert not registry.pin(second, max_shards=1)
+    assert registry.pinned_shards() == [shard_for_tenant(first)]
+
+
+def test_cold_open_blocks_only_callers_of_that_handle(registry, monkeypatch):
+    other = next(f"user{i}@example.com" for i in range(100) if shard_for_tenant(f"user{i}@example.com") != shard_for_tenant(USER))
+    warm = registry.for_tenant(other)
+    opening, release = threading.Event(), threading.Event()
+    opens = []
+    open_shard = registry._open
+
+    def slow_open(shard_id, collection):
+        opens.append(shard_id)
+        opening.set()
+        release.wait(5)
+        return open_shard(shard_id, collection)
+
+    monkeypatch.setattr(registry, "_open", slow_open)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.for_tenant(USER))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    assert opening.wait(5)
+    assert registry.for_tenant(other) is warm  # not held up by the cold open
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert opens == [shard_for_tenant(USER)]
+    assert len(results) == 2 and results[0] is results[1]
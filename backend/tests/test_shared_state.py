@@ -0,0 +1,67 @@
+import multiprocessing
+import os
+import threading
+import time
+
+from app.core.config import settings
+from app.services import metadata_store
+from app.services.file_store import read_json, update_json
+from app.services.metadata_store import claim_file, has_already_been_processed, mark_as_processed, release_file
+from app.services.user_store import add_user, load_users
+
+COUNTER_FILE = "counter.json"
+
+
+def _increment(times):
+    for _ in range(times):
+        with update_json(COUNTER_FILE, {"n": 0}) as data:
+            data["n"] += 1
+
+
+def test_updates_from_several_processes_are_not_lost():
+    ctx = multiprocessing.get_context("spawn")  # like separate server workers; fork would copy held locks
+    processes = [ctx.Process(target=_increment, args=(50,)) for _ in range(4)]
+    for p in processes:
+        p.start()
+    _increment(50)
+    for p in processes:
+        p.join(timeout=60)
+        assert p.exitcode == 0
+    assert read_json(COUNTER_FILE, None) == {"n": 250}
+    assert not [name for name in os.listdir(".") if name.endswith(".tmp")]
+
+
+def test_a_contended_signup_succeeds_once():
+    results = []
+    threads = [
+        threading.Thread(target=lambda i=i: results.append(add_user("x@example.com", {"worker": i})))
+        for i in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results.count(True) == 1
+    assert list(load_users()) == ["x@example.com"]
+
+
+def test_a_file_is_claimed_once_and_not_after_processing():
+    assert claim_file("t", "a.pdf")
+    assert not claim_file("t", "a.pdf")
+    mark_as_processed("t", "a.pdf", 3)
+    mark_as_processed("t", "a.pdf", 3)
+    release_file("t", "a.pdf")
+    assert has_already_been_processed("t", "a.pdf")
+    assert not claim_file("t", "a.pdf")
+    assert len(metadata_store.load_metadata()) == 1
+
+
+def test_stale_claims_can_be_taken_over(monkeypatch):
+    with update_json(metadata_store.JOBS_FILE, {}) as jobs:
+        # A claimant on this host whose process is gone
+        jobs["t__dead.pdf"] = {"worker": f"{metadata_store.socket.gethostname()}:999999999", "claimed_at": time.time()}
+        jobs["t__old.pdf"] = {"worker": "elsewhere:1", "claimed_at": time.time() - settings.JOB_CLAIM_TTL - 1}
+        jobs["t__live.pdf"] = {"worker": "elsewhere:1", "claimed_at": time.time()}
+    assert claim_file("t", "dead.pdf")
+    assert claim_file("t", "old.pdf")
+    assert not claim_file("t", "live.pdf")
@@ -0,0 +1,136 @@
+import io
+import json
+import logging
+import os
+import shutil
+import tarfile
+import threading
+import time
+
+import pytest
+
+from app.services import qa_service, snapshot_service, vectorstore_service
+from app.services.metadata_store import load_metadata
+from app.services.snapshot_service import (
+    CHUNKS,
+    FILES_PREFIX,
+    MANIFEST,
+    METADATA,
+    UPLOAD_DIR,
+    export_tenant,
+    import_tenant,
+    iter_export,
+    verify_snapshot,
+)
+from app.services.shard_store import tenant_filter
+
+USER = "source@example.com"
+COPY = "copy@example.com"
+
+
+@pytest.fixture
+def snapshot(corpus):
+    os.makedirs(UPLOAD_DIR)
+    paths = [shutil.copy(path, UPLOAD_DIR) for path in corpus[:2]]
+    vectorstore_service.process_documents_for_user(paths, USER)
+    archive = io.BytesIO()
+    manifest = export_tenant(USER, archive)
+    return archive.getvalue(), manifest
+
+
+def rewrite(archive, edit):
+    """Repack the archive after edit(members) changes its list of [name, bytes] pairs."""
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r|gz") as tar:
+        members = [[m.name, tar.extractfile(m).read()] for m in tar]
+    edit(members)
+    out = io.BytesIO()
+    with tarfile.open(fileobj=out, mode="w|gz") as tar:
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+    return out.getvalue()
+
+
+def edit_manifest(members, change):
+    manifest = json.loads(members[0][1])
+    change(manifest)
+    members[0][1] = json.dumps(manifest).encode("utf-8")
+
+
+def chunk_count(user_id):
+    with vectorstore_service.shards.session():
+        return len(vectorstore_service.get_vectorstore(user_id).get(where=tenant_filter(user_id), include=[])["ids"])
+
+
+def test_export_then_import_as_another_tenant(snapshot):
+    archive, manifest = snapshot
+    assert manifest["chunks"] == chunk_count(USER) > 0
+    assert manifest["files"] == ["coffee_roasting.pdf", "incident_report.pdf"]
+    assert verify_snapshot(io.BytesIO(archive))["tenant"] == USER
+
+    result = import_tenant(io.BytesIO(archive), user_id=COPY)
+    assert result["tenant"] == COPY and result["source_tenant"] == USER
+    assert chunk_count(COPY) == chunk_count(USER)
+    assert {e["filename"] for e in load_metadata() if e["user_id"] == COPY} == set(manifest["files"])
+    docs = qa_service.retrieve_batch(["roasting temperature"], COPY)[0]
+    assert docs and {d.metadata["tenant"] for d in docs} == {COPY}
+
+
+def test_import_over_existing_chunks_needs_replace(snapshot):
+    archive, _ = snapshot
+    with pytest.raises(ValueError, match="already has indexed chunks"):
+        import_tenant(io.BytesIO(archive))
+    before = chunk_count(USER)
+    import_tenant(io.BytesIO(archive), replace=True)
+    assert chunk_count(USER) == before
+
+
+@pytest.mark.parametrize("edit, error", [
+    (lambda m: m[1].__setitem__(1, m[1][1] + b"\n"), "Integrity check failed"),
+    (lambda m: m.append(["files/extra.pdf", b"%PDF"]), "Unexpected archive member"),
+    (lambda m: m.append(["../escape.txt", b"x"]), "Unexpected archive member"),
+    (lambda m: m.__delitem__(3), "missing 1 member"),
+    (lambda m: m.insert(0, m.pop(1)), "must start with manifest.json"),
+    (lambda m: edit_manifest(m, lambda man: man["files"].append("../escape.pdf")), "Invalid file name"),
+    (lambda m: edit_manifest(m, lambda man: man["members"].pop(METADATA)), "do not match its file list"),
+])
+def test_verification_rejects_tampered_archives(snapshot, edit, error):
+    archive, _ = snapshot
+    with pytest.raises(ValueError, match=error):
+        verify_snapshot(io.BytesIO(rewrite(archive, edit)))
+
+
+def test_rejected_import_writes_nothing(snapshot):
+    archive, _ = snapshot
+    tampered = rewrite(archive, lambda m: m[-1].__setitem__(1, b"%PDF-tampered"))
+    with pytest.raises(ValueError, match="Integrity check failed for " + FILES_PREFIX):
+        import_tenant(io.BytesIO(tampered), user_id=COPY)
+    assert chunk_count(COPY) == 0
+    assert not [e for e in load_metadata() if e["user_id"] == COPY]
+    assert sorted(os.listdir(UPLOAD_DIR)) == ["coffee_roasting.pdf", "incident_report.pdf"]
+
+
+def test_member_order_is_manifest_first(snapshot):
+    archive, _ = snapshot
+    with tarfile.open(fileobj=io.BytesIO(archive), mode="r|gz") as tar:
+        names = [m.name for m in tar]
+    assert names[:3] == [MANIFEST, CHUNKS, "summaries.jsonl"]
+
+
+def test_streamed_export_is_a_valid_snapshot(snapshot):
+    streamed = b"".join(iter_export(USER))
+    assert verify_snapshot(io.BytesIO(streamed))["chunks"] == snapshot[1]["chunks"]
+
+
+def test_closing_a_streamed_export_stops_the_producer(snapshot, monkeypatch, caplog):
+    monkeypatch.setattr(snapshot_service, "QUEUE_POLL_SECONDS", 0.05)
+    caplog.set_level(logging.INFO, logger=snapshot_service.__name__)
+    blocks = iter_export(USER, max_pending=1)
+    next(blocks)
+    blocks.close()  # what a client disconnect does
+    deadline = time.monotonic() + 5
+    while any(t.name == "snapshot-export" for t in threading.enumerate()) and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not any(t.name == "snapshot-export" for t in threading.enumerate())
+    assert "cancelled: client went away" in caplog.text
@@ -0,0 +1,97 @@
+import os
+
+import fitz
+import pandas as pd
+
+from app.core.config import settings
+from app.services import table_service
+
+
+def _ruled_table_pdf(path):
+    doc = fitz.open()
+    doc.new_page().insert_text((72, 72), "Plain prose page without any table structure at all.")
+    page = doc.new_page()
+    page.insert_text((72, 60), "Quarterly figures by region and product line")
+    for i in range(4):
+        page.draw_line((72, 100 + 30 * i), (372, 100 + 30 * i))
+    for x in (72, 222, 372):
+        page.draw_line((x, 100), (x, 190))
+    doc.save(path)
+    doc.close()
+    return path
+
+
+def _stub_camelot(monkeypatch, ok=True):
+    calls = []
+
+    def read(file_path, page_number):
+        calls.append(page_number)
+        frame = pd.DataFrame([["region", "sales"], ["north", "12"]])
+        return page_number, [frame] if ok else [], ok
+
+    monkeypatch.setattr(table_service, "_read_page_tables", read)
+    monkeypatch.setattr(table_service, "_extract_ocr_tables", lambda file_path, pages: ([], True))
+    monkeypatch.setattr(settings, "TABLE_WORKERS", 1)
+    return calls
+
+
+def test_prepass_flags_only_ruled_pages(tmp_path):
+    path = _ruled_table_pdf(str(tmp_path / "t.pdf"))
+    assert table_service.find_table_candidate_pages(path) == ([2], [])
+
+
+def test_table_chunks_use_zero_based_pages_and_are_cached(tmp_path, monkeypatch):
+    path = _ruled_table_pdf(str(tmp_path / "t.pdf"))
+    calls = _stub_camelot(monkeypatch)
+
+    first = table_service.extract_tables_from_pdf(path, "t.pdf")
+    assert calls == [2]
+    assert [chunk["metadata"]["page"] for chunk in first] == [1]
+    assert first[0]["metadata"]["source"] == "t.pdf"
+
+    second = table_service.extract_tables_from_pdf(path, "renamed.pdf")
+    assert calls == [2]  # served from the content-hash cache
+    assert second[0]["metadata"]["source"] == "renamed.pdf"
+
+
+def test_failed_extraction_is_not_cached(tmp_path, monkeypatch):
+    path = _ruled_table_pdf(str(tmp_path / "t.pdf"))
+    calls = _stub_camelot(monkeypatch, ok=False)
+
+    assert table_service.extract_tables_from_pdf(path, "t.pdf") == []
+    assert not os.path.isdir(settings.TABLE_CACHE_DIR) or not os.listdir(settings.TABLE_CACHE_DIR)
+
+    table_service.extract_tables_from_pdf(path, "t.pdf")
+    assert calls == [2, 2]  # retried rather than remembered as "no tables"
+
+
+def test_camelot_reads_the_ruled_fixture_table(corpus, monkeypatch):
+    monkeypatch.setattr(settings, "TABLE_WORKERS", 1)
+    path = next(path for path in corpus if path.endswith("regional_sales.pdf"))
+    assert table_service.find_table_candidate_pages(path) == ([2], [])
+
+    chunks = table_service.extract_tables_from_pdf(path, "regional_sales.pdf", use_cache=False)
+    assert [chunk["metadata"]["type"] for chunk in chunks] == ["table"]
+    assert chunks[0]["metadata"]["page"] == 1
+    assert "North" in chunks[0]["content"] and "171" in chunks[0]["content"]
+
+
+def test_pages_are_read_by_a_shared_spawned_pool(corpus, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "TABLE_WORKERS", 2)
+    source = fitz.open(next(path for path in corpus if path.endswith("regional_sales.pdf")))
+    doc = fitz.open()
+    for _ in range(2):
+        doc.insert_pdf(source, from_page=1, to_page=1)
+    path = str(tmp_path / "two_tables.pdf")
+    doc.save(path)
+    try:
+        chunks, complete = table_service._extract_camelot_tables(path, [1, 2])
+        pool = table_service._pool
+        assert table_service._extract_camelot_tables(path, [1, 2]) == (chunks, complete)
+        assert table_service._pool is pool  # reused, not one pool per document
+        assert pool._mp_context.get_start_method() == "spawn"
+    finally:
+        table_service.shutdown_table_pool()
+    assert complete
+    assert [(chunk["metadata"]["page"], chunk["metadata"]["table_id"]) for chunk in chunks] == [(0, 0), (1, 1)]
+    assert table_service._pool is None
@@ -0,0 +1,85 @@
+import os
+import random
+import re
+import unicodedata
+from difflib import SequenceMatcher
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api import viewer
+from app.services import text_processing
+from app.services.text_processing import best_fuzzy_match, cached_page_lines, normalize_lines, normalize_text
+
+
+def reference_normalize(text):
+    # The viewer's original implementation
+    text = text.lower()
+    text = unicodedata.normalize("NFKD", text)
+    text = re.sub(r'#+\s*', '', text)
+    text = re.sub(r'[“”"\'«»’]', '"', text)
+    text = re.sub(r'[^a-z0-9\s.,;:!?()\"-]', "", text)
+    text = re.sub(r'\s+', " ", text)
+    text = re.sub(r'\n+', " ", text)
+    return text.strip()
+
+
+def reference_best_match(queries, lines, threshold):
+    best_score, best_line = 0, None
+    for query in queries:
+        for line, line_norm in lines:
+            score = SequenceMatcher(None, query, line_norm).ratio()
+            if score > best_score and score >= threshold:
+                best_score, best_line = score, line
+    return best_line, best_score
+
+
+def test_normalize_text_matches_the_original_regexes():
+    alphabet = "abcXYZ019 .,;:!?()-#\"'“”«»’\n\t éÉçñßﬁ①½漢→*_[]{}"
+    rng = random.Random(0)
+    samples = ["## Results\n\nRevenue “grew” 12%!", "Ça  va  très bien", ""]
+    samples += ["".join(rng.choice(alphabet) for _ in range(rng.randint(0, 60))) for _ in range(2000)]
+    for sample in samples:
+        assert normalize_text(sample) == reference_normalize(sample), repr(sample)
+
+
+def test_best_fuzzy_match_matches_brute_force():
+    rng = random.Random(1)
+    words = "solar panel clean quarterly leave policy weeks coffee roast crack".split()
+    for _ in range(200):
+        lines = normalize_lines(" ".join(rng.choices(words, k=rng.randint(1, 6))) for _ in range(8))
+        queries = [normalize_text(" ".join(rng.choices(words, k=rng.randint(1, 5)))) for _ in range(2)]
+        threshold = rng.choice([0.3, 0.5, 0.7])
+        assert best_fuzzy_match(queries, lines, threshold) == reference_best_match(queries, lines, threshold)
+
+
+def test_page_lines_are_memoized_and_bounded(monkeypatch):
+    monkeypatch.setattr(text_processing, "PAGE_LINES_CACHE_SIZE", 2)
+    monkeypatch.setattr(text_processing, "_page_lines", type(text_processing._page_lines)())
+    calls = []
+
+    def extract(key):
+        return lambda: calls.append(key) or [f"Line of {key}"]
+
+    assert cached_page_lines("a", extract("a")) == [("Line of a", "line of a")]
+    cached_page_lines("a", extract("a"))
+    cached_page_lines("b", extract("b"))
+    cached_page_lines("c", extract("c"))
+    cached_page_lines("a", extract("a"))
+    assert calls == ["a", "b", "c", "a"]
+
+
+def test_highlight_uses_the_fuzzy_threshold_on_every_page(make_pdf):
+    os.makedirs(viewer.UPLOAD_DIR)
+    os.replace(
+        make_pdf("notes.pdf", [["Quarterly revenue grew by twelve percent"], ["The panels need cleaning every three months"]]),
+        os.path.join(viewer.UPLOAD_DIR, "notes.pdf"),
+    )
+    app = FastAPI()
+    app.include_router(viewer.router)
+    client = TestClient(app)
+
+    found = client.get("/api/highlight-snippet", params={"file": "notes.pdf", "text": "panels need cleaning every three months"})
+    assert found.json()["highlight"]["page"] == 2  # not a weak match on page 1
+    missing = client.get("/api/highlight-snippet", params={"file": "notes.pdf", "text": "zebra xylophone"})
+    assert missing.json() == {"highlight": None}
@@ -0,0 +1,94 @@
+import time
+
+import pytest
+
+from app.services import warmup_service
+from app.services.file_store import read_json
+from app.services.shard_store import shard_for_tenant
+from app.services.vectorstore_service import shards
+from app.services.warmup_service import WARM_REQUESTS_FILE, WarmTenantPool
+
+
+def tenants_on_distinct_shards(count):
+    tenants, seen = [], set()
+    i = 0
+    while len(tenants) < count:
+        user_id = f"user{i}@example.com"
+        if shard_for_tenant(user_id) not in seen:
+            seen.add(shard_for_tenant(user_id))
+            tenants.append(user_id)
+        i += 1
+    return tenants
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    warmed = []
+    monkeypatch.setattr(warmup_service, "warm_tenant", warmed.append)
+    pool = WarmTenantPool(max_tenants=2, idle_seconds=60, workers=1, max_pinned_shards=1)
+    pool.warmed = warmed
+    yield pool
+    pool._executor.shutdown(wait=True)
+    # The shard registry is process-wide; leave no pins behind for other tests
+    with pool._lock:
+        for user_id in list(pool._pinned):
+            pool._unpin(user_id)
+
+
+def test_touch_reports_cold_then_warm_and_evicts_least_recent(pool):
+    a, b, c = tenants_on_distinct_shards(3)
+    assert pool.touch(a) == "cold"
+    assert pool.touch(a) == "warm"
+    pool.touch(b)
+    pool.touch(a)  # b is now the least recently used
+    assert pool.touch(c) == "cold"
+    assert list(pool._tenants) == [a, c]
+    assert pool.touch(b) == "cold"
+
+
+def test_pins_are_capped_and_handed_over_on_eviction(pool):
+    a, b, c = tenants_on_distinct_shards(3)
+    pool.touch(a)
+    pool.touch(b)
+    assert pool._pinned == {a}  # one pinned shard at most
+    assert shards.pinned_shards() == [shard_for_tenant(a)]
+    pool.touch(c)  # evicts a, freeing its pin for c
+    assert pool._pinned == {c}
+    assert shards.pinned_shards() == [shard_for_tenant(c)]
+
+
+def test_idle_tenants_are_evicted_and_unpinned(pool):
+    (a,) = tenants_on_distinct_shards(1)
+    pool.touch(a)
+    pool._tenants[a] = time.monotonic() - 120
+    pool.evict_idle()
+    assert pool.stats()["warm_tenants"] == 0
+    assert shards.pinned_shards() == []
+
+
+def test_warm_requests_reach_other_workers_through_the_shared_file(pool, monkeypatch):
+    a, b = tenants_on_distinct_shards(2)
+    other = WarmTenantPool(max_tenants=2, idle_seconds=60, workers=1, max_pinned_shards=1)
+    monkeypatch.setattr(other, "schedule", lambda user_id: pool.warmed.append(("other", user_id)))
+    other.sync()  # nothing requested yet
+
+    pool.request(a)
+    pool._executor.submit(lambda: None).result()  # wait for the queued warm-up
+    assert pool.warmed == [a]
+    assert pool.touch(a) == "warm"
+    assert set(read_json(WARM_REQUESTS_FILE, {})) == {a}
+
+    other.sync()
+    other.sync()  # each request is picked up once
+    assert pool.warmed == [a, ("other", a)]
+    pool.request(b)
+    pool._executor.submit(lambda: None).result()
+    other.sync()
+    assert pool.warmed[-2:] == [b, ("other", b)]
+    other._executor.shutdown()
+
+
+def test_schedule_skips_warm_and_queued_tenants(pool):
+    (a,) = tenants_on_distinct_shards(1)
+    pool.touch(a)
+    assert pool.schedule(a) is False